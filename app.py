@@ -4,61 +4,65 @@ Complete integration with Supabase, Qikink API, and Razorpay
 ALL-IN-ONE FILE for easy deployment on free hosting
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, g
+from flask import Flask, Blueprint, render_template, request, jsonify, send_from_directory, send_file, g, Response, stream_with_context, abort
+from markupsafe import Markup, escape
+from werkzeug.utils import safe_join
+import mimetypes
 from flask_cors import CORS
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
+import csv
+import io
 import os
 import requests
 import hashlib
 import hmac
 import base64
-from functools import wraps
+import time
+import threading
+import random
+import heapq
+import bisect
+import re
+import unicodedata
+import sqlite3
+from functools import wraps, lru_cache
+from urllib.parse import urlparse, urlencode
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 from typing import Optional, Dict, List, Any
 import logging
 from logging.handlers import RotatingFileHandler
 import atexit
-from typing import Any
+from importlib.util import find_spec
 
-# Try to import external dependencies (used in the original app.py's conditional logic)
-# This keeps the spirit of the original file, checking if features are available.
-SUPABASE_AVAILABLE = False
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    Client = Any  # Fallback type when Supabase not installed
-    pass
+# Check which external dependencies are installed without importing them.
+# supabase, razorpay, apscheduler, bcrypt and jwt are imported where they are
+# first used, so importing this module (and booting a worker) stays cheap.
+SUPABASE_AVAILABLE = find_spec('supabase') is not None
+RAZORPAY_AVAILABLE = find_spec('razorpay') is not None
+JWT_AVAILABLE = find_spec('jwt') is not None and find_spec('bcrypt') is not None
+SCHEDULER_AVAILABLE = find_spec('apscheduler') is not None
+PILLOW_AVAILABLE = find_spec('PIL') is not None
 
-RAZORPAY_AVAILABLE = False
+# Environment Variables
 try:
-    import razorpay
-    RAZORPAY_AVAILABLE = True
+    from dotenv import load_dotenv
+    load_dotenv()
 except ImportError:
     pass
 
-JWT_AVAILABLE = False
+# Cross-process file locking (fcntl on Linux/macOS, msvcrt on Windows)
 try:
-    import jwt as pyjwt
-    import bcrypt
-    JWT_AVAILABLE = True
+    import fcntl
 except ImportError:
-    pass
-
-SCHEDULER_AVAILABLE = False
+    fcntl = None
 try:
-    from apscheduler.schedulers.background import BackgroundScheduler
-    from apscheduler.triggers.interval import IntervalTrigger
-    SCHEDULER_AVAILABLE = True
+    import msvcrt
 except ImportError:
-    pass
-
-# Environment Variables
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+    msvcrt = None
 
 # HTTP Retry Logic (from mediator_services.py)
 try:
@@ -78,19 +82,8 @@ except ImportError:
 
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
-app = Flask(__name__, 
-            static_folder=os.path.join(PROJECT_ROOT, 'static'),
-            static_url_path='/static',
-            template_folder=os.path.join(PROJECT_ROOT, 'templates'))
-
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-# Configuration
-app.config['JSON_SORT_KEYS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join(PROJECT_ROOT, 'uploads')
-app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
-
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Routes, request hooks and error handlers live on this blueprint; create_app() wires it up
+bp = Blueprint('main', __name__)
 
 # =====================================================
 # CONFIGURATION - API CREDENTIALS
@@ -102,6 +95,20 @@ QIKINK_CLIENT_SECRET = os.getenv('QIKINK_CLIENT_SECRET', 'bf043131d3e80f1d15b6d8
 QIKINK_API_BASE_URL = os.getenv('QIKINK_API_BASE_URL', 'https://sandbox-api.qikink.com/api/v1')
 QIKINK_AUTH_URL = os.getenv('QIKINK_AUTH_URL', 'https://sandbox-api.qikink.com/oauth/token')
 
+# Qikink Token Sharing (one token fetch per host, renewed in the background)
+QIKINK_TOKEN_CACHE_PATH = os.getenv('QIKINK_TOKEN_CACHE_PATH', os.path.join(PROJECT_ROOT, 'data', 'qikink_token.json'))
+QIKINK_TOKEN_RENEW_SECONDS = int(os.getenv('QIKINK_TOKEN_RENEW_SECONDS', 600))
+
+# Scheduler Leader Election (one worker on the host runs the periodic jobs)
+SCHEDULER_LOCK_PATH = os.getenv('SCHEDULER_LOCK_PATH', os.path.join(PROJECT_ROOT, 'data', 'scheduler.lock'))
+SCHEDULER_LEADER_RETRY_SECONDS = int(os.getenv('SCHEDULER_LEADER_RETRY_SECONDS', 15))
+
+# Outbound HTTP Transport (shared by Qikink, Razorpay and Supabase)
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 4))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 0))  # 0 = derive from thread counts
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+
 # Supabase Configuration
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY', '')
@@ -110,6 +117,8 @@ SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY', SUPABASE_KEY)
 # Razorpay Configuration
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
+# Webhook secret set in the Razorpay dashboard (older setups reused the key secret)
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET', RAZORPAY_KEY_SECRET)
 
 # JWT Configuration
 JWT_SECRET = os.getenv('JWT_SECRET', 'dev-jwt-secret-change-in-production')
@@ -117,6 +126,112 @@ JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 24))
 JWT_REFRESH_TOKEN_EXPIRATION_DAYS = int(os.getenv('JWT_REFRESH_TOKEN_EXPIRATION_DAYS', 30))
 
+# Password Hashing (bcrypt runs in a small per-worker process pool; 0 = on the request thread)
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', min(2, os.cpu_count() or 1)))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', 8))
+BCRYPT_TIMEOUT_SECONDS = float(os.getenv('BCRYPT_TIMEOUT_SECONDS', 10))
+
+# Catalog Sync Configuration
+PRODUCT_SYNC_CHUNK_SIZE = int(os.getenv('PRODUCT_SYNC_CHUNK_SIZE', 500))
+
+# Product Listing Pagination
+PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 48))
+PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 200))
+
+# Tracking Poller Configuration
+# Hours between polls of a shipped order whose status just changed (submitted orders: twice this)
+TRACKING_UPDATE_INTERVAL = float(os.getenv('TRACKING_UPDATE_INTERVAL', 3))
+# How often the poller wakes up to poll the orders that are due
+TRACKING_TICK_MINUTES = int(os.getenv('TRACKING_TICK_MINUTES', 10))
+TRACKING_MIN_INTERVAL_MINUTES = int(os.getenv('TRACKING_MIN_INTERVAL_MINUTES', 30))
+TRACKING_MAX_INTERVAL_HOURS = float(os.getenv('TRACKING_MAX_INTERVAL_HOURS', 24))
+# Orders within this many hours of their expected delivery are polled at the minimum interval
+TRACKING_DELIVERY_WINDOW_HOURS = float(os.getenv('TRACKING_DELIVERY_WINDOW_HOURS', 24))
+TRACKING_MAX_POLLS_PER_RUN = int(os.getenv('TRACKING_MAX_POLLS_PER_RUN', 500))
+TRACKING_POLL_CONCURRENCY = int(os.getenv('TRACKING_POLL_CONCURRENCY', 8))
+QIKINK_RATE_LIMIT_RPS = float(os.getenv('QIKINK_RATE_LIMIT_RPS', 5))
+TRACKING_SLOWEST_CALLS = int(os.getenv('TRACKING_SLOWEST_CALLS', 5))
+# Tracking events are written to tracking_logs in multi-row batches of this size
+TRACKING_LOG_BATCH_SIZE = int(os.getenv('TRACKING_LOG_BATCH_SIZE', 500))
+# Event keys each worker remembers as already stored, so repeat polls send nothing
+TRACKING_EVENT_CACHE_SIZE = int(os.getenv('TRACKING_EVENT_CACHE_SIZE', 20000))
+TRACKING_EVENT_CACHE_TTL = int(os.getenv('TRACKING_EVENT_CACHE_TTL', 24 * 3600))
+
+# Failed Job Retry Engine (failed_jobs table)
+RETRY_BATCH_SIZE = int(os.getenv('RETRY_BATCH_SIZE', 20))
+RETRY_MAX_BATCHES = int(os.getenv('RETRY_MAX_BATCHES', 10))
+RETRY_CONCURRENCY = int(os.getenv('RETRY_CONCURRENCY', 4))
+RETRY_BACKOFF_BASE_SECONDS = int(os.getenv('RETRY_BACKOFF_BASE_SECONDS', 60))
+RETRY_BACKOFF_MAX_SECONDS = int(os.getenv('RETRY_BACKOFF_MAX_SECONDS', 6 * 3600))
+RETRY_LEASE_SECONDS = int(os.getenv('RETRY_LEASE_SECONDS', 300))
+FAILED_JOB_MAX_RETRIES = int(os.getenv('FAILED_JOB_MAX_RETRIES', 3))
+
+# Local Job Queue Configuration (order fulfillment)
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(PROJECT_ROOT, 'data', 'job_queue.db'))
+JOB_QUEUE_WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', 2))
+FULFILLMENT_MAX_ATTEMPTS = int(os.getenv('FULFILLMENT_MAX_ATTEMPTS', 3))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 5))
+
+# Start queue workers and the scheduler in served processes (gunicorn workers via
+# gunicorn.conf.py, or python app.py); importing app.py never starts them
+BACKGROUND_JOBS_ENABLED = os.getenv('BACKGROUND_JOBS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Admin Orders Pagination / Export
+ADMIN_ORDERS_PAGE_SIZE = int(os.getenv('ADMIN_ORDERS_PAGE_SIZE', 50))
+ADMIN_ORDERS_MAX_PAGE_SIZE = int(os.getenv('ADMIN_ORDERS_MAX_PAGE_SIZE', 200))
+ORDERS_EXPORT_CHUNK_SIZE = int(os.getenv('ORDERS_EXPORT_CHUNK_SIZE', 500))
+
+# Catalog Cache Configuration (seconds)
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 300))
+# SKUs whose /api/products/<sku>/stock summary each worker keeps in memory
+STOCK_CACHE_SIZE = int(os.getenv('STOCK_CACHE_SIZE', 2048))
+
+# Product Search Index (in-process, per worker)
+# How often a worker pulls products changed by other workers' syncs
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', 60))
+# Each refresh re-reads this far behind the newest updated_at seen, for syncs that commit late
+SEARCH_INDEX_OVERLAP_SECONDS = int(os.getenv('SEARCH_INDEX_OVERLAP_SECONDS', 300))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 100))
+# Shortest query word treated as a prefix, and how many vocabulary terms one prefix may expand to
+SEARCH_MIN_PREFIX = int(os.getenv('SEARCH_MIN_PREFIX', 2))
+SEARCH_PREFIX_EXPANSION = int(os.getenv('SEARCH_PREFIX_EXPANSION', 50))
+
+# Recently seen payment/webhook idempotency keys kept per worker
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 4096))
+IDEMPOTENCY_CACHE_TTL = int(os.getenv('IDEMPOTENCY_CACHE_TTL', 3600))
+
+# Verified JWT payloads kept per worker (entries expire with the token)
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 1024))
+
+# Metrics Configuration (Prometheus text format at /api/metrics)
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(PROJECT_ROOT, 'data', 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+METRICS_STALE_SECONDS = int(os.getenv('METRICS_STALE_SECONDS', 3600))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Static Asset Pipeline (bundles written by build_assets.py)
+ASSET_DIST_DIR = os.getenv('ASSET_DIST_DIR', os.path.join(PROJECT_ROOT, 'static', 'dist'))
+ASSET_MAX_AGE = int(os.getenv('ASSET_MAX_AGE', 365 * 24 * 3600))
+
+# Image Derivatives (resized WebP/AVIF/JPEG, generated on first request)
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(PROJECT_ROOT, 'data', 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_WIDTHS = tuple(int(w) for w in os.getenv('IMAGE_WIDTHS', '160,320,480,640,960,1280').split(','))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+IMAGE_MAX_AGE = int(os.getenv('IMAGE_MAX_AGE', 30 * 24 * 3600))
+IMAGE_FETCH_MAX_BYTES = int(os.getenv('IMAGE_FETCH_MAX_BYTES', 10 * 1024 * 1024))
+# Remote hosts product image_url values may point at (empty = local images only)
+IMAGE_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv('IMAGE_ALLOWED_HOSTS', '').split(',') if h.strip()]
+
+# Pre-rendered Storefront Pages (rendered once, re-rendered when templates or assets change)
+PAGE_PRERENDER = os.getenv('PAGE_PRERENDER', 'true').lower() in ('1', 'true', 'yes')
+PAGE_CACHE_CHECK_SECONDS = float(os.getenv('PAGE_CACHE_CHECK_SECONDS', 5))
+
+# Admin Dashboard Configuration
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 15))
+DASHBOARD_DAILY_DAYS = int(os.getenv('DASHBOARD_DAILY_DAYS', 30))
+
 # =====================================================
 # LOGGING CONFIGURATION
 # =====================================================
@@ -129,9 +244,935 @@ file_handler.setFormatter(logging.Formatter(
     '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
 ))
 file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
-app.logger.info('Backend Mediator Startup')
+
+# Module-level logger so services can log before (or without) an app instance
+logger = logging.getLogger('bharat_collections')
+logger.addHandler(file_handler)
+logger.setLevel(logging.INFO)
+logger.info('Backend Mediator Startup')
+
+
+# =====================================================
+# IN-PROCESS CACHE
+# =====================================================
+
+class SingleFlightCache:
+    """Per-worker TTL cache with single-flight refresh and stale-while-revalidate"""
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 256, wait_timeout: float = 30):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries: Dict[Any, Dict] = {}
+        self._refreshing: Dict[Any, threading.Event] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale_hits': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key: Any, loader):
+        """Return the cached value for key, calling loader at most once per refresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['generation'] == self._generation and entry['expires_at'] > time.monotonic():
+                self.stats['hits'] += 1
+                return entry['value']
+
+            pending = self._refreshing.get(key)
+            is_leader = pending is None
+            if is_leader:
+                pending = self._refreshing[key] = threading.Event()
+
+            if entry is not None:
+                # Serve stale data; the first caller kicks off a background refresh
+                self.stats['stale_hits'] += 1
+                stale_value = entry['value']
+            else:
+                self.stats['misses'] += 1
+
+        if entry is not None:
+            if is_leader:
+                threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+            return stale_value
+
+        if is_leader:
+            return self._refresh(key, loader, raise_errors=True)
+
+        # Another thread is already loading this key - wait for its result
+        pending.wait(self.wait_timeout)
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry['value'] if entry else loader()
+
+    def _refresh(self, key: Any, loader, raise_errors: bool = False):
+        """Run loader and store its result (called by exactly one thread per key)"""
+        with self._lock:
+            generation = self._generation
+        try:
+            value = loader()
+            with self._lock:
+                self.stats['refreshes'] += 1
+                self._entries.pop(key, None)
+                self._entries[key] = {
+                    'value': value,
+                    'generation': generation,
+                    'expires_at': time.monotonic() + self.ttl_seconds
+                }
+                while len(self._entries) > self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            return value
+        except Exception as e:
+            with self._lock:
+                self.stats['refresh_errors'] += 1
+            logger.error(f'[ERROR] {self.name} cache refresh failed for {key!r}: {str(e)}')
+            if raise_errors:
+                raise
+            return None
+        finally:
+            with self._lock:
+                event = self._refreshing.pop(key, None)
+            if event:
+                event.set()
+
+    def invalidate(self):
+        """Mark every entry stale; they are still served while the next refresh runs"""
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict:
+        """Counters plus current size and hit rate"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        stats['ttl_seconds'] = self.ttl_seconds
+        return stats
+
+
+class RecentKeyCache:
+    """Bounded LRU of idempotency keys this worker has already seen processed.
+
+    Only a fast path: a miss says nothing, the database unique index stays
+    the source of truth. Keys are added once a claim succeeded or was found
+    to be a duplicate, never on errors.
+    """
+
+    def __init__(self, name: str, max_entries: int = IDEMPOTENCY_CACHE_SIZE,
+                 ttl_seconds: int = IDEMPOTENCY_CACHE_TTL):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def __contains__(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.pop(key, None)
+            if expires_at is not None and expires_at > now:
+                # Re-insert to mark as most recently used
+                self._entries[key] = expires_at
+                self.stats['hits'] += 1
+                return True
+            self.stats['misses'] += 1
+            return False
+
+    def add(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = time.monotonic() + self.ttl_seconds
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'name': self.name, 'entries': len(self._entries), 'max_entries': self.max_entries, **self.stats}
+
+
+class VerifiedTokenCache:
+    """Payloads of tokens that already passed signature and claims checks.
+
+    Keyed by a SHA-256 digest so raw tokens are never held in memory, and
+    each entry is dropped at the token's own exp, so a cached token can never
+    outlive what pyjwt.decode would have accepted.
+    """
+
+    def __init__(self, max_entries: int = JWT_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries: Dict[bytes, Dict] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if entry['exp'] <= time.time():
+                del self._entries[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry['payload']
+
+    def put(self, token: str, payload: Dict):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return  # Tokens without exp are never cached
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.time()
+                for key in [k for k, e in self._entries.items() if e['exp'] <= now]:
+                    del self._entries[key]
+                while len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[self._key(token)] = {'payload': payload, 'exp': exp}
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else None
+            }
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting calls to a requests-per-second budget"""
+
+    def __init__(self, rate_per_second: float, burst: Optional[int] = None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1, int(rate_per_second))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available (no-op when the rate is 0 or negative)"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# =====================================================
+# CROSS-PROCESS COORDINATION
+# =====================================================
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared by threads and gunicorn worker processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = None
+        # flock() is per open file, so threads in one process also serialize on a plain lock
+        self._thread_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; with blocking=False returns False instead of waiting"""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        handle = None
+        try:
+            handle = open(self.path, 'a+')
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            elif msvcrt:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if handle:
+                handle.close()
+            self._thread_lock.release()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self):
+        """Release the lock (the OS also drops it if the process dies)"""
+        handle, self._handle = self._handle, None
+        if handle is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            elif msvcrt:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            handle.close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        if not self.acquire():
+            raise OSError(f'Could not lock {self.path}')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class SharedTokenCache:
+    """Access token stored in a lock-protected file so worker processes share one token"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = FileLock(path + '.lock')
+
+    def read(self) -> Optional[Dict]:
+        """Return {'access_token', 'expires_at'} or None if missing/unreadable"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('access_token') and data.get('expires_at'):
+                return data
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def write(self, access_token: str, expires_at: datetime):
+        """Atomically replace the shared token (owner-only permissions)"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'access_token': access_token, 'expires_at': expires_at.isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class LeaderElection:
+    """Elects one process per host by holding a non-blocking file lock.
+
+    The leader keeps the lock for its whole lifetime and refreshes a small
+    status file next to it. Followers retry every retry_seconds; the OS drops
+    the lock when the leader exits or dies, so the next follower to retry
+    takes over and runs on_elected. on_elected returns what it started; if it
+    returns None or raises, the process steps down so the next retry (here or
+    in a follower) tries again.
+    """
+
+    def __init__(self, path: str, on_elected, retry_seconds: int = SCHEDULER_LEADER_RETRY_SECONDS):
+        self.path = path
+        self.status_path = path + '.json'
+        self.on_elected = on_elected
+        self.retry_seconds = max(1, retry_seconds)
+        self.lock = FileLock(path)
+        self.is_leader = False
+        self.elected_at: Optional[datetime] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if not self.is_leader and self.lock.acquire(blocking=False):
+                self.is_leader = True
+                self.elected_at = datetime.now()
+                self._write_status()
+                logger.info(f'[OK] Process {os.getpid()} elected scheduler leader')
+                try:
+                    started = self.on_elected()
+                except Exception as e:
+                    logger.error(f'[ERROR] Scheduler leader start failed: {str(e)}')
+                    started = None
+                if started is None:
+                    self._step_down()
+                    logger.warning(f'[WARN] Process {os.getpid()} stepped down after a failed scheduler start')
+            elif self.is_leader:
+                self._write_status()
+            self._stopping.wait(self.retry_seconds)
+
+    def _write_status(self):
+        """Heartbeat file read by the status endpoint in every worker"""
+        tmp_path = f'{self.status_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'pid': os.getpid(),
+                    'hostname': os.uname().nodename if hasattr(os, 'uname') else os.getenv('COMPUTERNAME', ''),
+                    'elected_at': self.elected_at.isoformat(),
+                    'heartbeat_at': datetime.now().isoformat()
+                }, f)
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            logger.warning(f'[WARN] Could not write leader status: {str(e)}')
+
+    def get_status(self) -> Dict:
+        """Who leads, as seen from this process"""
+        leader = None
+        try:
+            with open(self.status_path, 'r', encoding='utf-8') as f:
+                leader = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        if leader:
+            heartbeat = datetime.fromisoformat(leader['heartbeat_at'])
+            leader['heartbeat_age_seconds'] = round((datetime.now() - heartbeat).total_seconds(), 1)
+            # A missed heartbeat or a dead pid means a follower is about to take over
+            leader['alive'] = leader['heartbeat_age_seconds'] <= self.retry_seconds * 3 and _pid_alive(leader['pid'])
+
+        return {
+            'pid': os.getpid(),
+            'is_leader': self.is_leader,
+            'retry_seconds': self.retry_seconds,
+            'leader': leader
+        }
+
+    def stop(self):
+        """Step down so another worker can take over on its next retry"""
+        self._stopping.set()
+        if self.is_leader:
+            self._step_down()
+            logger.info(f'[OK] Process {os.getpid()} released scheduler leadership')
+
+    def _step_down(self):
+        # Drop our heartbeat while still holding the lock, so it can't erase a new leader's
+        try:
+            os.remove(self.status_path)
+        except OSError:
+            pass
+        self.is_leader = False
+        self.elected_at = None
+        self.lock.release()
+
+
+def _pid_alive(pid: Any) -> bool:
+    """True if a process with this pid exists on this host (signal 0 only checks)"""
+    # os.kill(0 or -1, 0) would probe a whole process group
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except PermissionError:
+        return True  # Exists, owned by another user
+    except OSError:
+        return False
+
+
+def invalidate_catalog_caches():
+    """Drop cached catalog data after the products table changes"""
+    if product_cache:
+        product_cache.invalidate()
+        facet_cache.invalidate()
+        stock_cache.invalidate()
+        logger.info('[OK] Catalog cache invalidated')
+
+
+# =====================================================
+# OUTBOUND HTTP TRANSPORT
+# =====================================================
+
+class _HostStats:
+    """Counters for one outbound host"""
+
+    def __init__(self, dependency: str, pool_maxsize: int):
+        self.dependency = dependency
+        self.semaphore = threading.BoundedSemaphore(pool_maxsize)
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.pool_waits = 0
+        self.pool_wait_seconds = 0.0
+        self.connections_opened = 0
+        self.pools = set()  # urllib3 pools serving this host (they count their own new connections)
+        self.total_seconds = 0.0
+
+    def total_connections_opened(self) -> int:
+        return self.connections_opened + sum(pool.num_connections for pool in list(self.pools))
+
+
+class OutboundTransport:
+    """One place for outbound HTTP pooling, timeouts and per-host metrics"""
+
+    def __init__(self, pool_maxsize: int, connect_timeout: float, read_timeout: float):
+        self.pool_maxsize = max(1, pool_maxsize)
+        self.timeout = (connect_timeout, read_timeout)
+        self._hosts: Dict[str, _HostStats] = {}
+        self._dependencies: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.observers: List = []  # callables(dependency, host, seconds, ok)
+
+    def register_host(self, url: str, dependency: str):
+        """Label a host so its calls are reported under a dependency name"""
+        host = urlparse(url).netloc or url
+        with self._lock:
+            self._dependencies[host] = dependency
+            if host in self._hosts:
+                self._hosts[host].dependency = dependency
+
+    def _host(self, host: str) -> _HostStats:
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                stats = self._hosts[host] = _HostStats(self._dependencies.get(host, 'other'), self.pool_maxsize)
+            return stats
+
+    def _begin(self, host: str) -> _HostStats:
+        """Wait for a pool slot (recording the wait) and mark the call in flight"""
+        stats = self._host(host)
+        if not stats.semaphore.acquire(blocking=False):
+            wait_started = time.perf_counter()
+            stats.semaphore.acquire()
+            with self._lock:
+                stats.pool_waits += 1
+                stats.pool_wait_seconds += time.perf_counter() - wait_started
+        with self._lock:
+            stats.in_flight += 1
+        return stats
+
+    def _end(self, host: str, stats: _HostStats, seconds: float, ok: bool, new_connections: int = 0):
+        with self._lock:
+            stats.in_flight -= 1
+            stats.requests += 1
+            stats.total_seconds += seconds
+            stats.connections_opened += new_connections
+            if not ok:
+                stats.errors += 1
+        stats.semaphore.release()
+        for observer in self.observers:
+            try:
+                observer(stats.dependency, host, seconds, ok)
+            except Exception:
+                pass
+
+    def session(self, dependency: str, base_url: Optional[str] = None, retries: Any = None) -> requests.Session:
+        """requests.Session whose pools, timeouts and metrics come from this transport"""
+        if base_url:
+            self.register_host(base_url, dependency)
+        session = requests.Session()
+        if RETRY_AVAILABLE:
+            adapter = _InstrumentedHTTPAdapter(
+                self,
+                pool_connections=10,
+                pool_maxsize=self.pool_maxsize,
+                max_retries=retries if retries is not None else 0
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+    def instrument_supabase(self, client: Any):
+        """Route the Supabase (postgrest/httpx) client through this transport's limits and metrics"""
+        try:
+            import httpx
+            try:
+                from postgrest.utils import SyncClient as PostgrestSession  # httpx.Client subclass postgrest uses
+            except ImportError:
+                PostgrestSession = httpx.Client
+            self.register_host(SUPABASE_URL, 'supabase')
+            postgrest = client.postgrest
+            current = postgrest.session
+            # Swap in a session built with an explicit transport (public httpx API) instead of
+            # patching the private _transport of the one postgrest created
+            postgrest.session = PostgrestSession(
+                base_url=current.base_url,
+                headers=current.headers,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                follow_redirects=True,
+                transport=_InstrumentedHttpxTransport(self, httpx.HTTPTransport(
+                    limits=httpx.Limits(max_connections=self.pool_maxsize,
+                                        max_keepalive_connections=self.pool_maxsize)
+                ))
+            )
+            current.close()
+        except Exception as e:
+            logger.warning(f'[WARN] Supabase transport instrumentation unavailable: {str(e)}')
+
+    def get_stats(self) -> Dict:
+        """Per-host pool and latency metrics"""
+        with self._lock:
+            hosts = {}
+            for host, stats in self._hosts.items():
+                opened = stats.total_connections_opened()
+                hosts[host] = {
+                    'dependency': stats.dependency,
+                    'requests': stats.requests,
+                    'errors': stats.errors,
+                    'in_flight': stats.in_flight,
+                    'pool_waits': stats.pool_waits,
+                    'pool_wait_ms_total': round(stats.pool_wait_seconds * 1000, 2),
+                    'connections_opened': opened,
+                    'connection_reuse_ratio': round(max(0.0, 1 - opened / stats.requests), 4) if stats.requests else None,
+                    'avg_latency_ms': round(stats.total_seconds / stats.requests * 1000, 2) if stats.requests else None
+                }
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+            'hosts': hosts
+        }
+
+
+if RETRY_AVAILABLE:
+    class _InstrumentedHTTPAdapter(HTTPAdapter):
+        """HTTPAdapter applying the transport's default timeouts and per-host accounting"""
+
+        def __init__(self, transport: OutboundTransport, **kwargs):
+            self.transport = transport
+            super().__init__(pool_block=True, **kwargs)
+
+        def _track_pool(self, pool, url: str):
+            """Remember the urllib3 pool serving a host so its connection count can be read"""
+            self.transport._host(urlparse(url).netloc).pools.add(pool)
+            return pool
+
+        def get_connection(self, url, proxies=None):
+            return self._track_pool(super().get_connection(url, proxies), url)
+
+        def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+            pool = super().get_connection_with_tls_context(request, verify, proxies=proxies, cert=cert)
+            return self._track_pool(pool, request.url)
+
+        def send(self, request, **kwargs):
+            if kwargs.get('timeout') is None:
+                kwargs['timeout'] = self.transport.timeout
+            host = urlparse(request.url).netloc
+
+            stats = self.transport._begin(host)
+            started = time.perf_counter()
+            ok = False
+            try:
+                response = super().send(request, **kwargs)
+                ok = response.status_code < 500
+                return response
+            finally:
+                self.transport._end(host, stats, time.perf_counter() - started, ok)
+
+
+class _InstrumentedHttpxTransport:
+    """httpx transport wrapper giving Supabase calls the same accounting as requests-based clients"""
+
+    def __init__(self, transport: OutboundTransport, inner: Any):
+        self.transport = transport
+        self.inner = inner
+        self._seen_streams = set()
+
+    def handle_request(self, request):
+        host = request.url.netloc.decode('ascii') if isinstance(request.url.netloc, bytes) else str(request.url.netloc)
+        stats = self.transport._begin(host)
+        started = time.perf_counter()
+        ok = False
+        new_connections = 0
+        try:
+            response = self.inner.handle_request(request)
+            ok = response.status_code < 500
+            stream_id = id(response.extensions.get('network_stream'))
+            if stream_id not in self._seen_streams:
+                new_connections = 1
+                if len(self._seen_streams) > 4 * self.transport.pool_maxsize:
+                    self._seen_streams.clear()
+                self._seen_streams.add(stream_id)
+            return response
+        finally:
+            self.transport._end(host, stats, time.perf_counter() - started, ok, new_connections)
+
+    def close(self):
+        self.inner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Pool size covers request threads plus the background pollers and queue workers of this process
+outbound_transport = OutboundTransport(
+    HTTP_POOL_MAXSIZE or (WORKER_THREADS + TRACKING_POLL_CONCURRENCY + RETRY_CONCURRENCY + JOB_QUEUE_WORKERS),
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT
+)
+
+
+# =====================================================
+# METRICS (per-route latency, dependency timings)
+# =====================================================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms; each worker flushes a snapshot file that the scrape merges"""
+
+    # Counters and histograms of exited workers, so merged totals never go backwards
+    RETIRED_FILE = 'retired.json'
+
+    def __init__(self, directory: str, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.meta: Dict[str, tuple] = {}  # name -> (type, help)
+        self._values: Dict[tuple, float] = {}  # (name, labels) -> value, counters and gauges
+        self._histograms: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._retire_lock: Optional[FileLock] = None
+        self.collectors: List = []       # run before each flush; values are summed across workers
+        self.live_collectors: List = []  # run only at scrape; host-wide values that must not be summed
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self.meta[name] = (metric_type, help_text)
+
+    @staticmethod
+    def _key(name: str, labels: Optional[Dict]) -> tuple:
+        return (name, tuple(sorted((labels or {}).items())))
+
+    def inc(self, name: str, labels: Optional[Dict] = None, value: float = 1):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, labels: Optional[Dict] = None, value: float = 0):
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def observe(self, name: str, labels: Optional[Dict], value: float, buckets: tuple = LATENCY_BUCKETS):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self) -> Dict:
+        """Serializable copy of this process's metrics (collectors refreshed first)"""
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.warning(f'[WARN] Metrics collector failed: {str(e)}')
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'written_at': time.time(),
+                'values': [[name, list(labels), value] for (name, labels), value in self._values.items()],
+                'histograms': [
+                    [name, list(labels), {**h, 'counts': list(h['counts'])}]
+                    for (name, labels), h in self._histograms.items()
+                ]
+            }
+
+    def flush(self, force: bool = False):
+        """Write this process's snapshot (throttled to once per flush_seconds)"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_seconds:
+            return
+        self._last_flush = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            logger.warning(f'[WARN] Metrics flush failed: {str(e)}')
+
+    def _load_snapshots(self) -> List[Dict]:
+        """This process's live snapshot plus every other worker's last flushed file"""
+        self.flush(force=True)
+        snapshots = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        for name in names:
+            if not name.endswith('.json') or name == self.RETIRED_FILE:
+                continue
+            path = os.path.join(self.directory, name)
+            data = self._read_snapshot(path)
+            if data is None:
+                continue
+            alive = _pid_alive(data.get('pid'))
+            if not alive and time.time() - data.get('written_at', 0) > METRICS_STALE_SECONDS:
+                self._retire(path)
+                continue
+            data['alive'] = alive
+            snapshots.append(data)
+
+        retired = self._read_snapshot(os.path.join(self.directory, self.RETIRED_FILE))
+        if retired:
+            retired['alive'] = False
+            snapshots.append(retired)
+        return snapshots
+
+    @staticmethod
+    def _read_snapshot(path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _retire(self, path: str):
+        """Fold a dead worker's counters and histograms into retired.json, then drop its file"""
+        if self._retire_lock is None:
+            self._retire_lock = FileLock(os.path.join(self.directory, 'retired.lock'))
+        if not self._retire_lock.acquire():
+            return
+        try:
+            data = self._read_snapshot(path)
+            if data is None:
+                return  # Another worker's scrape retired it first
+            retired_path = os.path.join(self.directory, self.RETIRED_FILE)
+            retired = self._read_snapshot(retired_path) or {}
+            retired['alive'] = data['alive'] = False
+            values, histograms = self._merge([retired, data])
+            with open(retired_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'written_at': time.time(),
+                    'values': [[name, list(labels), value] for (name, labels), value in values.items()],
+                    'histograms': [[name, list(labels), h] for (name, labels), h in histograms.items()]
+                }, f)
+            os.replace(retired_path + '.tmp', retired_path)
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f'[WARN] Retiring metrics snapshot {path} failed: {str(e)}')
+        finally:
+            self._retire_lock.release()
+
+    def _merge(self, snapshots: List[Dict]) -> tuple:
+        """Sum values and histograms across snapshots; gauges only from live workers"""
+        values: Dict[tuple, float] = {}
+        histograms: Dict[tuple, Dict] = {}
+        for data in snapshots:
+            for name, labels, value in data.get('values', []):
+                # Gauges of exited workers (e.g. in-flight requests) no longer apply
+                if self.meta.get(name, ('gauge',))[0] == 'gauge' and not data['alive']:
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                values[key] = values.get(key, 0) + value
+            for name, labels, h in data.get('histograms', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.setdefault(key, {'buckets': h['buckets'], 'counts': [0] * len(h['buckets']), 'sum': 0.0, 'count': 0})
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], h['counts'])]
+                merged['sum'] += h['sum']
+                merged['count'] += h['count']
+        return values, histograms
+
+    @staticmethod
+    def _format_labels(labels, extra: Optional[tuple] = None) -> str:
+        pairs = [tuple(pair) for pair in labels] + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        escaped = [
+            '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for k, v in pairs
+        ]
+        return '{' + ','.join(escaped) + '}'
+
+    def render_prometheus(self) -> str:
+        """Merge all workers' snapshots (plus retired totals) into Prometheus text exposition format"""
+        values, histograms = self._merge(self._load_snapshots())
+
+        live = MetricsRegistry(self.directory)
+        for collector in self.live_collectors:
+            try:
+                collector(live)
+            except Exception as e:
+                logger.warning(f'[WARN] Live metrics collector failed: {str(e)}')
+        values.update(live._values)
+
+        lines = []
+        names = sorted({key[0] for key in values} | {key[0] for key in histograms})
+        for name in names:
+            metric_type, help_text = self.meta.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{self._format_labels(labels)} {value}')
+            for (metric, labels), h in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(h['buckets'], h['counts']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._format_labels(labels, ("le", bound))} {cumulative}')
+                lines.append(f'{name}_bucket{self._format_labels(labels, ("le", "+Inf"))} {h["count"]}')
+                lines.append(f'{name}_sum{self._format_labels(labels)} {h["sum"]}')
+                lines.append(f'{name}_count{self._format_labels(labels)} {h["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(METRICS_DIR)
+metrics.describe('http_request_duration_seconds', 'histogram', 'Request latency by route')
+metrics.describe('http_requests_total', 'counter', 'Requests by route, method and status')
+metrics.describe('http_requests_in_flight', 'gauge', 'Requests currently being handled')
+metrics.describe('password_hash_seconds', 'histogram', 'bcrypt hash/verify latency including pool wait')
+metrics.describe('password_hash_rejected_total', 'counter', 'Password operations refused because the pool was saturated')
+metrics.describe('outbound_request_duration_seconds', 'histogram', 'Outbound call latency by dependency')
+metrics.describe('outbound_requests_total', 'counter', 'Outbound calls by dependency and outcome')
+
+
+def record_outbound_call(dependency: str, host: str, seconds: float, ok: bool):
+    """Transport observer: time every Supabase/Razorpay/Qikink call by dependency"""
+    metrics.observe('outbound_request_duration_seconds', {'dependency': dependency}, seconds)
+    metrics.inc('outbound_requests_total', {'dependency': dependency, 'outcome': 'ok' if ok else 'error'})
+
+outbound_transport.observers.append(record_outbound_call)
+
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.request_metrics_done = False
+    metrics.inc('http_requests_in_flight')
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if getattr(g, 'request_started', None) is not None and not g.request_metrics_done:
+        g.request_metrics_done = True
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_duration_seconds', {'route': route, 'method': request.method},
+                        time.perf_counter() - g.request_started)
+        metrics.inc('http_requests_total', {'route': route, 'method': request.method, 'status': str(response.status_code)})
+        metrics.inc('http_requests_in_flight', value=-1)
+        metrics.flush()
+    return response
+
+@bp.teardown_app_request
+def finish_request_metrics(error=None):
+    # after_request is skipped when a response could not be produced
+    if getattr(g, 'request_started', None) is not None and not g.get('request_metrics_done', True):
+        g.request_metrics_done = True
+        metrics.inc('http_requests_in_flight', value=-1)
 
 
 # =====================================================
@@ -146,47 +1187,324 @@ class DatabaseService:
     
     # ==================== PRODUCT OPERATIONS ====================
     
-    def sync_products_to_db(self, products: List[Dict]) -> Dict:
-        """Sync products to Supabase"""
+    PRODUCT_SYNC_FIELDS = (
+        'sku', 'name', 'description', 'price', 'category', 'collection',
+        'manufacturer', 'made_in', 'image_url', 'qikink_product_id'
+    )
+
+    @staticmethod
+    def _product_content_hash(row: Dict) -> str:
+        """Stable hash of the synced product fields (timestamps excluded)"""
+        content = json.dumps(
+            {field: row.get(field) for field in DatabaseService.PRODUCT_SYNC_FIELDS},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def sync_products_to_db(self, products: List[Dict], chunk_size: Optional[int] = None) -> Dict:
+        """Sync products to Supabase with chunked multi-row upserts, skipping unchanged rows"""
+        chunk_size = max(1, chunk_size or PRODUCT_SYNC_CHUNK_SIZE)
+        totals = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        variant_totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        chunks = []
         try:
-            synced_count = 0
-            for product in products:
-                # Upsert product (insert or update if exists)
-                self.db.table('products').upsert({
-                    'sku': product['sku'],
-                    'name': product['name'],
-                    'description': product.get('description'),
-                    'price': product['price'],
-                    'category': product.get('category'),
-                    'collection': product.get('collection'),
-                    'manufacturer': product.get('manufacturer'),
-                    'made_in': product.get('made_in'),
-                    'image_url': product.get('image_url'),
-                    'qikink_product_id': product.get('qikink_product_id'),
-                    'updated_at': datetime.now().isoformat()
-                }, on_conflict='sku').execute()
-                synced_count += 1
-            
-            return {'status': 'success', 'synced': synced_count}
+            for start in range(0, len(products), chunk_size):
+                chunk_started = time.perf_counter()
+                batch = products[start:start + chunk_size]
+
+                rows = {}
+                for product in batch:
+                    row = {
+                        'sku': product['sku'],
+                        'name': product['name'],
+                        'description': product.get('description'),
+                        'price': product['price'],
+                        'category': product.get('category'),
+                        'collection': product.get('collection'),
+                        'manufacturer': product.get('manufacturer'),
+                        'made_in': product.get('made_in'),
+                        'image_url': product.get('image_url'),
+                        'qikink_product_id': product.get('qikink_product_id')
+                    }
+                    row['content_hash'] = self._product_content_hash(row)
+                    rows[row['sku']] = row  # Last occurrence of a duplicate SKU wins
+
+                # One lookup per chunk tells us which rows are new, changed or unchanged
+                # and resolves the parent ids of the chunk's variants
+                existing = self.db.table('products').select('id, sku, content_hash').in_('sku', list(rows)).execute()
+                existing_hashes = {r['sku']: r.get('content_hash') for r in (existing.data or [])}
+                product_ids = {r['sku']: r['id'] for r in (existing.data or [])}
+
+                counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+                changed_rows = []
+                now = datetime.now().isoformat()
+                for sku, row in rows.items():
+                    if sku not in existing_hashes:
+                        counts['inserted'] += 1
+                    elif existing_hashes[sku] != row['content_hash']:
+                        counts['updated'] += 1
+                    else:
+                        counts['unchanged'] += 1
+                        continue
+                    changed_rows.append({**row, 'updated_at': now})
+
+                if changed_rows:
+                    result = self.db.table('products').upsert(changed_rows, on_conflict='sku').execute()
+                    # New products get their ids from the upsert response, not another lookup
+                    product_ids.update({r['sku']: r['id'] for r in (result.data or []) if r.get('id') is not None})
+                    if product_search_index.built_at is not None:
+                        # The stored rows, so this worker's results carry id/created_at like everyone else's
+                        product_search_index.apply(result.data or [])
+
+                variant_counts = self._sync_variants(
+                    {product['sku']: product for product in batch}, product_ids, chunk_size
+                )
+
+                for key in totals:
+                    totals[key] += counts[key]
+                for key in variant_totals:
+                    variant_totals[key] += variant_counts[key]
+                chunks.append({
+                    'chunk': len(chunks) + 1,
+                    'rows': len(rows),
+                    **counts,
+                    'variants': variant_counts,
+                    'duration_ms': round((time.perf_counter() - chunk_started) * 1000, 2)
+                })
+
+            return {
+                'status': 'success',
+                'synced': totals['inserted'] + totals['updated'],
+                **totals,
+                'variants': variant_totals,
+                'chunks': chunks
+            }
         except Exception as e:
-            app.logger.error(f'[ERROR] Database sync failed: {str(e)}')
-            return {'status': 'error', 'message': str(e)}
+            logger.error(f'[ERROR] Database sync failed after {len(chunks)} chunk(s): {str(e)}')
+            return {'status': 'error', 'message': str(e), **totals, 'variants': variant_totals, 'chunks': chunks}
+
+    VARIANT_SYNC_FIELDS = ('product_id', 'sku', 'size', 'color', 'stock')
+
+    @staticmethod
+    def _parse_stock(value: Any) -> Optional[int]:
+        """Stock count from a Qikink variant ("5", "5.0", 5.0, None -> 0); None if unparseable"""
+        if value in (None, ''):
+            return 0
+        try:
+            return max(0, int(float(value)))
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+    def _sync_variants(self, products: Dict[str, Dict], product_ids: Dict[str, int], chunk_size: int) -> Dict:
+        """Upsert the variants of one product chunk keyed by qikink_variant_id, skipping unchanged rows"""
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        rows = {}
+        for sku, product in products.items():
+            for variant in product.get('variants') or []:
+                variant_id = variant.get('qikink_variant_id') or variant.get('variant_id')
+                stock = self._parse_stock(variant.get('stock'))
+                if not variant_id or product_ids.get(sku) is None or stock is None:
+                    counts['skipped'] += 1
+                    continue
+                rows[str(variant_id)] = {
+                    'qikink_variant_id': str(variant_id),
+                    'product_id': product_ids[sku],
+                    'sku': sku,
+                    'size': variant.get('size'),
+                    'color': variant.get('color'),
+                    'stock': stock
+                }
+
+        variant_ids = list(rows)
+        now = datetime.now().isoformat()
+        for start in range(0, len(variant_ids), chunk_size):
+            batch = variant_ids[start:start + chunk_size]
+            existing = self.db.table('variants').select(
+                'qikink_variant_id, ' + ', '.join(self.VARIANT_SYNC_FIELDS)
+            ).in_('qikink_variant_id', batch).execute()
+            existing_rows = {r['qikink_variant_id']: r for r in (existing.data or [])}
+
+            changed_rows = []
+            for variant_id in batch:
+                row = rows[variant_id]
+                current = existing_rows.get(variant_id)
+                if current is None:
+                    counts['inserted'] += 1
+                elif any(current.get(field) != row[field] for field in self.VARIANT_SYNC_FIELDS):
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+                    continue
+                changed_rows.append({**row, 'updated_at': now})
+
+            if changed_rows:
+                self.db.table('variants').upsert(changed_rows, on_conflict='qikink_variant_id').execute()
+        return counts
     
+    # Sort name -> (column, descending); every sort breaks ties on the unique sku
+    PRODUCT_SORTS = {
+        'sku': (None, False),
+        'price_asc': ('price', False),
+        'price_desc': ('price', True),
+        'newest': ('id', True)
+    }
+
+    @staticmethod
+    def _apply_product_filters(query, filters: Optional[Dict]):
+        """Push category/collection/price filters into the PostgREST query"""
+        if filters:
+            if filters.get('category'):
+                query = query.eq('category', filters['category'])
+            if filters.get('collection'):
+                query = query.eq('collection', filters['collection'])
+            if filters.get('min_price') is not None:
+                query = query.gte('price', filters['min_price'])
+            if filters.get('max_price') is not None:
+                query = query.lte('price', filters['max_price'])
+        return query
+
+    @staticmethod
+    def _postgrest_quote(value: Any) -> str:
+        """Quote a value for use inside a PostgREST or() filter"""
+        text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{text}"'
+
+    @staticmethod
+    def encode_cursor(values: List) -> str:
+        """Opaque keyset cursor from the last row's sort values"""
+        raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> List:
+        """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if not isinstance(values, list) or not values:
+            raise ValueError('Invalid cursor')
+        return values
+
+    @classmethod
+    def decode_product_cursor(cls, cursor: str, sort: str) -> List:
+        """Decode a cursor and check it has the shape next_cursor uses for this sort"""
+        values = cls.decode_cursor(cursor)
+        sort_column, _ = cls.PRODUCT_SORTS[sort]
+        if len(values) != (1 if sort_column in (None, 'id') else 2):
+            raise ValueError('Invalid cursor for this sort')
+        return values
+
+    def get_products_page(self, filters: Optional[Dict] = None, sort: str = 'sku',
+                          limit: int = PRODUCTS_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """Get one keyset-paginated page of products; filtering and sorting run in Postgres"""
+        if sort not in self.PRODUCT_SORTS:
+            raise ValueError(f'Unsupported sort: {sort}')
+        sort_column, descending = self.PRODUCT_SORTS[sort]
+        limit = max(1, min(int(limit), PRODUCTS_MAX_PAGE_SIZE))
+
+        query = self._apply_product_filters(self.db.table('products').select('*'), filters)
+
+        if cursor:
+            values = self.decode_product_cursor(cursor, sort)
+            if sort_column is None:
+                query = query.gt('sku', values[0])
+            elif sort_column == 'id':
+                query = query.lt('id', values[0])
+            else:
+                op = 'lt' if descending else 'gt'
+                key, sku = self._postgrest_quote(values[0]), self._postgrest_quote(values[1])
+                query = query.or_(f'{sort_column}.{op}.{key},and({sort_column}.eq.{key},sku.gt.{sku})')
+
+        if sort_column and sort_column != 'sku':
+            query = query.order(sort_column, desc=descending)
+        if sort_column != 'id':
+            query = query.order('sku')
+
+        # Fetch one extra row to learn whether another page exists
+        result = query.limit(limit + 1).execute()
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            if sort_column is None:
+                next_cursor = self.encode_cursor([last['sku']])
+            elif sort_column == 'id':
+                next_cursor = self.encode_cursor([last['id']])
+            else:
+                next_cursor = self.encode_cursor([last[sort_column], last['sku']])
+
+        return {'products': rows, 'next_cursor': next_cursor, 'has_more': has_more}
+
+    def iter_products(self, chunk_size: int = PRODUCT_SYNC_CHUNK_SIZE):
+        """Yield every product in sku order, one keyset chunk at a time"""
+        last_sku = None
+        while True:
+            query = self.db.table('products').select('*')
+            if last_sku is not None:
+                query = query.gt('sku', last_sku)
+            rows = query.order('sku').limit(chunk_size).execute().data or []
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last_sku = rows[-1]['sku']
+
+    def iter_products_updated_since(self, updated_at: str, chunk_size: int = PRODUCT_SYNC_CHUNK_SIZE):
+        """Yield products changed after updated_at, keyset-paginated on (updated_at, sku)"""
+        last = None
+        while True:
+            query = self.db.table('products').select('*')
+            if last is None:
+                query = query.gt('updated_at', updated_at)
+            else:
+                ts, sku = self._postgrest_quote(last['updated_at']), self._postgrest_quote(last['sku'])
+                query = query.or_(f'updated_at.gt.{ts},and(updated_at.eq.{ts},sku.gt.{sku})')
+            rows = query.order('updated_at').order('sku').limit(chunk_size).execute().data or []
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1]
+
+    def iter_variants(self, chunk_size: int = PRODUCT_SYNC_CHUNK_SIZE):
+        """Yield the facet columns of every variant, one keyset chunk at a time"""
+        last_id = None
+        while True:
+            query = self.db.table('variants').select('id, product_id, size, color, stock')
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(chunk_size).execute().data or []
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]['id']
+
+    def get_product_stock(self, sku: str) -> Optional[Dict]:
+        """Compact per-variant stock for one SKU; variants carry the SKU so no join is needed.
+
+        None only for unknown SKUs: a product synced without variant ids gets an
+        in-stock summary with stock_known=False and no per-variant counts.
+        """
+        result = self.db.table('variants').select('size, color, stock').eq('sku', sku).execute()
+        if result.data:
+            return build_stock_summary(sku, result.data)
+        product = self.db.table('products').select('sku').eq('sku', sku).limit(1).execute()
+        if not product.data:
+            return None
+        # Same rule as FacetIndex: unknown stock counts as in stock
+        return {'sku': sku, 'total_stock': None, 'in_stock': True, 'stock_known': False, 'stock': {}}
+
     def get_products_from_db(self, filters: Optional[Dict] = None) -> List[Dict]:
         """Get products from Supabase with optional filters"""
         try:
-            query = self.db.table('products').select('*')
-            
-            if filters:
-                if filters.get('category'):
-                    query = query.eq('category', filters['category'])
-                if filters.get('collection'):
-                    query = query.eq('collection', filters['collection'])
-            
+            query = self._apply_product_filters(self.db.table('products').select('*'), filters)
             result = query.execute()
             return result.data if result.data else []
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to fetch products: {str(e)}')
+            logger.error(f'[ERROR] Failed to fetch products: {str(e)}')
             return []
     
     # ==================== ORDER OPERATIONS ====================
@@ -212,11 +1530,12 @@ class DatabaseService:
             
             return result.data[0] if result.data else None
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to create order: {str(e)}')
+            logger.error(f'[ERROR] Failed to create order: {str(e)}')
             return None
     
     def update_order_status(self, order_id: str, status: str, qikink_order_id: Optional[str] = None, 
-                           qikink_shipment_id: Optional[str] = None, tracking_number: Optional[str] = None) -> bool:
+                           qikink_shipment_id: Optional[str] = None, tracking_number: Optional[str] = None,
+                           fulfillment_status: Optional[str] = None) -> bool:
         """Update order status"""
         try:
             update_data = {
@@ -230,11 +1549,25 @@ class DatabaseService:
                 update_data['qikink_shipment_id'] = qikink_shipment_id
             if tracking_number:
                 update_data['tracking_number'] = tracking_number
+            if fulfillment_status:
+                update_data['fulfillment_status'] = fulfillment_status
             
             self.db.table('orders').update(update_data).eq('order_id', order_id).execute()
             return True
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to update order status: {str(e)}')
+            logger.error(f'[ERROR] Failed to update order status: {str(e)}')
+            return False
+
+    def update_fulfillment_status(self, order_id: str, fulfillment_status: str) -> bool:
+        """Update only the fulfillment progress of an order"""
+        try:
+            self.db.table('orders').update({
+                'fulfillment_status': fulfillment_status,
+                'updated_at': datetime.now().isoformat()
+            }).eq('order_id', order_id).execute()
+            return True
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to update fulfillment status: {str(e)}')
             return False
     
     def get_order_by_id(self, order_id: str) -> Optional[Dict]:
@@ -249,7 +1582,16 @@ class DatabaseService:
                 return order
             return None
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to get order: {str(e)}')
+            logger.error(f'[ERROR] Failed to get order: {str(e)}')
+            return None
+
+    def get_order_by_razorpay_id(self, razorpay_order_id: str) -> Optional[Dict]:
+        """Get the order a Razorpay order id belongs to (webhooks only carry that id)"""
+        try:
+            result = self.db.table('orders').select('*').eq('razorpay_order_id', razorpay_order_id).limit(1).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to get order by Razorpay id: {str(e)}')
             return None
 
     def get_orders_by_status(self, statuses: List[str]) -> List[Dict]:
@@ -259,36 +1601,143 @@ class DatabaseService:
             result = self.db.table('orders').select('*').in_('status', statuses).execute()
             return result.data if result.data else []
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to get orders by status: {str(e)}')
+            logger.error(f'[ERROR] Failed to get orders by status: {str(e)}')
+            return []
+
+    def get_orders_page(self, filters: Optional[Dict] = None, limit: int = ADMIN_ORDERS_PAGE_SIZE,
+                        cursor: Optional[str] = None) -> Dict:
+        """Get one page of orders, newest first, keyset-paginated on (created_at, id)"""
+        limit = max(1, min(int(limit), ORDERS_EXPORT_CHUNK_SIZE))
+        query = self.db.table('orders').select('*')
+
+        # status and created_at filters are served by idx_orders_status / idx_orders_created_at
+        if filters:
+            if filters.get('status'):
+                query = query.eq('status', filters['status'])
+            if filters.get('date_from'):
+                query = query.gte('created_at', filters['date_from'])
+            if filters.get('date_to'):
+                query = query.lt('created_at', filters['date_to'])
+
+        if cursor:
+            values = self.decode_cursor(cursor)
+            # Valid JSON of the wrong types is a bad cursor too (a 400, not a TypeError)
+            if len(values) != 2 or not isinstance(values[0], str) or type(values[1]) is not int:
+                raise ValueError('Invalid cursor')
+            created_at = self._postgrest_quote(values[0])
+            query = query.or_(f'created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{values[1]})')
+
+        result = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = self.encode_cursor([rows[-1]['created_at'], rows[-1]['id']])
+        return {'orders': rows, 'next_cursor': next_cursor, 'has_more': has_more}
+
+    def iter_orders(self, filters: Optional[Dict] = None, chunk_size: int = ORDERS_EXPORT_CHUNK_SIZE):
+        """Yield every matching order, fetching one keyset page at a time"""
+        cursor = None
+        while True:
+            page = self.get_orders_page(filters, limit=chunk_size, cursor=cursor)
+            for order in page['orders']:
+                yield order
+            if not page['next_cursor']:
+                return
+            cursor = page['next_cursor']
+
+    # ==================== TRACKING LOG OPERATIONS ====================
+
+    def insert_tracking_events(self, events: List[Dict]) -> Dict:
+        """Write tracking events in multi-row batches, skipping ones already stored.
+
+        Insert-or-ignore on idx_tracking_logs_event, so re-polling an order
+        whose history is unchanged adds no rows. Returns
+        {'status', 'inserted', 'duplicates', 'failed'}; a failed batch does not
+        stop later batches.
+        """
+        inserted = failed = 0
+        for start in range(0, len(events), TRACKING_LOG_BATCH_SIZE):
+            batch = events[start:start + TRACKING_LOG_BATCH_SIZE]
+            try:
+                result = self.db.table('tracking_logs').upsert(
+                    batch,
+                    on_conflict='qikink_order_id,event_timestamp,status',
+                    ignore_duplicates=True
+                ).execute()
+                # Ignored duplicates are left out of the returned representation
+                inserted += len(result.data or [])
+            except Exception as e:
+                failed += len(batch)
+                logger.error(f'[ERROR] Failed to write {len(batch)} tracking events: {str(e)}')
+        return {
+            'status': 'error' if failed else 'success',
+            'inserted': inserted,
+            'duplicates': len(events) - inserted - failed,
+            'failed': failed
+        }
+
+    def get_tracking_timeline(self, order_pk: int) -> List[Dict]:
+        """Stored tracking events for one order (orders.id), oldest first"""
+        try:
+            result = self.db.table('tracking_logs') \
+                .select('status, location, description, tracking_number, event_timestamp') \
+                .eq('order_id', order_pk) \
+                .order('event_timestamp') \
+                .execute()
+            return result.data or []
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to get tracking timeline: {str(e)}')
             return []
 
     # ==================== PAYMENT OPERATIONS ====================
 
-    def create_payment_record(self, payment_data: Dict) -> Optional[Dict]:
-        """Create a payment record after verification/capture"""
+    def claim_payment_record(self, payment_data: Dict) -> Dict:
+        """Insert a payment unless its idempotency_key exists, in one round trip.
+
+        Insert-or-ignore on the payments.idempotency_key unique index, so two
+        concurrent callers cannot both claim the same key. Returns
+        {'status': 'created', 'record': ...}, {'status': 'duplicate'} or
+        {'status': 'error', 'message': ...}.
+        """
         try:
-            result = self.db.table('payments').insert({
+            result = self.db.table('payments').upsert({
                 'razorpay_payment_id': payment_data['razorpay_payment_id'],
                 'razorpay_order_id': payment_data['razorpay_order_id'],
                 'amount': payment_data['amount'],
                 'currency': payment_data.get('currency', 'INR'),
                 'status': payment_data.get('status', 'created'),
                 'payment_method': payment_data.get('payment_method'),
-                'idempotency_key': payment_data.get('idempotency_key'),
+                'idempotency_key': payment_data['idempotency_key'],
                 'webhook_processed': payment_data.get('webhook_processed', False)
-            }).execute()
-            return result.data[0] if result.data else None
+            }, on_conflict='idempotency_key', ignore_duplicates=True).execute()
+            # Ignored duplicates come back as an empty representation
+            if result.data:
+                return {'status': 'created', 'record': result.data[0]}
+            return {'status': 'duplicate'}
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to create payment record: {str(e)}')
-            return None
+            logger.error(f'[ERROR] Failed to claim payment record: {str(e)}')
+            return {'status': 'error', 'message': str(e)}
 
-    def verify_payment_not_processed(self, idempotency_key: str) -> bool:
-        """Check if payment already processed (prevent duplicates)"""
+    # ==================== WEBHOOK LOG OPERATIONS ====================
+
+    def log_webhook(self, webhook_type: str, event_id: str, payload: Dict, status: str,
+                    error_message: Optional[str] = None) -> bool:
+        """Record a processed (or failed) webhook event in webhook_logs"""
         try:
-            result = self.db.table('payments').select('id').eq('idempotency_key', idempotency_key).execute()
-            return len(result.data) == 0
+            self.db.table('webhook_logs').insert({
+                'webhook_type': webhook_type,
+                'event_id': event_id,
+                'payload': payload,
+                'status': status,
+                'error_message': error_message,
+                'processed_at': datetime.now().isoformat()
+            }).execute()
+            return True
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to check idempotency: {str(e)}')
+            logger.error(f'[ERROR] Failed to log webhook: {str(e)}')
             return False
 
     # ==================== FAILED JOB OPERATIONS (for retries) ====================
@@ -303,27 +1752,37 @@ class DatabaseService:
                 'error_message': error_message,
                 'status': 'pending',
                 'retry_count': 0,
+                'max_retries': FAILED_JOB_MAX_RETRIES,
+                # Aware UTC so the comparison with NOW() in claim_failed_jobs() is host-timezone safe
+                'next_retry_at': (datetime.now(timezone.utc) + timedelta(seconds=RETRY_BACKOFF_BASE_SECONDS)).isoformat(),
                 'created_at': datetime.now().isoformat()
             }).execute()
             return True
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to log failed job: {str(e)}')
+            logger.error(f'[ERROR] Failed to log failed job: {str(e)}')
             return False
 
-    def get_pending_failed_jobs(self, job_type: Optional[str] = None) -> List[Dict]:
-        """Retrieve all pending failed jobs, optionally filtered by type"""
-        try:
-            query = self.db.table('failed_jobs').select('*').eq('status', 'pending').lte('retry_count', 3)
-            if job_type:
-                query = query.eq('job_type', job_type)
+    def claim_failed_jobs(self, job_type: str, limit: int = RETRY_BATCH_SIZE,
+                          lease_seconds: int = RETRY_LEASE_SECONDS) -> List[Dict]:
+        """Atomically claim up to `limit` due jobs (see claim_failed_jobs() in setup.sql).
 
-            result = query.execute()
+        Claimed rows move to 'processing' with next_retry_at pushed out by the
+        lease, so concurrent claimers skip them and a crashed worker's rows
+        become due again once the lease runs out.
+        """
+        try:
+            result = self.db.rpc('claim_failed_jobs', {
+                'p_job_type': job_type,
+                'p_limit': limit,
+                'p_lease_seconds': lease_seconds
+            }).execute()
             return result.data if result.data else []
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to get pending failed jobs: {str(e)}')
+            logger.error(f'[ERROR] Failed to claim failed jobs: {str(e)}')
             return []
 
-    def update_failed_job(self, job_id: int, status: str, retry_count: Optional[int] = None) -> bool:
+    def update_failed_job(self, job_id: int, status: str, retry_count: Optional[int] = None,
+                          next_retry_at: Optional[datetime] = None, error_message: Optional[str] = None) -> bool:
         """Update the status of a failed job"""
         try:
             update_data = {
@@ -332,35 +1791,62 @@ class DatabaseService:
             }
             if retry_count is not None:
                 update_data['retry_count'] = retry_count
+            if next_retry_at is not None:
+                update_data['next_retry_at'] = next_retry_at.isoformat()
+            if error_message is not None:
+                update_data['error_message'] = error_message
 
             self.db.table('failed_jobs').update(update_data).eq('id', job_id).execute()
             return True
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to update failed job: {str(e)}')
+            logger.error(f'[ERROR] Failed to update failed job: {str(e)}')
             return False
 
+    def get_failed_job_stats(self, job_type: Optional[str] = None) -> Dict:
+        """Queue depth by status plus how many pending jobs are due right now"""
+        try:
+            query = self.db.table('failed_jobs_summary').select('job_type, status, count')
+            if job_type:
+                query = query.eq('job_type', job_type)
+            by_status = {row['status']: row['count'] for row in query.execute().data or []}
+
+            due = self.db.table('failed_jobs').select('id', count='exact') \
+                .eq('status', 'pending').lte('next_retry_at', datetime.now(timezone.utc).isoformat())
+            if job_type:
+                due = due.eq('job_type', job_type)
+            return {'by_status': by_status, 'due_now': due.limit(1).execute().count or 0}
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to get failed job stats: {str(e)}')
+            return {}
+
     # ==================== ADMIN/ANALYTICS OPERATIONS ====================
 
-    def get_dashboard_stats(self) -> Dict:
-        """Get dashboard statistics"""
+    def get_dashboard_stats(self, days: int = DASHBOARD_DAILY_DAYS) -> Dict:
+        """Get dashboard statistics aggregated in Postgres with a single RPC round trip.
+
+        Raises on failure so dashboard_cache keeps serving the last good stats.
+        """
         try:
-            orders = self.get_all_orders()
-            
+            result = self.db.rpc('get_dashboard_stats', {'p_days': days}).execute()
+            data = result.data or {}
+            totals = data.get('totals') or {}
+
             stats = {
-                'total_orders': len(orders),
-                'pending_orders': len([o for o in orders if o['status'] == 'pending']),
-                'payment_verified': len([o for o in orders if o['status'] == 'payment_verified']),
-                'qikink_submitted': len([o for o in orders if o['status'] == 'qikink_submitted']),
-                'shipped': len([o for o in orders if o['status'] == 'shipped']),
-                'delivered': len([o for o in orders if o['status'] == 'delivered']),
-                'total_revenue': sum(float(o.get('total_amount', 0)) for o in orders),
-                'average_order_value': sum(float(o.get('total_amount', 0)) for o in orders) / len(orders) if orders else 0
+                'total_orders': int(totals.get('total_orders') or 0),
+                'pending_orders': int(totals.get('pending_orders') or 0),
+                'payment_verified': int(totals.get('payment_verified') or 0),
+                'qikink_submitted': int(totals.get('qikink_submitted') or 0),
+                'shipped': int(totals.get('shipped') or 0),
+                'delivered': int(totals.get('delivered') or 0),
+                'total_revenue': float(totals.get('total_revenue') or 0),
+                'average_order_value': float(totals.get('average_order_value') or 0),
+                'daily': data.get('daily') or []
             }
             
             return stats
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to get dashboard stats: {str(e)}')
-            return {}
+            logger.error(f'[ERROR] Failed to get dashboard stats: {str(e)}')
+            raise
 
 
 class RazorpayMediatorService:
@@ -370,11 +1856,12 @@ class RazorpayMediatorService:
         self.client = razorpay_client
         self.db = db_service
         self.key_secret = RAZORPAY_KEY_SECRET
+        self.webhook_secret = RAZORPAY_WEBHOOK_SECRET
 
     def create_order(self, amount: int, currency: str = 'INR', receipt: Optional[str] = None) -> Optional[Dict]:
         """Create Razorpay order"""
         if not self.client:
-            app.logger.warning('[WARN] Razorpay client not initialized')
+            logger.warning('[WARN] Razorpay client not initialized')
             return None
         try:
             order_data = {
@@ -385,7 +1872,7 @@ class RazorpayMediatorService:
             order = self.client.order.create(data=order_data)
             return order
         except Exception as e:
-            app.logger.error(f'[ERROR] Failed to create Razorpay order: {str(e)}')
+            logger.error(f'[ERROR] Failed to create Razorpay order: {str(e)}')
             return None
 
     def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
@@ -399,49 +1886,68 @@ class RazorpayMediatorService:
             ).hexdigest()
             return expected_signature == signature
         except Exception as e:
-            app.logger.error(f'[ERROR] Signature verification failed: {str(e)}')
+            logger.error(f'[ERROR] Signature verification failed: {str(e)}')
             return False
 
-    def process_webhook(self, payload: Dict, signature: str) -> Dict:
-        """Process Razorpay webhook with idempotency"""
-        try:
-            event = payload.get('event')
-            payment_entity = payload.get('payload', {}).get('payment', {}).get('entity', {})
-            
-            # Use the official verify webhook signature method
-            self.client.utility.verify_webhook_signature(json.dumps(payload), signature, self.key_secret)
-            
-            if event == 'payment.captured':
-                idempotency_key = f"{payment_entity.get('id')}_captured"
-                if not self.db.verify_payment_not_processed(idempotency_key):
-                    return {'status': 'duplicate', 'message': 'Already processed'}
-
-                # 1. Create Payment Record
-                payment_record = self.db.create_payment_record({
-                    'razorpay_payment_id': payment_entity.get('id'),
-                    'razorpay_order_id': payment_entity.get('order_id'),
-                    'amount': payment_entity.get('amount', 0) / 100,
-                    'status': 'captured',
-                    'payment_method': payment_entity.get('method'),
-                    'idempotency_key': idempotency_key
-                })
-                
-                # 2. Update Order Status
-                if payment_entity.get('order_id'):
-                    order = self.db.get_order_by_razorpay_id(payment_entity.get('order_id'))
-                    if order:
-                        self.db.update_order_status(order['order_id'], 'payment_captured')
-                        return {'status': 'success', 'order_id': order['order_id'], 'action': 'Order status updated'}
-
-                return {'status': 'success', 'action': 'Payment recorded'}
-            
-            return {'status': 'ignored', 'message': f'Event {event} ignored'}
-        
-        except razorpay.errors.SignatureVerificationError:
-            app.logger.error('[ERROR] Razorpay Webhook Signature Verification Failed')
+    def verify_webhook_signature(self, body: bytes, signature: str) -> bool:
+        """Check X-Razorpay-Signature against the exact request bytes Razorpay signed"""
+        if not self.webhook_secret or not signature:
+            return False
+        expected_signature = hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected_signature, signature)
+
+    def handle_webhook_event(self, payload: Dict) -> Dict:
+        """Apply an already verified webhook event (runs on a queue worker)"""
+        event = payload.get('event')
+        payment_entity = payload.get('payload', {}).get('payment', {}).get('entity', {})
+
+        if event == 'payment.captured':
+            idempotency_key = f"{payment_entity.get('id')}_captured"
+            if idempotency_key in recent_payment_keys:
+                return {'status': 'duplicate', 'message': 'Already processed'}
+
+            # 1. Create Payment Record (claims the idempotency key)
+            claim = self.db.claim_payment_record({
+                'razorpay_payment_id': payment_entity.get('id'),
+                'razorpay_order_id': payment_entity.get('order_id'),
+                'amount': payment_entity.get('amount', 0) / 100,
+                'status': 'captured',
+                'payment_method': payment_entity.get('method'),
+                'idempotency_key': idempotency_key
+            })
+            if claim['status'] == 'error':
+                return {'status': 'error', 'message': 'Failed to record payment'}
+
+            # 2. Update Order Status. A duplicate whose order is still pending was claimed by
+            # an attempt that died before this step, so it still gets payment_captured
+            order = None
+            if payment_entity.get('order_id'):
+                order = self.db.get_order_by_razorpay_id(payment_entity.get('order_id'))
+            if claim['status'] == 'duplicate' and not (order and order.get('status') == 'pending'):
+                recent_payment_keys.add(idempotency_key)
+                return {'status': 'duplicate', 'message': 'Already processed'}
+
+            if order:
+                if not self.db.update_order_status(order['order_id'], 'payment_captured'):
+                    # Not cached as processed, so the queue's retry applies it
+                    return {'status': 'error', 'message': 'Failed to update order status'}
+                recent_payment_keys.add(idempotency_key)
+                return {'status': 'success', 'order_id': order['order_id'], 'action': 'Order status updated'}
+
+            recent_payment_keys.add(idempotency_key)
+            return {'status': 'success', 'action': 'Payment recorded'}
+
+        return {'status': 'ignored', 'message': f'Event {event} ignored'}
+
+    def process_webhook(self, body: bytes, signature: str) -> Dict:
+        """Verify and apply a webhook inline (used when the job queue is unavailable)"""
+        if not self.verify_webhook_signature(body, signature):
+            logger.error('[ERROR] Razorpay Webhook Signature Verification Failed')
             return {'status': 'error', 'message': 'Signature verification failed'}
+        try:
+            return self.handle_webhook_event(json.loads(body))
         except Exception as e:
-            app.logger.error(f'[ERROR] Razorpay Webhook Processing Failed: {str(e)}')
+            logger.error(f'[ERROR] Razorpay Webhook Processing Failed: {str(e)}')
             return {'status': 'error', 'message': str(e)}
 
 class QikinkMediatorService:
@@ -455,49 +1961,106 @@ class QikinkMediatorService:
         self.db = db_service
         self.access_token = None
         self.token_expiry = datetime.min
+        self.token_lifetime: Optional[float] = None  # Seconds a fresh token lasts, once observed
+        self.token_cache = SharedTokenCache(QIKINK_TOKEN_CACHE_PATH)
+        self._token_lock = threading.Lock()
+        self._refresher_started = False
+        self.rate_limiter = RateLimiter(QIKINK_RATE_LIMIT_RPS)
         self.session = self._create_session()
 
     def _create_session(self):
-        """Create a requests session with retry logic"""
-        session = requests.Session()
-        if RETRY_AVAILABLE:
-            retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-            adapter = HTTPAdapter(max_retries=retries)
-            session.mount('http://', adapter)
-            session.mount('https://', adapter)
-        return session
-
-    def authenticate(self) -> bool:
-        """Fetch a new access token if expired or not set"""
-        if self.access_token and self.token_expiry > datetime.now() + timedelta(minutes=5):
+        """Create a pooled session with retry logic from the shared outbound transport"""
+        outbound_transport.register_host(self.auth_url, 'qikink')
+        retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504]) if RETRY_AVAILABLE else None
+        return outbound_transport.session('qikink', self.api_base_url, retries=retries)
+
+    def _token_valid(self, margin_seconds: float) -> bool:
+        """True if the in-memory token is still good for at least margin_seconds"""
+        return bool(self.access_token) and self.token_expiry > datetime.now() + timedelta(seconds=margin_seconds)
+
+    def renew_margin(self, margin_seconds: float, fraction: float) -> float:
+        """margin_seconds, capped to a fraction of the token lifetime so short-lived tokens aren't refetched nonstop"""
+        if self.token_lifetime:
+            return min(margin_seconds, self.token_lifetime * fraction)
+        return margin_seconds
+
+    def authenticate(self, margin_seconds: Optional[float] = None) -> bool:
+        """Ensure a valid access token; concurrent callers share a single refresh"""
+        if margin_seconds is None:
+            # Request path: 300s ahead, or a quarter of the lifetime for short-lived tokens
+            margin_seconds = self.renew_margin(300, 0.25)
+        if self._token_valid(margin_seconds):
             return True
 
+        with self._token_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token_valid(margin_seconds):
+                return True
+            return self._refresh_token(margin_seconds)
+
+    def _refresh_token(self, margin_seconds: float) -> bool:
+        """Adopt a token another worker already fetched, or fetch one and share it"""
         try:
-            response = self.session.post(
-                self.auth_url,
-                data={
-                    'grant_type': 'client_credentials',
-                    'client_id': self.client_id,
-                    'client_secret': self.client_secret
-                },
-                verify=False,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            self.access_token = data['access_token']
-            # Set expiry time a bit before actual expiry (e.g., 1 hour less)
-            expires_in = data.get('expires_in', 3600)
-            self.token_expiry = datetime.now() + timedelta(seconds=expires_in) - timedelta(hours=1)
+            with self.token_cache.lock:
+                shared = self.token_cache.read()
+                if shared:
+                    expires_at = datetime.fromisoformat(shared['expires_at'])
+                    if expires_at > datetime.now() + timedelta(seconds=margin_seconds):
+                        self.access_token = shared['access_token']
+                        self.token_expiry = expires_at
+                        if not self.token_lifetime:
+                            # Lower bound: what is left of a token another worker fetched
+                            self.token_lifetime = (expires_at - datetime.now()).total_seconds()
+                        return True
+
+                response = self.session.post(
+                    self.auth_url,
+                    data={
+                        'grant_type': 'client_credentials',
+                        'client_id': self.client_id,
+                        'client_secret': self.client_secret
+                    },
+                    verify=False
+                )
+                response.raise_for_status()
+                
+                data = response.json()
+                self.access_token = data['access_token']
+                # Keep the real expiry; callers renew ahead of it via margin_seconds
+                expires_in = data.get('expires_in', 3600)
+                self.token_lifetime = float(expires_in)
+                self.token_expiry = datetime.now() + timedelta(seconds=expires_in)
+                self.token_cache.write(self.access_token, self.token_expiry)
             
-            app.logger.info('[OK] Qikink token refreshed')
+            logger.info('[OK] Qikink token refreshed')
             return True
         except Exception as e:
-            app.logger.error(f'[ERROR] Qikink authentication failed: {str(e)}')
-            self.access_token = None
+            logger.error(f'[ERROR] Qikink authentication failed: {str(e)}')
+            if not self._token_valid(0):
+                self.access_token = None
             return False
 
+    def start_token_refresher(self):
+        """Renew the token in the background so it is never fetched on a customer request"""
+        if self._refresher_started:
+            return
+        self._refresher_started = True
+
+        def refresh_loop():
+            while True:
+                # Renew earlier than request-path callers would (300s, or a quarter of the lifetime)
+                margin = self.renew_margin(QIKINK_TOKEN_RENEW_SECONDS, 0.5)
+                if not self.authenticate(margin_seconds=margin):
+                    time.sleep(30)
+                    continue
+                # The first fetch may have just revealed a short lifetime
+                margin = self.renew_margin(QIKINK_TOKEN_RENEW_SECONDS, 0.5)
+                seconds_left = (self.token_expiry - datetime.now()).total_seconds() - margin
+                time.sleep(max(1, seconds_left))
+
+        threading.Thread(target=refresh_loop, name='qikink-token-refresher', daemon=True).start()
+        logger.info('[OK] Qikink token refresher started')
+
     def get_headers(self) -> Dict:
         """Get authenticated headers"""
         if not self.authenticate():
@@ -511,10 +2074,10 @@ class QikinkMediatorService:
         """Fetch products from Qikink and sync to database"""
         try:
             headers = self.get_headers()
+            self.rate_limiter.acquire()
             response = self.session.get(
                 f'{self.api_base_url}/products',
                 headers=headers,
-                timeout=30,
                 verify=False
             )
             response.raise_for_status()
@@ -522,26 +2085,37 @@ class QikinkMediatorService:
             qikink_products = response.json().get('products', [])
             if self.db:
                 sync_result = self.db.sync_products_to_db(qikink_products)
+                if sync_result.get('status') != 'success':
+                    return {**sync_result, 'fetched': len(qikink_products)}
+                variants = sync_result.get('variants', {})
+                if sync_result.get('synced', 0) or variants.get('inserted', 0) or variants.get('updated', 0):
+                    invalidate_catalog_caches()
                 return {
                     'status': 'success',
                     'fetched': len(qikink_products),
-                    'synced': sync_result.get('synced', 0)
+                    'synced': sync_result.get('synced', 0),
+                    'inserted': sync_result.get('inserted', 0),
+                    'updated': sync_result.get('updated', 0),
+                    'unchanged': sync_result.get('unchanged', 0),
+                    'variants': variants,
+                    'chunks': sync_result.get('chunks', [])
                 }
             else:
                 return {'status': 'error', 'message': 'Database not configured'}
 
         except requests.exceptions.RequestException as e:
-            app.logger.error(f'[ERROR] Qikink product sync failed: {str(e)}')
+            logger.error(f'[ERROR] Qikink product sync failed: {str(e)}')
             return {'status': 'error', 'message': f'Qikink API Error: {str(e)}'}
         except Exception as e:
-            app.logger.error(f'[ERROR] Product sync failed: {str(e)}')
+            logger.error(f'[ERROR] Product sync failed: {str(e)}')
             return {'status': 'error', 'message': str(e)}
 
-    def submit_order_to_qikink(self, order_id: str) -> Dict:
+    def submit_order_to_qikink(self, order_id: str, log_failure: bool = True) -> Dict:
         """Submit order to Qikink after payment verification"""
         if not self.db:
             return {'status': 'error', 'message': 'Database not configured'}
         
+        shipment_payload = {'order_id': order_id}
         try:
             order = self.db.get_order_by_id(order_id)
             if not order:
@@ -562,11 +2136,11 @@ class QikinkMediatorService:
                 'total_amount': float(order['total_amount'])
             }
 
+            self.rate_limiter.acquire()
             response = self.session.post(
                 f'{self.api_base_url}/orders',
                 headers=headers,
                 json=shipment_payload,
-                timeout=30,
                 verify=False
             )
             
@@ -577,25 +2151,31 @@ class QikinkMediatorService:
             
             if qikink_result.get('status') == 'success' and qikink_order_id:
                 # Update DB with Qikink Order ID and status
-                self.db.update_order_status(order_id, 'qikink_submitted', qikink_order_id=qikink_order_id)
+                self.db.update_order_status(order_id, 'qikink_submitted', qikink_order_id=qikink_order_id,
+                                            fulfillment_status='submitted')
                 return {
                     'status': 'success',
                     'qikink_order_id': qikink_order_id
                 }
             else:
                 error_msg = qikink_result.get('message', 'Unknown Qikink error')
-                self.db.add_failed_job('qikink_order_submission', order_id, shipment_payload, error_msg)
+                if log_failure:
+                    self.db.add_failed_job('qikink_order_submission', order_id, shipment_payload, error_msg)
                 return {'status': 'error', 'message': error_msg}
         
         except requests.exceptions.RequestException as e:
             error_msg = f'Qikink API Error: {str(e)}'
-            app.logger.error(f'[ERROR] Qikink order submission failed for {order_id}: {error_msg}')
+            logger.error(f'[ERROR] Qikink order submission failed for {order_id}: {error_msg}')
             # Log for retry
-            self.db.add_failed_job('qikink_order_submission', order_id, shipment_payload, error_msg)
+            if log_failure:
+                self.db.add_failed_job('qikink_order_submission', order_id, shipment_payload, error_msg)
             return {'status': 'error', 'message': error_msg}
         
         except Exception as e:
-            app.logger.error(f'[ERROR] Qikink order submission failed for {order_id}: {str(e)}')
+            logger.error(f'[ERROR] Qikink order submission failed for {order_id}: {str(e)}')
+            # DB errors and malformed orders also need a failed_jobs row on the queue's last attempt
+            if log_failure:
+                self.db.add_failed_job('qikink_order_submission', order_id, shipment_payload, str(e))
             return {'status': 'error', 'message': str(e)}
 
     def fetch_tracking_updates(self, qikink_order_id: str) -> Optional[Dict]:
@@ -603,22 +2183,22 @@ class QikinkMediatorService:
         try:
             headers = self.get_headers()
             
+            self.rate_limiter.acquire()
             response = self.session.get(
                 f'{self.api_base_url}/shipments/{qikink_order_id}/status',
                 headers=headers,
-                timeout=15,
                 verify=False
             )
             
             if response.status_code == 200:
                 tracking_data = response.json()
-                app.logger.info(f'[OK] Tracking fetched for: {qikink_order_id}')
+                logger.info(f'[OK] Tracking fetched for: {qikink_order_id}')
                 return tracking_data
             else:
-                app.logger.warning(f'[WARN] Tracking fetch failed: {response.status_code}')
+                logger.warning(f'[WARN] Tracking fetch failed: {response.status_code}')
                 return None
         except Exception as e:
-            app.logger.error(f'[ERROR] Tracking fetch error: {str(e)}')
+            logger.error(f'[ERROR] Tracking fetch error: {str(e)}')
             return None
 
     def test_connection(self) -> Dict:
@@ -629,147 +2209,1491 @@ class QikinkMediatorService:
                 'status': 'connected' if auth_success else 'failed',
                 'authenticated': auth_success
             }
-        except Exception as e:
-            return {'status': 'error', 'message': str(e)}
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+# =====================================================
+# BACKGROUND JOB HELPERS (from background_jobs.py)
+# =====================================================
+
+class TrackingSchedule:
+    """Per-order next-poll-at times for active orders, kept in a min-heap.
+
+    An order is polled again after an interval set by its status, doubled for
+    every full day its status has not changed, clamped to
+    [TRACKING_MIN_INTERVAL_MINUTES, TRACKING_MAX_INTERVAL_HOURS] and cut to
+    the minimum inside the expected-delivery window. Heap entries are
+    (next_poll_at, order_id); rescheduling pushes a new entry and pop_due()
+    skips entries that no longer match the order's current slot.
+    """
+
+    # Hours between polls right after a status change
+    STATUS_INTERVAL_HOURS = {
+        'qikink_submitted': 2 * TRACKING_UPDATE_INTERVAL,
+        'shipped': TRACKING_UPDATE_INTERVAL,
+        'in_transit': TRACKING_UPDATE_INTERVAL,
+    }
+    MAX_BACKOFF_DOUBLINGS = 6
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._orders: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_timestamp(value: Any) -> Optional[float]:
+        """Epoch seconds for an ISO timestamp (naive ones are taken as UTC)"""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+    def interval_seconds(self, entry: Dict, now: float) -> float:
+        base = self.STATUS_INTERVAL_HOURS.get(entry['status'], TRACKING_UPDATE_INTERVAL) * 3600
+        unchanged_days = int(max(0.0, now - entry['last_change_at']) // 86400)
+        interval = base * (2 ** min(unchanged_days, self.MAX_BACKOFF_DOUBLINGS))
+        expected = entry['expected_delivery_at']
+        if expected is not None and abs(expected - now) <= TRACKING_DELIVERY_WINDOW_HOURS * 3600:
+            interval = 0
+        interval = max(TRACKING_MIN_INTERVAL_MINUTES * 60, min(TRACKING_MAX_INTERVAL_HOURS * 3600, interval))
+        # Jitter so orders submitted together don't stay in lockstep
+        return interval * random.uniform(0.9, 1.1)
+
+    def _push(self, order_id: str, entry: Dict, next_poll_at: float):
+        entry['next_poll_at'] = next_poll_at
+        heapq.heappush(self._heap, (next_poll_at, order_id))
+
+    def sync(self, orders: List[Dict], now: float):
+        """Track newly active orders and forget ones that left the active statuses"""
+        active = {order['order_id']: order for order in orders}
+        with self._lock:
+            for order_id in [o for o in self._orders if o not in active]:
+                del self._orders[order_id]
+
+            for order_id, order in active.items():
+                entry = self._orders.get(order_id)
+                if entry is None:
+                    # First sight (new order or restart): due one interval after its last update
+                    entry = {
+                        'order': order,
+                        'status': order['status'],
+                        'last_change_at': self.parse_timestamp(order.get('updated_at')) or now,
+                        'expected_delivery_at': None,
+                        'next_poll_at': None
+                    }
+                    self._orders[order_id] = entry
+                    self._push(order_id, entry, entry['last_change_at'] + self.interval_seconds(entry, now))
+                else:
+                    entry['order'] = order
+                    if order['status'] != entry['status']:
+                        # Changed by a webhook or an admin: restart from the base interval
+                        entry['status'] = order['status']
+                        entry['last_change_at'] = now
+                        self._push(order_id, entry, now + self.interval_seconds(entry, now))
+
+    def pop_due(self, now: float, limit: Optional[int] = None) -> List[Dict]:
+        """Remove and return orders whose next poll is due, earliest first"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                next_poll_at, order_id = heapq.heappop(self._heap)
+                entry = self._orders.get(order_id)
+                if entry is None or entry['next_poll_at'] != next_poll_at:
+                    continue
+                entry['next_poll_at'] = None
+                due.append(entry['order'])
+        return due
+
+    def record(self, order_id: str, now: float, ok: bool, status: Optional[str] = None,
+               expected_delivery_at: Optional[float] = None):
+        """Schedule an order's next poll from the outcome of the one just made"""
+        with self._lock:
+            entry = self._orders.get(order_id)
+            if entry is None:
+                return
+            if ok:
+                if status and status != entry['status']:
+                    entry['status'] = status
+                    entry['last_change_at'] = now
+                if expected_delivery_at is not None:
+                    entry['expected_delivery_at'] = expected_delivery_at
+                delay = self.interval_seconds(entry, now)
+            else:
+                delay = TRACKING_MIN_INTERVAL_MINUTES * 60
+            self._push(order_id, entry, now + delay)
+
+    def get_stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            slots = [e['next_poll_at'] for e in self._orders.values() if e['next_poll_at'] is not None]
+            by_status: Dict[str, int] = {}
+            for entry in self._orders.values():
+                by_status[entry['status']] = by_status.get(entry['status'], 0) + 1
+            return {
+                'tracked': len(self._orders),
+                'due_now': sum(1 for t in slots if t <= now),
+                'next_due_in_seconds': round(max(0.0, min(slots) - now), 1) if slots else None,
+                'heap_entries': len(self._heap),
+                'by_status': by_status
+            }
+
+
+class TrackingPoller:
+    """Polls Qikink tracking for due active orders with bounded concurrency"""
+
+    ACTIVE_STATUSES = ['qikink_submitted', 'shipped', 'in_transit']
+
+    def __init__(self, qikink_service: QikinkMediatorService, db_service: DatabaseService,
+                 concurrency: int = TRACKING_POLL_CONCURRENCY):
+        self.qikink = qikink_service
+        self.db = db_service
+        self.concurrency = max(1, concurrency)
+        self.schedule = TrackingSchedule()
+        self.last_run: Optional[Dict] = None
+        self._run_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._run_lock.locked()
+
+    @staticmethod
+    def tracking_log_rows(order: Dict, tracking: Dict) -> List[Dict]:
+        """tracking_logs rows for every event Qikink returned for an order.
+
+        Events without a status or timestamp can't be deduplicated on
+        (qikink_order_id, event_timestamp, status) and are left out.
+        """
+        rows = []
+        for event in tracking.get('tracking_events') or []:
+            status = event.get('status')
+            event_timestamp = event.get('timestamp') or event.get('event_timestamp') or event.get('date')
+            if not status or not event_timestamp:
+                continue
+            rows.append({
+                'order_id': order.get('id'),
+                'qikink_order_id': order['qikink_order_id'],
+                'tracking_number': tracking.get('tracking_number'),
+                'status': status,
+                'location': event.get('location'),
+                'description': event.get('description') or event.get('remarks'),
+                'event_timestamp': event_timestamp
+            })
+        return rows
+
+    def _poll_order(self, order: Dict) -> Dict:
+        """Fetch tracking for one order, apply any status change and collect its events"""
+        started = time.perf_counter()
+        tracking = self.qikink.fetch_tracking_updates(order['qikink_order_id'])
+        outcome = {
+            'order_id': order['order_id'],
+            'ok': tracking is not None,
+            'updated': False,
+            'status': order['status'],
+            'expected_delivery_at': None,
+            'events': [],
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+        if tracking:
+            # Simple logic: assume latest status is last entry
+            latest_event = (tracking.get('tracking_events') or [{}])[-1]
+            # Qikink reports "In Transit"; orders.status stores "in_transit"
+            new_status = (latest_event.get('status') or '').strip().lower().replace(' ', '_')
+            tracking_number = tracking.get('tracking_number')
+
+            if new_status and new_status != order['status']:
+                outcome['status'] = new_status
+                self.db.update_order_status(
+                    order['order_id'],
+                    outcome['status'],
+                    tracking_number=tracking_number
+                )
+                outcome['updated'] = True
+            outcome['expected_delivery_at'] = TrackingSchedule.parse_timestamp(
+                tracking.get('expected_delivery_date') or tracking.get('edd')
+            )
+            outcome['events'] = self.tracking_log_rows(order, tracking)
+        return outcome
+
+    def _persist_events(self, outcomes: List[Dict]) -> Dict:
+        """Write the run's new events in one pass once every order has been polled"""
+        pending = {}
+        for outcome in outcomes:
+            for row in outcome['events']:
+                key = f"{row['qikink_order_id']}|{row['event_timestamp']}|{row['status']}"
+                if key not in pending and key not in recent_tracking_events:
+                    pending[key] = row
+
+        result = self.db.insert_tracking_events(list(pending.values())) if pending \
+            else {'status': 'success', 'inserted': 0, 'duplicates': 0, 'failed': 0}
+        if result['status'] == 'success':
+            # Stored now or already stored before: either way never worth sending again
+            for key in pending:
+                recent_tracking_events.add(key)
+        return result
+
+    def run(self, full: bool = False) -> Dict:
+        """Poll the active orders that are due (every one with full=True); returns (and keeps) run statistics"""
+        if not self._run_lock.acquire(blocking=False):
+            logger.warning('[CRON] Tracking poll already running, skipping this run')
+            return {'status': 'skipped', 'message': 'Previous run still in progress'}
+
+        started_at = datetime.now()
+        started = time.perf_counter()
+        stats = {'active': 0, 'polled': 0, 'deferred': 0, 'succeeded': 0, 'failed': 0, 'updated': 0}
+        outcomes = []
+        try:
+            active_orders = [
+                o for o in self.db.get_orders_by_status(self.ACTIVE_STATUSES)
+                if o.get('qikink_order_id')
+            ]
+            now = time.time()
+            self.schedule.sync(active_orders, now)
+            due_orders = self.schedule.pop_due(float('inf') if full else now,
+                                               None if full else TRACKING_MAX_POLLS_PER_RUN)
+            stats['active'] = len(active_orders)
+            stats['deferred'] = len(active_orders) - len(due_orders)
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='tracking') as pool:
+                futures = {pool.submit(self._poll_order, order): order for order in due_orders}
+                for future in as_completed(futures):
+                    stats['polled'] += 1
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        order = futures[future]
+                        logger.error(f'[CRON ERROR] Tracking poll failed for {order["order_id"]}: {str(e)}')
+                        self.schedule.record(order['order_id'], time.time(), ok=False)
+                        stats['failed'] += 1
+                        continue
+                    self.schedule.record(outcome['order_id'], time.time(), outcome['ok'],
+                                         outcome['status'], outcome['expected_delivery_at'])
+                    outcomes.append(outcome)
+                    stats['succeeded' if outcome['ok'] else 'failed'] += 1
+                    if outcome['updated']:
+                        stats['updated'] += 1
+            events = self._persist_events(outcomes)
+        finally:
+            self._run_lock.release()
+
+        outcomes.sort(key=lambda o: o['duration_ms'], reverse=True)
+        self.last_run = {
+            'status': 'success',
+            'started_at': started_at.isoformat(),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'full': full,
+            'concurrency': self.concurrency,
+            'rate_limit_rps': self.qikink.rate_limiter.rate,
+            **stats,
+            'events': {
+                'collected': sum(len(o['events']) for o in outcomes),
+                'inserted': events['inserted'],
+                'duplicates': events['duplicates'],
+                'failed': events['failed']
+            },
+            'slowest_calls': [
+                {'order_id': o['order_id'], 'duration_ms': o['duration_ms'], 'ok': o['ok']}
+                for o in outcomes[:TRACKING_SLOWEST_CALLS]
+            ]
+        }
+        return self.last_run
+
+
+class FailedJobRetrier:
+    """Re-submits due failed_jobs rows in claimed batches with bounded concurrency"""
+
+    JOB_TYPE = 'qikink_order_submission'
+
+    def __init__(self, qikink_service: QikinkMediatorService, db_service: DatabaseService,
+                 concurrency: int = RETRY_CONCURRENCY, batch_size: int = RETRY_BATCH_SIZE,
+                 max_batches: int = RETRY_MAX_BATCHES):
+        self.qikink = qikink_service
+        self.db = db_service
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_batches = max(1, max_batches)
+        self.last_run: Optional[Dict] = None
+        self.totals = {'runs': 0, 'claimed': 0, 'succeeded': 0, 'rescheduled': 0, 'exhausted': 0}
+        self._run_lock = threading.Lock()
+
+    @staticmethod
+    def backoff_seconds(retry_count: int) -> float:
+        """Exponential backoff with equal jitter: half fixed, half random, capped"""
+        delay = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_BASE_SECONDS * (2 ** retry_count))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry_job(self, job: Dict) -> str:
+        """Re-submit one claimed job and record the outcome on its row"""
+        order_id = job.get('order_id')
+        result = self.qikink.submit_order_to_qikink(order_id, log_failure=False) if order_id \
+            else {'status': 'error', 'message': 'Job has no order_id'}
+
+        if result['status'] == 'success':
+            self.db.update_failed_job(job['id'], 'completed')
+            return 'succeeded'
+
+        retry_count = (job.get('retry_count') or 0) + 1
+        if retry_count >= (job.get('max_retries') or FAILED_JOB_MAX_RETRIES):
+            self.db.update_failed_job(job['id'], 'failed', retry_count=retry_count,
+                                      error_message=result.get('message'))
+            logger.warning(f'[CRON] Max retries reached for order {order_id}')
+            return 'exhausted'
+
+        next_retry_at = datetime.now(timezone.utc) + timedelta(seconds=self.backoff_seconds(retry_count))
+        self.db.update_failed_job(job['id'], 'pending', retry_count=retry_count,
+                                  next_retry_at=next_retry_at, error_message=result.get('message'))
+        return 'rescheduled'
+
+    def run(self) -> Dict:
+        """Claim and retry due jobs batch by batch; returns (and keeps) run statistics"""
+        if not self._run_lock.acquire(blocking=False):
+            logger.warning('[CRON] Failed job retry already running, skipping this run')
+            return {'status': 'skipped', 'message': 'Previous run still in progress'}
+
+        started_at = datetime.now()
+        started = time.perf_counter()
+        stats = {'batches': 0, 'claimed': 0, 'succeeded': 0, 'rescheduled': 0, 'exhausted': 0, 'errors': 0}
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='retry') as pool:
+                for _ in range(self.max_batches):
+                    jobs = self.db.claim_failed_jobs(self.JOB_TYPE, self.batch_size)
+                    if not jobs:
+                        break
+                    stats['batches'] += 1
+                    stats['claimed'] += len(jobs)
+
+                    futures = {pool.submit(self._retry_job, job): job for job in jobs}
+                    for future in as_completed(futures):
+                        try:
+                            stats[future.result()] += 1
+                        except Exception as e:
+                            # The row stays 'processing' and is reclaimed when its lease expires
+                            logger.error(f'[CRON ERROR] Retry failed for job {futures[future]["id"]}: {str(e)}')
+                            stats['errors'] += 1
+                    if len(jobs) < self.batch_size:
+                        break
+        finally:
+            self._run_lock.release()
+
+        duration = time.perf_counter() - started
+        self.totals['runs'] += 1
+        for key in ('claimed', 'succeeded', 'rescheduled', 'exhausted'):
+            self.totals[key] += stats[key]
+        self.last_run = {
+            'status': 'success',
+            'started_at': started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 2),
+            'concurrency': self.concurrency,
+            'batch_size': self.batch_size,
+            **stats,
+            'jobs_per_second': round(stats['claimed'] / duration, 2) if duration > 0 else 0.0
+        }
+        return self.last_run
+
+    def get_stats(self) -> Dict:
+        return {
+            'last_run': self.last_run,
+            'totals': dict(self.totals),
+            'queue': self.db.get_failed_job_stats(self.JOB_TYPE)
+        }
+
+
+def create_scheduler(qikink_service: QikinkMediatorService, db_service: DatabaseService,
+                     tracking_poller: Optional[TrackingPoller] = None,
+                     failed_job_retrier: Optional[FailedJobRetrier] = None):
+    """Create and configure background scheduler"""
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    scheduler = BackgroundScheduler()
+    tracking_poller = tracking_poller or TrackingPoller(qikink_service, db_service)
+    failed_job_retrier = failed_job_retrier or FailedJobRetrier(qikink_service, db_service)
+    
+    # ==================== TRACKING UPDATE JOB ====================
+    
+    def fetch_all_tracking_updates():
+        """Background job: Fetch tracking for active orders whose next poll is due"""
+        try:
+            logger.info(f'[CRON] Fetching tracking updates at {datetime.now()}')
+            result = tracking_poller.run()
+            if result['status'] == 'success':
+                logger.info(
+                    f'[CRON] Finished fetching tracking updates in {result["duration_ms"]}ms. '
+                    f'{result["polled"]}/{result["active"]} active orders due, '
+                    f'{result["succeeded"]} fetched, {result["failed"]} failed, '
+                    f'{result["updated"]} orders updated, {result["events"]["inserted"]} tracking events stored.'
+                )
+        except Exception as e:
+            logger.error(f'[CRON ERROR] Tracking update job failed: {str(e)}')
+
+    # ==================== FAILED ORDER RETRY JOB ====================
+
+    def retry_failed_orders():
+        """Background job: Retry failed Qikink order submissions"""
+        try:
+            logger.info(f'[CRON] Starting failed order retry job at {datetime.now()}')
+            result = failed_job_retrier.run()
+            if result['status'] == 'success':
+                logger.info(
+                    f'[CRON] Retried {result["claimed"]} failed orders in {result["duration_ms"]}ms: '
+                    f'{result["succeeded"]} succeeded, {result["rescheduled"]} rescheduled, '
+                    f'{result["exhausted"]} gave up.'
+                )
+        except Exception as e:
+            logger.error(f'[CRON ERROR] Retry job failed: {str(e)}')
+    
+    # ==================== SCHEDULE JOBS ====================
+    
+    # Wake up every few minutes; each order carries its own next poll time
+    scheduler.add_job(
+        func=fetch_all_tracking_updates,
+        trigger=IntervalTrigger(minutes=TRACKING_TICK_MINUTES),
+        id='fetch_tracking',
+        name='Fetch tracking updates',
+        replace_existing=True
+    )
+    
+    # Claim and re-submit due failed orders in batches every RETRY_INTERVAL minutes
+    # Each job carries its own next_retry_at, so this only sets how often due jobs are picked up
+    retry_interval = int(os.getenv('RETRY_INTERVAL', 5))
+    scheduler.add_job(
+        func=retry_failed_orders,
+        trigger=IntervalTrigger(minutes=retry_interval),
+        id='retry_failed',
+        name='Retry failed orders',
+        replace_existing=True
+    )
+    
+    logger.info('[OK] Background scheduler configured')
+    return scheduler
+
+# =====================================================
+# DURABLE LOCAL JOB QUEUE
+# =====================================================
+
+class DurableJobQueue:
+    """SQLite-backed work queue that survives restarts, drained by a pool of worker threads"""
+
+    def __init__(self, path: str, workers: int = JOB_QUEUE_WORKERS, poll_interval: float = 2.0,
+                 lease_seconds: int = 300):
+        self.path = path
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.handlers: Dict[str, Dict] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    job_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    available_at REAL NOT NULL,
+                    locked_until REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    UNIQUE (kind, job_key)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, available_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        """Short-lived connection; SQLite handles locking across threads and worker processes"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def register(self, kind: str, handler, max_attempts: int = 3):
+        """Register handler(payload, attempt, max_attempts) -> Dict with a 'status' key"""
+        self.handlers[kind] = {'handler': handler, 'max_attempts': max(1, max_attempts)}
+
+    def enqueue(self, kind: str, job_key: str, payload: Dict) -> bool:
+        """Persist a job; returns False if a job with the same key was already queued"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO jobs (kind, job_key, payload, available_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, job_key, json.dumps(payload), now, now, now)
+            )
+            created = cursor.rowcount == 1
+        finally:
+            conn.close()
+        if created:
+            self._wakeup.set()
+        return created
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically take the oldest due job (or one whose worker died mid-lease)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                "OR (status = 'processing' AND locked_until < ?) ORDER BY available_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if job:
+                conn.execute(
+                    "UPDATE jobs SET status = 'processing', attempts = attempts + 1, locked_until = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, job['id'])
+                )
+            conn.execute('COMMIT')
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: int, status: str, error: Optional[str] = None, retry_in: float = 0):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, last_error = ?, available_at = ?, locked_until = NULL, '
+                'updated_at = ? WHERE id = ?',
+                (status, error, now + retry_in, now, job_id)
+            )
+        finally:
+            conn.close()
+
+    def _run_job(self, job: sqlite3.Row):
+        registration = self.handlers.get(job['kind'])
+        if not registration:
+            self._finish(job['id'], 'failed', f'No handler registered for {job["kind"]}')
+            return
+
+        attempt = job['attempts'] + 1
+        max_attempts = registration['max_attempts']
+        try:
+            result = registration['handler'](json.loads(job['payload']), attempt, max_attempts)
+            error = None if result.get('status') == 'success' else result.get('message', 'Job failed')
+        except Exception as e:
+            error = str(e)
+
+        if error is None:
+            self._finish(job['id'], 'done')
+        elif attempt < max_attempts:
+            # Exponential backoff with jitter between local attempts
+            self._finish(job['id'], 'queued', error, retry_in=(2 ** attempt) * 5 + random.uniform(0, 5))
+        else:
+            self._finish(job['id'], 'failed', error)
+            logger.warning(f'[QUEUE] {job["kind"]} job {job["job_key"]} failed after {attempt} attempts: {error}')
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f'[QUEUE ERROR] Failed to claim job: {str(e)}')
+                job = None
+
+            if job is None:
+                # Idle: wake on a local enqueue or poll for jobs queued by other processes
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                self._run_job(job)
+            except Exception as e:
+                logger.error(f'[QUEUE ERROR] Job {job["id"]} crashed: {str(e)}')
+
+    def start(self):
+        """Start the worker threads"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-queue-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f'[OK] Job queue started with {self.workers} workers ({self.path})')
+
+    def stop(self, timeout: float = 5):
+        """Signal workers to exit after their current job"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def get_job(self, kind: str, job_key: str) -> Optional[Dict]:
+        """Current state of a job, if this host has it"""
+        conn = self._connect()
+        try:
+            job = conn.execute(
+                'SELECT status, attempts, last_error, created_at, updated_at FROM jobs WHERE kind = ? AND job_key = ?',
+                (kind, job_key)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not job:
+            return None
+        return {
+            'state': job['status'],
+            'attempts': job['attempts'],
+            'last_error': job['last_error'],
+            'queued_at': datetime.fromtimestamp(job['created_at']).isoformat(),
+            'updated_at': datetime.fromtimestamp(job['updated_at']).isoformat()
+        }
+
+    def get_stats(self) -> Dict:
+        """Job counts by kind and status"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT kind, status, COUNT(*) AS count FROM jobs GROUP BY kind, status').fetchall()
+        finally:
+            conn.close()
+        stats: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            stats.setdefault(row['kind'], {})[row['status']] = row['count']
+        return stats
+
+
+def create_fulfillment_handler(qikink_service: QikinkMediatorService, db_service: DatabaseService):
+    """Queue handler that submits a paid order to Qikink"""
+
+    def fulfill_order(payload: Dict, attempt: int, max_attempts: int) -> Dict:
+        order_id = payload['order_id']
+        db_service.update_fulfillment_status(order_id, 'processing')
+
+        # Only the final local attempt hands the order over to the failed_jobs retry job
+        is_last_attempt = attempt >= max_attempts
+        result = qikink_service.submit_order_to_qikink(order_id, log_failure=is_last_attempt)
+
+        if result['status'] != 'success':
+            db_service.update_fulfillment_status(order_id, 'failed' if is_last_attempt else 'retrying')
+        logger.info(f'[QUEUE] Fulfillment attempt {attempt} for {order_id}: {result["status"]}')
+        return result
+
+    return fulfill_order
+
+def create_webhook_handler(razorpay_service: RazorpayMediatorService, db_service: DatabaseService):
+    """Queue handler that applies a verified Razorpay webhook and logs it to webhook_logs"""
+
+    def process_event(payload: Dict, attempt: int, max_attempts: int) -> Dict:
+        event_id = payload['event_id']
+        try:
+            result = razorpay_service.handle_webhook_event(payload['event'])
+        except Exception as e:
+            result = {'status': 'error', 'message': str(e)}
+
+        if result['status'] == 'error':
+            if attempt >= max_attempts:
+                db_service.log_webhook('razorpay', event_id, payload['event'], 'failed', result.get('message'))
+            return result
+
+        db_service.log_webhook('razorpay', event_id, payload['event'], result['status'])
+        logger.info(f'[QUEUE] Webhook {event_id}: {result["status"]}')
+        # Duplicates and ignored events are finished too
+        return {**result, 'status': 'success', 'outcome': result['status']}
+
+    return process_event
+
+# =====================================================
+# CLIENT AND SERVICE INITIALIZATION (from app_integration.py)
+# =====================================================
+
+class ServiceRegistry:
+    """Builds remote clients and mediator services on first use instead of at import.
+
+    Each service is built at most once per process; a failed or unconfigured
+    service is remembered as None, matching the old module-level globals.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._instances = {}
+        self._background_started = False
+        self.scheduler_leader: Optional[LeaderElection] = None
+
+    def _get(self, name: str, builder):
+        if name in self._instances:
+            return self._instances[name]
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = builder()
+                if self._instances[name] is not None:
+                    logger.info(f'[OK] {name} ready in {(time.perf_counter() - started) * 1000:.0f}ms')
+            return self._instances[name]
+
+    def peek(self, name: str):
+        """Return a service only if it has already been built"""
+        return self._instances.get(name)
+
+    def built(self) -> List[str]:
+        return [name for name, instance in self._instances.items() if instance is not None]
+
+    @property
+    def supabase_client(self):
+        return self._get('supabase_client', self._build_supabase_client)
+
+    @property
+    def razorpay_client(self):
+        return self._get('razorpay_client', self._build_razorpay_client)
+
+    @property
+    def db(self) -> Optional[DatabaseService]:
+        return self._get('db', lambda: DatabaseService(self.supabase_client) if self.supabase_client else None)
+
+    @property
+    def razorpay(self) -> Optional[RazorpayMediatorService]:
+        return self._get('razorpay', lambda: RazorpayMediatorService(self.razorpay_client, self.db)
+                         if self.razorpay_client and self.db else None)
+
+    @property
+    def qikink(self) -> Optional[QikinkMediatorService]:
+        return self._get('qikink', self._build_qikink)
+
+    @property
+    def tracking_poller(self) -> Optional[TrackingPoller]:
+        # Shared by the scheduler and the admin stats endpoint
+        return self._get('tracking_poller', lambda: TrackingPoller(self.qikink, self.db)
+                         if self.qikink and self.db else None)
+
+    @property
+    def failed_job_retrier(self) -> Optional[FailedJobRetrier]:
+        return self._get('failed_job_retrier', lambda: FailedJobRetrier(self.qikink, self.db)
+                         if self.qikink and self.db else None)
+
+    @property
+    def job_queue(self) -> Optional[DurableJobQueue]:
+        return self._get('job_queue', self._build_job_queue)
+
+    @property
+    def scheduler(self):
+        return self.peek('scheduler')
+
+    def _build_supabase_client(self):
+        if not (SUPABASE_AVAILABLE and SUPABASE_URL and SUPABASE_KEY):
+            return None
+        try:
+            from supabase import create_client
+            client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+            outbound_transport.instrument_supabase(client)
+            return client
+        except Exception as e:
+            logger.warning(f'[WARN] Supabase connection failed: {str(e)}')
+            return None
+
+    def _build_razorpay_client(self):
+        if not (RAZORPAY_AVAILABLE and RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET):
+            return None
+        try:
+            import razorpay
+            return razorpay.Client(
+                session=outbound_transport.session('razorpay', 'https://api.razorpay.com'),
+                auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)
+            )
+        except Exception as e:
+            logger.warning(f'[WARN] Razorpay initialization failed: {str(e)}')
+            return None
+
+    def _build_qikink(self):
+        if not self.db:
+            return None
+        qikink = QikinkMediatorService(
+            QIKINK_CLIENT_ID,
+            QIKINK_CLIENT_SECRET,
+            QIKINK_API_BASE_URL,
+            QIKINK_AUTH_URL,
+            self.db
+        )
+        qikink.start_token_refresher()
+        return qikink
+
+    def _build_job_queue(self):
+        # Paid orders and Razorpay webhooks are processed by queue workers, off the request path
+        if not self.db:
+            return None
+        try:
+            queue = DurableJobQueue(JOB_QUEUE_PATH, JOB_QUEUE_WORKERS)
+            if self.qikink:
+                queue.register(
+                    'qikink_fulfillment',
+                    create_fulfillment_handler(self.qikink, self.db),
+                    max_attempts=FULFILLMENT_MAX_ATTEMPTS
+                )
+            if self.razorpay:
+                queue.register(
+                    'razorpay_webhook',
+                    create_webhook_handler(self.razorpay, self.db),
+                    max_attempts=WEBHOOK_MAX_ATTEMPTS
+                )
+            return queue
+        except Exception as e:
+            logger.warning(f'[WARN] Failed to open job queue: {str(e)}')
+            return None
+
+    def _build_scheduler(self):
+        if not (SCHEDULER_AVAILABLE and self.qikink and self.db):
+            return None
+        try:
+            scheduler = create_scheduler(self.qikink, self.db, self.tracking_poller, self.failed_job_retrier)
+            scheduler.start()
+            logger.info('[OK] Background scheduler started')
+            return scheduler
+        except Exception as e:
+            logger.warning(f'[WARN] Failed to start scheduler: {str(e)}')
+            return None
+
+    def _start_scheduler(self):
+        """Leader callback; a scheduler that failed to start is not remembered, so re-election retries it"""
+        with self._lock:
+            if self.peek('scheduler') is None:
+                scheduler = self._build_scheduler()
+                if scheduler is None:
+                    return None
+                self._instances['scheduler'] = scheduler
+            return self._instances['scheduler']
+
+    def start_background(self):
+        """Start the fulfillment queue workers and the scheduler (idempotent)"""
+        with self._lock:
+            if self._background_started:
+                return
+            self._background_started = True
+            # Building the queue only opens it; requests can enqueue without owning workers
+            if self.job_queue:
+                self.job_queue.start()
+            # Every worker drains the queue, but only the elected leader runs the scheduler
+            if SCHEDULER_AVAILABLE and self.qikink and self.db:
+                self.scheduler_leader = LeaderElection(
+                    SCHEDULER_LOCK_PATH,
+                    on_elected=self._start_scheduler
+                )
+                self.scheduler_leader.start()
+
+    def shutdown(self):
+        """Stop background work on exit; unfinished queue jobs stay on disk"""
+        scheduler = self.peek('scheduler')
+        if scheduler:
+            scheduler.shutdown()
+            logger.info('[OK] Background scheduler stopped')
+        if self.scheduler_leader:
+            self.scheduler_leader.stop()
+        queue = self.peek('job_queue')
+        if queue:
+            queue.stop()
+            logger.info('[OK] Job queue stopped')
+
+
+services = ServiceRegistry()
+atexit.register(services.shutdown)
+
+# Short-lived dashboard cache so the admin panel's polling doesn't re-aggregate every time
+dashboard_cache = SingleFlightCache('dashboard', DASHBOARD_CACHE_TTL, max_entries=4)
+
+# Payment idempotency keys this worker recently recorded or found to be duplicates
+recent_payment_keys = RecentKeyCache('payments')
+
+# Razorpay event ids this worker recently accepted, so redelivery storms skip the queue
+recent_webhook_events = RecentKeyCache('webhooks')
+
+# Tracking event keys already in tracking_logs, so each poll only sends new events
+recent_tracking_events = RecentKeyCache('tracking_events', TRACKING_EVENT_CACHE_SIZE, TRACKING_EVENT_CACHE_TTL)
+
+# Verified JWT payloads so polling admin pages skip repeated signature checks
+verified_token_cache = VerifiedTokenCache()
+
+# Per-worker catalog cache in front of get_products_page; its loaders must raise on DB errors
+# (never return []), so a failed refresh keeps serving the stale page instead of caching the error
+product_cache = SingleFlightCache('catalog', CATALOG_CACHE_TTL)
+
+
+# =====================================================
+# PRODUCT SEARCH INDEX
+# =====================================================
+
+# Devanagari -> Latin (Hinglish-style) for indexing and querying in either script
+_DEVANAGARI_CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n', 'च': 'ch', 'छ': 'chh', 'ज': 'j',
+    'झ': 'jh', 'ञ': 'n', 'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n', 'त': 't',
+    'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n', 'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh',
+    'म': 'm', 'य': 'y', 'र': 'r', 'ल': 'l', 'व': 'v', 'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+}
+_DEVANAGARI_VOWELS = {
+    'अ': 'a', 'आ': 'aa', 'इ': 'i', 'ई': 'ee', 'उ': 'u', 'ऊ': 'oo', 'ऋ': 'ri',
+    'ए': 'e', 'ऐ': 'ai', 'ओ': 'o', 'औ': 'au', 'ऑ': 'o',
+}
+_DEVANAGARI_MATRAS = {
+    'ा': 'aa', 'ि': 'i', 'ी': 'ee', 'ु': 'u', 'ू': 'oo', 'ृ': 'ri',
+    'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au', 'ॅ': 'e', 'ॉ': 'o',
+}
+_DEVANAGARI_SIGNS = {'ं': 'n', 'ँ': 'n', 'ः': 'h'}
+_DEVANAGARI_VIRAMA = '\u094d'
+_DEVANAGARI_NUKTA = '\u093c'
+# Nukta consonants: ड़ -> r (saadee -> saaree), क़ -> q, ज़ -> z, फ़ -> f
+_DEVANAGARI_NUKTA_FORMS = {'d': 'r', 'k': 'q', 'j': 'z', 'ph': 'f'}
+_DEVANAGARI_DIGITS = {chr(0x0966 + d): str(d) for d in range(10)}
+
+# Spelling variants that sound alike in romanized Hindi, applied in order
+_PHONETIC_RULES = (
+    ('chh', 'c'), ('ch', 'c'), ('sh', 's'), ('kh', 'k'), ('gh', 'g'), ('jh', 'j'),
+    ('th', 't'), ('dh', 'd'), ('ph', 'f'), ('bh', 'b'), ('ck', 'k'), ('q', 'k'),
+    ('z', 'j'), ('w', 'v'), ('x', 'ks'),
+)
+_TOKEN_RE = re.compile(r'[0-9a-z\u0900-\u0963\u0966-\u097f]+')
+_SEARCH_STOPWORDS = frozenset({'a', 'an', 'and', 'by', 'for', 'in', 'of', 'on', 'the', 'to', 'with'})
+
+
+def transliterate_devanagari(text: str) -> str:
+    """Romanize a Devanagari word with Hindi schwa deletion (भारत -> bhaarat, सलवार -> salvaar)"""
+    # [consonant, vowel] units; vowel None is the inherent 'a', '' a virama
+    units: List[list] = []
+    for char in text:
+        last = units[-1] if units else None
+        if char == _DEVANAGARI_NUKTA:
+            if last and last[0] in _DEVANAGARI_NUKTA_FORMS:
+                last[0] = _DEVANAGARI_NUKTA_FORMS[last[0]]
+        elif char in _DEVANAGARI_CONSONANTS:
+            units.append([_DEVANAGARI_CONSONANTS[char], None])
+        elif char in _DEVANAGARI_MATRAS and last and last[0] and last[1] is None:
+            last[1] = _DEVANAGARI_MATRAS[char]
+        elif char == _DEVANAGARI_VIRAMA and last and last[0] and last[1] is None:
+            last[1] = ''
+        else:
+            vowel = _DEVANAGARI_VOWELS.get(char) or _DEVANAGARI_SIGNS.get(char) or _DEVANAGARI_DIGITS.get(char)
+            units.append(['', vowel or ('' if '\u0900' <= char <= '\u097f' else char)])
+
+    # Drop the word-final inherent 'a', then a medial one between two voiced syllables (VC_CV)
+    for i in range(len(units) - 1, 0, -1):
+        consonant, vowel = units[i]
+        if not consonant or vowel is not None:
+            continue
+        if i == len(units) - 1:
+            units[i][1] = ''
+        elif units[i - 1][1] != '' and units[i + 1][0] and units[i + 1][1] != '':
+            units[i][1] = ''
+    return ''.join(consonant + ('a' if vowel is None else vowel) for consonant, vowel in units)
+
+
+@lru_cache(maxsize=65536)
+def phonetic_key(token: str) -> Optional[str]:
+    """Consonant skeleton of a romanized word, so spelling variants share a key
+    (kurta/kurtaa, saree/sari, salwar/shalwar, lehenga/lahangaa)"""
+    if len(token) < 3 or not token.isascii() or not token.isalpha():
+        return None
+    key = token
+    for pattern, replacement in _PHONETIC_RULES:
+        key = key.replace(pattern, replacement)
+    key = key[0] + re.sub(r'[aeiouy]', '', key[1:])
+    key = re.sub(r'(.)\1+', r'\1', key)
+    return key if len(key) >= 2 else None
+
+
+def search_tokens(text: Any) -> List[str]:
+    """Lowercased tokens with Latin accents stripped; Devanagari words are also romanized"""
+    if not text:
+        return []
+    normalized = unicodedata.normalize('NFKD', str(text).lower())
+    normalized = ''.join(c for c in normalized if not '\u0300' <= c <= '\u036f')
+    tokens = []
+    for token in _TOKEN_RE.findall(normalized):
+        if token in _SEARCH_STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isascii():
+            romanized = transliterate_devanagari(token)
+            if romanized and romanized != token:
+                tokens.append(romanized)
+    return tokens
+
+
+def _bitmask(doc_ids: List[int]) -> int:
+    """int with the given bit positions set (bytearray route for long lists)"""
+    if len(doc_ids) < 64:
+        mask = 0
+        for doc_id in doc_ids:
+            mask |= 1 << doc_id
+        return mask
+    buf = bytearray(max(doc_ids) // 8 + 1)
+    for doc_id in doc_ids:
+        buf[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(buf, 'little')
+
+
+class ProductSearchIndex:
+    """In-process inverted index over the catalog's text fields.
+
+    Every product gets a small integer doc id, and each term's postings are
+    one int bitset per field weight, so matching a word is an OR of a few
+    bitsets, matching a query is an AND, and the hit count is bit_count().
+    A second table keyed by phonetic_key() matches romanized spelling
+    variants, and a sorted vocabulary answers prefix lookups with bisect.
+    apply() re-indexes individual products, so a sync only touches the rows
+    it changed.
+    """
+
+    FIELD_WEIGHTS = {'name': 5.0, 'category': 3.0, 'collection': 3.0, 'manufacturer': 2.0, 'description': 1.0}
+    # Score multipliers by how a query word matched a term
+    EXACT_MATCH, PHONETIC_MATCH, PREFIX_MATCH = 1.0, 0.7, 0.5
+    MAX_QUERY_WORDS = 8
+
+    def __init__(self):
+        self._doc_ids: Dict[str, int] = {}
+        self._products: List[Optional[Dict]] = []
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        # term (or phonetic key) -> {field weight: bitset of doc ids}
+        self._postings: Dict[str, Dict[float, int]] = {}
+        self._phonetic: Dict[str, Dict[float, int]] = {}
+        self._sorted_terms: Optional[List[str]] = None
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.built_at: Optional[float] = None
+        self.checked_at = 0.0
+        self.watermark: Optional[str] = None
+        self.stats = {'builds': 0, 'refreshes': 0, 'applied': 0, 'queries': 0}
+
+    # ---------- indexing ----------
+
+    def _terms_for(self, product: Dict) -> Dict[str, float]:
+        terms = {}
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for token in search_tokens(product.get(field)):
+                if weight > terms.get(token, 0):
+                    terms[token] = weight
+        return terms
+
+    def _unset(self, table: Dict[str, Dict[float, int]], key: str, weight: float, doc_id: int):
+        masks = table.get(key)
+        if not masks or weight not in masks:
+            return
+        masks[weight] &= ~(1 << doc_id)
+        if not masks[weight]:
+            del masks[weight]
+            if not masks:
+                del table[key]
+                if table is self._postings:
+                    self._sorted_terms = None
+
+    def apply(self, products: List[Dict]):
+        """Index new or changed products, replacing any earlier version of each"""
+        with self._lock:
+            additions: Dict[tuple, List[int]] = {}
+            for product in products:
+                sku = product.get('sku')
+                if not sku:
+                    continue
+                doc_id = self._doc_ids.get(sku)
+                if doc_id is None:
+                    doc_id = self._doc_ids[sku] = len(self._products)
+                    self._products.append(None)
+                else:
+                    for term, weight in self._doc_terms.pop(doc_id, {}).items():
+                        self._unset(self._postings, term, weight, doc_id)
+                        key = phonetic_key(term)
+                        if key:
+                            self._unset(self._phonetic, key, weight, doc_id)
+
+                terms = self._terms_for(product)
+                self._doc_terms[doc_id] = terms
+                self._products[doc_id] = product
+                for term, weight in terms.items():
+                    additions.setdefault((False, term, weight), []).append(doc_id)
+                    key = phonetic_key(term)
+                    if key:
+                        additions.setdefault((True, key, weight), []).append(doc_id)
+                self.stats['applied'] += 1
+
+            # One OR per (term, weight) instead of one per product
+            for (is_phonetic, key, weight), doc_ids in additions.items():
+                table = self._phonetic if is_phonetic else self._postings
+                if not is_phonetic and key not in table:
+                    self._sorted_terms = None
+                masks = table.setdefault(key, {})
+                masks[weight] = masks.get(weight, 0) | _bitmask(doc_ids)
+
+    def refresh(self, db: Optional['DatabaseService']):
+        """Build on first use, then pull rows changed since the watermark.
+
+        Checked at most every SEARCH_INDEX_REFRESH_SECONDS; only one thread
+        refreshes while the others keep querying the current index.
+        """
+        now = time.monotonic()
+        if self.built_at is not None and now - self.checked_at < SEARCH_INDEX_REFRESH_SECONDS:
+            return
+        if not self._refresh_lock.acquire(blocking=self.built_at is None):
+            return
+        try:
+            if self.built_at is not None and time.monotonic() - self.checked_at < SEARCH_INDEX_REFRESH_SECONDS:
+                return
+            first_build = self.built_at is None
+            if db is None:
+                rows = list(PRODUCTS.values()) if first_build else []
+            elif first_build or not self.watermark:
+                rows = list(db.iter_products())
+            else:
+                rows = list(db.iter_products_updated_since(self._reread_from(self.watermark)))
+
+            if first_build:
+                # Doc ids follow name order, which is how equal scores are ranked
+                rows.sort(key=lambda row: (row.get('name') or '', row.get('sku') or ''))
+            self.apply(rows)
+            for row in rows:
+                if row.get('updated_at') and (not self.watermark or str(row['updated_at']) > self.watermark):
+                    self.watermark = str(row['updated_at'])
+            self.checked_at = time.monotonic()
+            if first_build:
+                self.built_at = time.time()
+                self.stats['builds'] += 1
+                logger.info(f'[OK] Product search index built: {len(self._doc_ids)} products, '
+                            f'{len(self._postings)} terms')
+            elif rows:
+                self.stats['refreshes'] += 1
+        finally:
+            self._refresh_lock.release()
+
+    @staticmethod
+    def _reread_from(watermark: str) -> str:
+        """Start of the next refresh window, SEARCH_INDEX_OVERLAP_SECONDS behind the watermark.
+
+        A sync that started before another worker's but committed after it
+        writes updated_at values older than the watermark; re-reading the
+        overlap picks those rows up, and re-applying the rest is harmless.
+        """
+        try:
+            return (datetime.fromisoformat(watermark) - timedelta(seconds=SEARCH_INDEX_OVERLAP_SECONDS)).isoformat()
+        except ValueError:
+            return watermark
+
+    # ---------- querying ----------
+
+    def _prefix_terms(self, prefix: str, limit: int) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        matches = []
+        for term in self._sorted_terms[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def _word_levels(self, alternatives: List[str], prefix: bool) -> List[tuple]:
+        """[(score, bitset)] for one query word, best score first, each doc in one level only"""
+        levels: Dict[float, int] = {}
+
+        def add(masks: Optional[Dict[float, int]], multiplier: float):
+            for weight, mask in (masks or {}).items():
+                score = weight * multiplier
+                levels[score] = levels.get(score, 0) | mask
+
+        for token in alternatives:
+            add(self._postings.get(token), self.EXACT_MATCH)
+            key = phonetic_key(token)
+            if key:
+                add(self._phonetic.get(key), self.PHONETIC_MATCH)
+            if prefix and len(token) >= SEARCH_MIN_PREFIX:
+                for term in self._prefix_terms(token, SEARCH_PREFIX_EXPANSION):
+                    if term != token:
+                        add(self._postings[term], self.PREFIX_MATCH)
+
+        ordered = []
+        seen = 0
+        for score in sorted(levels, reverse=True):
+            mask = levels[score] & ~seen
+            if mask:
+                ordered.append((score, mask))
+                seen |= mask
+        return ordered
+
+    def _query_words(self, query: str) -> List[List[str]]:
+        words = []
+        for token in search_tokens(query):
+            # A romanized form directly follows its Devanagari word; either may match
+            if words and token.isascii() and not words[-1][0].isascii():
+                words[-1].append(token)
+            else:
+                words.append([token])
+        return words[:self.MAX_QUERY_WORDS]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, prefix: bool = True) -> Dict:
+        """Ranked products matching every word of the query; the last word may be a prefix.
+
+        A product's score is the sum over query words of its best match
+        (field weight x match multiplier). Results are read off in score
+        order by walking combinations of per-word score levels best-first,
+        so only the bitsets behind the requested page are expanded.
+        """
+        empty = {'total': 0, 'products': []}
+        with self._lock:
+            self.stats['queries'] += 1
+            words = self._query_words(query)
+            if not words:
+                return empty
+
+            per_word = []
+            candidates = -1
+            for position, alternatives in enumerate(words):
+                levels = self._word_levels(alternatives, prefix and position == len(words) - 1)
+                word_mask = 0
+                for _, mask in levels:
+                    word_mask |= mask
+                candidates &= word_mask
+                if not candidates:
+                    return empty
+                per_word.append(levels)
+            per_word = [[(score, mask & candidates) for score, mask in levels if mask & candidates]
+                        for levels in per_word]
+
+            wanted = offset + limit
+            hits = []
+            start = (0,) * len(per_word)
+            heap = [(-sum(levels[0][0] for levels in per_word), start)]
+            visited = {start}
+            while heap and len(hits) < wanted:
+                neg_score, position = heapq.heappop(heap)
+                mask = candidates
+                for levels, level in zip(per_word, position):
+                    mask &= levels[level][1]
+                while mask and len(hits) < wanted:
+                    lowest = mask & -mask
+                    hits.append((lowest.bit_length() - 1, -neg_score))
+                    mask ^= lowest
+                for j, level in enumerate(position):
+                    if level + 1 < len(per_word[j]):
+                        following = position[:j] + (level + 1,) + position[j + 1:]
+                        if following not in visited:
+                            visited.add(following)
+                            drop = per_word[j][level][0] - per_word[j][level + 1][0]
+                            heapq.heappush(heap, (neg_score + drop, following))
+
+            return {
+                'total': candidates.bit_count(),
+                'products': [
+                    {**self._products[doc_id], 'score': round(score, 3)}
+                    for doc_id, score in hits[offset:]
+                ]
+            }
 
-# =====================================================
-# BACKGROUND JOB HELPERS (from background_jobs.py)
-# =====================================================
+    def autocomplete(self, prefix: str, limit: int = 8) -> Dict:
+        """Completions of the last word (most common first) and the best matching products"""
+        tokens = search_tokens(prefix)
+        suggestions = []
+        if tokens:
+            with self._lock:
+                last = tokens[-1]
+                if len(last) >= SEARCH_MIN_PREFIX:
+                    candidates = self._prefix_terms(last, SEARCH_PREFIX_EXPANSION * 4)
+                else:
+                    candidates = [last] if last in self._postings else []
+                frequency = {term: sum(m.bit_count() for m in self._postings[term].values()) for term in candidates}
+                suggestions = sorted(candidates, key=lambda term: (-frequency[term], term))[:limit]
+        hits = self.search(prefix, limit=limit, prefix=True)
+        return {
+            'suggestions': suggestions,
+            'products': [
+                {'sku': p['sku'], 'name': p.get('name'), 'price': p.get('price'), 'image_url': p.get('image_url')}
+                for p in hits['products']
+            ]
+        }
 
-def create_scheduler(qikink_service: QikinkMediatorService, db_service: DatabaseService):
-    """Create and configure background scheduler"""
-    
-    scheduler = BackgroundScheduler()
-    
-    # ==================== TRACKING UPDATE JOB ====================
-    
-    def fetch_all_tracking_updates():
-        """Background job: Fetch tracking for all active orders"""
-        try:
-            app.logger.info(f'[CRON] Fetching tracking updates at {datetime.now()}')
-            
-            # Get orders that are shipped or in transit
-            active_orders = db_service.get_orders_by_status(['qikink_submitted', 'shipped', 'in_transit'])
-            
-            updated_count = 0
-            for order in active_orders:
-                if order.get('qikink_order_id'):
-                    # Fetch tracking from Qikink
-                    tracking = qikink_service.fetch_tracking_updates(order['qikink_order_id'])
-                    
-                    if tracking:
-                        # Simple logic: assume latest status is last entry
-                        latest_event = tracking.get('tracking_events', [{}])[-1]
-                        new_status = latest_event.get('status')
-                        tracking_number = tracking.get('tracking_number')
-                        
-                        if new_status and new_status != order['status']:
-                            db_service.update_order_status(
-                                order['order_id'], 
-                                new_status.lower().replace(' ', '_'), 
-                                tracking_number=tracking_number
-                            )
-                            # db_service.log_tracking_event(order['order_id'], latest_event) # Needs implementation in DB service
-                            updated_count += 1
-            
-            app.logger.info(f'[CRON] Finished fetching tracking updates. {updated_count} orders updated.')
-        except Exception as e:
-            app.logger.error(f'[CRON ERROR] Tracking update job failed: {str(e)}')
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'products': len(self._doc_ids),
+                'terms': len(self._postings),
+                'phonetic_keys': len(self._phonetic),
+                'built_at': datetime.fromtimestamp(self.built_at, timezone.utc).isoformat() if self.built_at else None,
+                'watermark': self.watermark
+            }
 
-    # ==================== FAILED ORDER RETRY JOB ====================
 
-    def retry_failed_orders():
-        """Background job: Retry failed Qikink order submissions"""
-        try:
-            app.logger.info(f'[CRON] Starting failed order retry job at {datetime.now()}')
-            failed_jobs = db_service.get_pending_failed_jobs('qikink_order_submission')
-            success_count = 0
-
-            for job in failed_jobs:
-                order_id = job.get('order_id')
-                if order_id:
-                    # Attempt to re-submit to Qikink
-                    retry_result = qikink_service.submit_order_to_qikink(order_id)
-                    
-                    if retry_result['status'] == 'success':
-                        db_service.update_failed_job(job['id'], 'completed')
-                        success_count += 1
-                    else:
-                        # Update retry count
-                        new_retry_count = job['retry_count'] + 1
-                        MAX_RETRIES = 3 # Hardcoded limit, should be config
-                        
-                        if new_retry_count > MAX_RETRIES:
-                            db_service.update_failed_job(job['id'], 'failed')
-                            app.logger.warning(f'[CRON] Max retries reached for order {order_id}')
-                        else:
-                            db_service.update_failed_job(job['id'], 'pending', retry_count=new_retry_count)
-            
-            app.logger.info(f'[CRON] Successfully retried {success_count}/{len(failed_jobs)} failed orders')
-        except Exception as e:
-            app.logger.error(f'[CRON ERROR] Retry job failed: {str(e)}')
-    
-    # ==================== SCHEDULE JOBS ====================
-    
-    # Tracking updates every 3 hours
-    tracking_interval = int(os.getenv('TRACKING_UPDATE_INTERVAL', 3))
-    scheduler.add_job(
-        func=fetch_all_tracking_updates,
-        trigger=IntervalTrigger(hours=tracking_interval),
-        id='fetch_tracking',
-        name='Fetch tracking updates',
-        replace_existing=True
-    )
-    
-    # Retry failed orders every 30 minutes
-    retry_interval = int(os.getenv('RETRY_INTERVAL', 30))
-    scheduler.add_job(
-        func=retry_failed_orders,
-        trigger=IntervalTrigger(minutes=retry_interval),
-        id='retry_failed',
-        name='Retry failed orders',
-        replace_existing=True
-    )
-    
-    app.logger.info('[OK] Background scheduler configured')
-    return scheduler
+product_search_index = ProductSearchIndex()
+
 
 # =====================================================
-# CLIENT AND SERVICE INITIALIZATION (from app_integration.py)
+# PRODUCT FACETS
 # =====================================================
 
-# Initialize Supabase client
-supabase_client = None
-if SUPABASE_AVAILABLE and SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-        app.logger.info('[OK] Supabase client initialized')
-    except Exception as e:
-        app.logger.warning(f'[WARN] Supabase connection failed: {str(e)}')
-
-# Initialize Razorpay client
-razorpay_client = None
-if RAZORPAY_AVAILABLE and RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    try:
-        razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-        app.logger.info('[OK] Razorpay client initialized')
-    except Exception as e:
-        app.logger.warning(f'[WARN] Razorpay initialization failed: {str(e)}')
+class FacetIndex:
+    """Per-value product bitsets for the shop sidebar filters.
+
+    Built once from the products table and its variants. Values within a
+    facet are OR-ed and facets are AND-ed. Each facet's counts ignore that
+    facet's own selection, so the sidebar shows what another tick would add.
+    Size and color also keep in-stock-only bitsets, so "M" with in_stock
+    means an M variant that is actually in stock.
+    """
+
+    FACETS = ('category', 'collection', 'price', 'size', 'color', 'availability')
+    VARIANT_FACETS = ('size', 'color')
+    # Same buckets as the shop page's price checkboxes: (value, min inclusive, max exclusive)
+    PRICE_BUCKETS = (('under-999', None, 1000), ('1000-1999', 1000, 2000), ('2000-above', 2000, None))
+
+    def __init__(self, products, variants):
+        self.skus: List[str] = []
+        pending: Dict[tuple, List[int]] = {}
+        doc_by_pk: Dict[Any, int] = {}
+        in_stock: List[int] = []
+        stock_unknown = set()
+
+        def add(facet: str, value: Any, doc_id: int, stocked: bool = False):
+            value = self.normalize(facet, value)
+            if value:
+                pending.setdefault((facet, value, False), []).append(doc_id)
+                if stocked:
+                    pending.setdefault((facet, value, True), []).append(doc_id)
+
+        for product in products:
+            doc_id = len(self.skus)
+            self.skus.append(product['sku'])
+            if product.get('id') is not None:
+                doc_by_pk[product['id']] = doc_id
+            add('category', product.get('category'), doc_id)
+            add('collection', product.get('collection'), doc_id)
+            add('price', self.price_bucket(product.get('price')), doc_id)
+            # Sample data and Qikink payloads carry sizes/colors/stock inline
+            stocked = (product.get('stock') or 0) > 0
+            for size in product.get('sizes') or []:
+                add('size', size, doc_id, stocked)
+            for color in product.get('colors') or []:
+                add('color', color, doc_id, stocked)
+            if stocked:
+                in_stock.append(doc_id)
+            elif 'stock' not in product:
+                stock_unknown.add(doc_id)
+
+        for variant in variants:
+            doc_id = doc_by_pk.get(variant.get('product_id'))
+            if doc_id is None:
+                continue
+            stocked = (variant.get('stock') or 0) > 0
+            stock_unknown.discard(doc_id)
+            add('size', variant.get('size'), doc_id, stocked)
+            add('color', variant.get('color'), doc_id, stocked)
+            if stocked:
+                in_stock.append(doc_id)
+
+        self.all = (1 << len(self.skus)) - 1
+        self.bitsets: Dict[str, Dict[str, int]] = {facet: {} for facet in self.FACETS}
+        self.in_stock_bitsets: Dict[str, Dict[str, int]] = {facet: {} for facet in self.VARIANT_FACETS}
+        for (facet, value, stocked_only), doc_ids in pending.items():
+            table = self.in_stock_bitsets if stocked_only else self.bitsets
+            table[facet][value] = _bitmask(doc_ids)
+        # Print-on-demand products without any stock data are sellable
+        available = _bitmask(in_stock + list(stock_unknown)) if (in_stock or stock_unknown) else 0
+        self.bitsets['availability'] = {'in_stock': available, 'out_of_stock': self.all & ~available}
+        self.built_at = datetime.now(timezone.utc).isoformat()
+
+    @staticmethod
+    def normalize(facet: str, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        value = str(value).strip()
+        return value.upper() if facet == 'size' else value.lower()
 
-# Initialize Database Service
-db_service = DatabaseService(supabase_client) if supabase_client else None
+    @classmethod
+    def price_bucket(cls, price: Any) -> Optional[str]:
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return None
+        for value, low, high in cls.PRICE_BUCKETS:
+            if (low is None or price >= low) and (high is None or price < high):
+                return value
+        return None
 
-# Initialize Razorpay Mediator Service
-razorpay_mediator = RazorpayMediatorService(razorpay_client, db_service) if razorpay_client and db_service else None
+    def _selection_masks(self, filters: Dict[str, List[str]], in_stock_variants: bool) -> Dict[str, int]:
+        masks = {}
+        for facet, values in filters.items():
+            table = self.bitsets[facet]
+            if in_stock_variants and facet in self.VARIANT_FACETS:
+                table = self.in_stock_bitsets[facet]
+            mask = 0
+            for value in values:
+                mask |= table.get(value, 0)
+            masks[facet] = mask
+        return masks
+
+    def counts(self, filters: Dict[str, List[str]]) -> Dict:
+        """Matching product count plus per-value counts for every facet"""
+        filters = {
+            facet: [v for v in (self.normalize(facet, value) for value in values) if v]
+            for facet, values in filters.items() if facet in self.FACETS
+        }
+        filters = {facet: values for facet, values in filters.items() if values}
+        in_stock_only = filters.get('availability') == ['in_stock']
+        masks = self._selection_masks(filters, in_stock_only)
+        # Availability counts must not depend on the availability selection either
+        any_stock_masks = self._selection_masks(filters, False) if in_stock_only else masks
+
+        def matching(excluding: Optional[str] = None, selection: Dict[str, int] = masks) -> int:
+            mask = self.all
+            for facet, facet_mask in selection.items():
+                if facet != excluding:
+                    mask &= facet_mask
+            return mask
+
+        facets = {}
+        for facet in self.FACETS:
+            if facet == 'availability':
+                base, table = matching(facet, any_stock_masks), self.bitsets[facet]
+            else:
+                base = matching(facet)
+                table = self.in_stock_bitsets[facet] if in_stock_only and facet in self.VARIANT_FACETS \
+                    else self.bitsets[facet]
+            facets[facet] = {value: (base & bits).bit_count() for value, bits in sorted(table.items())}
+
+        return {'total': matching().bit_count(), 'filters': filters, 'facets': facets}
+
+
+def load_facet_index() -> FacetIndex:
+    """Facet bitsets over the whole catalog (sample data without Supabase)"""
+    if services.db:
+        return FacetIndex(services.db.iter_products(), services.db.iter_variants())
+    return FacetIndex(PRODUCTS.values(), [])
+
+# One entry: the current FacetIndex, rebuilt on catalog sync or after CATALOG_CACHE_TTL
+facet_cache = SingleFlightCache('facets', CATALOG_CACHE_TTL, max_entries=1)
+
+
+def build_stock_summary(sku: str, variants) -> Dict:
+    """Compact stock view for a product page: {size: {color: stock}} plus totals"""
+    stock = {}
+    total = 0
+    for variant in variants:
+        count = max(0, int(variant.get('stock') or 0))
+        stock.setdefault(variant.get('size') or '', {})[variant.get('color') or ''] = count
+        total += count
+    return {'sku': sku, 'total_stock': total, 'in_stock': total > 0, 'stock_known': True, 'stock': stock}
+
+def load_product_stock(sku: str) -> Optional[Dict]:
+    """Stock summary from the variants table, or from the sample sizes/colors without Supabase"""
+    if services.db:
+        return services.db.get_product_stock(sku)
+    product = PRODUCTS.get(sku)
+    if not product:
+        return None
+    # Sample data only has a product-level count; report it against every size/color
+    summary = build_stock_summary(sku, [
+        {'size': size, 'color': color, 'stock': product.get('stock', 0)}
+        for size in product.get('sizes', []) for color in product.get('colors', [])
+    ])
+    summary['total_stock'] = product.get('stock', 0)
+    return summary
 
-# Initialize Enhanced Qikink Mediator Service
-qikink_mediator = QikinkMediatorService(
-    QIKINK_CLIENT_ID,
-    QIKINK_CLIENT_SECRET,
-    QIKINK_API_BASE_URL,
-    QIKINK_AUTH_URL,
-    db_service
-) if db_service else None
+# sku -> stock summary (None for unknown SKUs), dropped with the rest of the catalog on sync
+stock_cache = SingleFlightCache('stock', CATALOG_CACHE_TTL, max_entries=STOCK_CACHE_SIZE)
 
 
 # =====================================================
@@ -792,64 +3716,179 @@ def generate_jwt_token(user_id: str, role: str = 'user', is_refresh: bool = Fals
         'exp': datetime.utcnow() + expiration,
         'iat': datetime.utcnow()
     }
+    import jwt as pyjwt
     return pyjwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def verify_jwt_token(token: str) -> Optional[dict]:
     """Verify JWT token and return payload"""
     if not JWT_AVAILABLE:
         return None
-    
+
+    payload = verified_token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    import jwt as pyjwt
     try:
         payload = pyjwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        verified_token_cache.put(token, payload)
         return payload
     except pyjwt.ExpiredSignatureError:
         return None
     except pyjwt.InvalidTokenError:
         return None
 
+def _bcrypt_hash(password: bytes, rounds: int) -> bytes:
+    """Runs in a password pool process"""
+    import bcrypt
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _bcrypt_check(password: bytes, hashed: bytes) -> bool:
+    """Runs in a password pool process"""
+    import bcrypt
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already queued in this worker"""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so logins don't block request threads on CPU.
+
+    At most max_pending hashes may be queued or running per worker; beyond that
+    callers get PasswordHasherBusy straight away (the endpoints answer 503)
+    instead of piling up behind a login burst. A hash that outlives the timeout
+    also raises PasswordHasherBusy and keeps its slot until the pool finishes it.
+    """
+
+    def __init__(self, pool_size: int = BCRYPT_POOL_SIZE, max_pending: int = BCRYPT_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS, timeout: float = BCRYPT_TIMEOUT_SECONDS):
+        self.pool_size = max(0, pool_size)
+        self.rounds = rounds
+        self.timeout = timeout
+        self.max_pending = max(1, max_pending)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {'hashed': 0, 'verified': 0, 'rejected_busy': 0, 'timed_out': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Never fork: the worker already runs queue, refresher and poller threads
+                # whose locks a forked child could inherit mid-acquire
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.pool_size,
+                                                     mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def _run(self, operation: str, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected_busy'] += 1
+            metrics.inc('password_hash_rejected_total', {'operation': operation})
+            raise PasswordHasherBusy('Too many password operations in progress')
+
+        started = time.perf_counter()
+        slot_handed_off = False
+
+        def wait(future):
+            nonlocal slot_handed_off
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeoutError:
+                # The hash keeps running in the pool; free its slot only once it really finishes
+                slot_handed_off = True
+                future.add_done_callback(lambda _: self._slots.release())
+                self.stats['timed_out'] += 1
+                metrics.inc('password_hash_rejected_total', {'operation': operation})
+                raise PasswordHasherBusy('Password operation timed out')
+
+        try:
+            if not self.pool_size:
+                return func(*args)
+            executor = self._get_executor()
+            try:
+                return wait(executor.submit(func, *args))
+            except BrokenProcessPool:
+                # A pool process died; start a fresh pool and retry once
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                return wait(self._get_executor().submit(func, *args))
+        finally:
+            if not slot_handed_off:
+                self._slots.release()
+            metrics.observe('password_hash_seconds', {'operation': operation}, time.perf_counter() - started)
+
+    def hash(self, password: str) -> str:
+        hashed = self._run('hash', _bcrypt_hash, password.encode('utf-8'), self.rounds)
+        self.stats['hashed'] += 1
+        return hashed.decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        ok = self._run('verify', _bcrypt_check, password.encode('utf-8'), hashed.encode('utf-8'))
+        self.stats['verified'] += 1
+        return ok
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
+
 def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
+    """Hash password using bcrypt (raises PasswordHasherBusy when saturated)"""
     if not JWT_AVAILABLE:
         return password
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return password_hasher.hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash"""
+    """Verify password against hash (raises PasswordHasherBusy when saturated)"""
     if not JWT_AVAILABLE:
         return password == hashed
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return password_hasher.verify(password, hashed)
+
+def _authenticate_request():
+    """Resolve the bearer access token; returns (payload, None) or (None, error response)"""
+    auth_header = request.headers.get('Authorization', '')
+
+    if not auth_header.startswith('Bearer '):
+        return None, (jsonify({'status': 'error', 'message': 'No token provided'}), 401)
+
+    payload = verify_jwt_token(auth_header[len('Bearer '):])
+
+    if not payload or payload.get('type') != 'access':
+        return None, (jsonify({'status': 'error', 'message': 'Invalid or expired access token'}), 401)
+
+    # Add user info to request context
+    g.user_id = payload.get('user_id')
+    g.user_role = payload.get('role')
+    return payload, None
 
 def require_auth(f):
     """Decorator to require any authentication (user or admin)"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        
-        if not auth_header.startswith('Bearer '):
-            return jsonify({'status': 'error', 'message': 'No token provided'}), 401
-        
-        token = auth_header.replace('Bearer ', '')
-        payload = verify_jwt_token(token)
-        
-        if not payload or payload.get('type') != 'access':
-            return jsonify({'status': 'error', 'message': 'Invalid or expired access token'}), 401
-        
-        # Add user info to request context
-        g.user_id = payload.get('user_id')
-        g.user_role = payload.get('role')
-        
+        payload, error = _authenticate_request()
+        if error:
+            return error
         return f(*args, **kwargs)
     return decorated_function
 
 def require_admin(f):
     """Decorator to require admin authentication"""
     @wraps(f)
-    @require_auth
     def decorated_function(*args, **kwargs):
-        # require_auth already ran and set g.user_role
-        if g.user_role != 'admin':
+        payload, error = _authenticate_request()
+        if error:
+            return error
+        if payload.get('role') != 'admin':
             return jsonify({'status': 'error', 'message': 'Admin access required'}), 403
-        
         return f(*args, **kwargs)
     return decorated_function
 
@@ -890,73 +3929,595 @@ PRODUCTS = {
 }
 
 # =====================================================
-# BACKGROUND SCHEDULER MANAGEMENT
+# COMPONENT METRICS
+# =====================================================
+
+metrics.describe('cache_events_total', 'counter', 'In-process cache hits, misses, refreshes and invalidations')
+metrics.describe('outbound_pool_waits_total', 'counter', 'Outbound calls that waited for a pooled connection')
+metrics.describe('outbound_connections_opened_total', 'counter', 'New outbound connections opened')
+metrics.describe('outbound_requests_in_flight', 'gauge', 'Outbound calls currently in progress')
+metrics.describe('tracking_poll_last_duration_seconds', 'gauge', 'Duration of the last tracking poll run')
+metrics.describe('tracking_poll_last_orders', 'gauge', 'Orders in the last tracking poll run by outcome')
+metrics.describe('failed_job_retries_total', 'counter', 'Failed order retries by outcome')
+metrics.describe('job_queue_jobs', 'gauge', 'Local job queue size by kind and state (host-wide)')
+
+def collect_component_metrics(registry: MetricsRegistry):
+    """Copy cache, transport and poller counters into the registry before each flush"""
+    for cache in (product_cache, facet_cache, stock_cache, dashboard_cache):
+        for event in ('hits', 'misses', 'stale_hits', 'refreshes', 'refresh_errors', 'invalidations'):
+            registry.set('cache_events_total', {'cache': cache.name, 'event': event}, cache.stats[event])
+
+    for event in ('hits', 'misses', 'expired'):
+        registry.set('cache_events_total', {'cache': 'jwt', 'event': event}, verified_token_cache.stats[event])
+
+    for host, stats in outbound_transport.get_stats()['hosts'].items():
+        labels = {'dependency': stats['dependency'], 'host': host}
+        registry.set('outbound_pool_waits_total', labels, stats['pool_waits'])
+        registry.set('outbound_connections_opened_total', labels, stats['connections_opened'])
+        registry.set('outbound_requests_in_flight', labels, stats['in_flight'])
+
+    poller = services.peek('tracking_poller')
+    last_run = poller.last_run if poller else None
+    if last_run:
+        registry.set('tracking_poll_last_duration_seconds', None, last_run['duration_ms'] / 1000)
+        for outcome in ('succeeded', 'failed', 'updated', 'deferred'):
+            registry.set('tracking_poll_last_orders', {'outcome': outcome}, last_run[outcome])
+
+    retrier = services.peek('failed_job_retrier')
+    if retrier:
+        for outcome in ('succeeded', 'rescheduled', 'exhausted'):
+            registry.set('failed_job_retries_total', {'outcome': outcome}, retrier.totals[outcome])
+
+def collect_job_queue_metrics(registry: MetricsRegistry):
+    """The SQLite queue is shared by all workers on the host, so it is read once per scrape"""
+    queue = services.peek('job_queue')
+    if queue:
+        for kind, states in queue.get_stats().items():
+            for state, count in states.items():
+                registry.set('job_queue_jobs', {'kind': kind, 'state': state}, count)
+
+metrics.collectors.append(collect_component_metrics)
+metrics.live_collectors.append(collect_job_queue_metrics)
+atexit.register(lambda: metrics.flush(force=True))
+
+# =====================================================
+# STATIC ASSET PIPELINE
 # =====================================================
 
-# Initialize background scheduler
-scheduler = None
-if SCHEDULER_AVAILABLE and qikink_mediator and db_service:
+# Bundle name -> source files under static/, in load order. build_assets.py
+# minifies and concatenates each bundle into static/dist/<name>.<hash>.<ext>.
+ASSET_BUNDLES = {
+    'site.css': ['styles.css', 'account-container.css'],
+    'modal.css': ['modal.css'],
+    'site.js': ['script.js'],
+}
+
+_asset_manifest = {'mtime': None, 'files': {}}
+
+def load_asset_manifest() -> Dict[str, str]:
+    """Bundle name -> fingerprinted file name; re-read only when the build rewrites it"""
+    path = os.path.join(ASSET_DIST_DIR, 'manifest.json')
     try:
-        scheduler = create_scheduler(qikink_mediator, db_service)
-        scheduler.start()
-        app.logger.info('[OK] Background scheduler started')
-    except Exception as e:
-        app.logger.warning(f'[WARN] Failed to start scheduler: {str(e)}')
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if mtime != _asset_manifest['mtime']:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                _asset_manifest['files'] = {name: entry['file'] for name, entry in json.load(f).items()}
+            _asset_manifest['mtime'] = mtime
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f'[WARN] Could not read asset manifest: {str(e)}')
+            return {}
+    return _asset_manifest['files']
+
+def asset_urls(bundle: str) -> List[str]:
+    """Fingerprinted bundle URL when built, else the raw source files (development)"""
+    built = load_asset_manifest().get(bundle)
+    if built:
+        return [f'/assets/{built}']
+    return [f'/static/{source}' for source in ASSET_BUNDLES.get(bundle, [bundle])]
+
+@bp.app_context_processor
+def asset_helpers():
+    def asset_tags(bundle: str) -> Markup:
+        if bundle.endswith('.css'):
+            tags = [f'<link rel="stylesheet" href="{escape(url)}">' for url in asset_urls(bundle)]
+        else:
+            tags = [f'<script src="{escape(url)}"></script>' for url in asset_urls(bundle)]
+        return Markup('\n    '.join(tags))
+
+    return {'asset_url': lambda bundle: asset_urls(bundle)[0], 'asset_tags': asset_tags}
+
+# Precompressed variants written next to each bundle, best first
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+@bp.route('/assets/<path:filename>', methods=['GET'])
+def serve_asset(filename):
+    """Serve a fingerprinted bundle, picking the precompressed variant the client accepts"""
+    path = safe_join(ASSET_DIST_DIR, filename)
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for name, suffix in ASSET_ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+
+    response = send_file(
+        path,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        # The name already carries the content hash; one ETag per encoding keeps variants apart
+        etag=f'{filename}-{encoding or "identity"}',
+        conditional=True,
+        max_age=ASSET_MAX_AGE
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# =====================================================
+# IMAGE DERIVATIVES
+# =====================================================
+
+class ImageSourceError(Exception):
+    """The requested image source is not allowed, missing or unreadable"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ImageDerivativeCache:
+    """Resized image variants stored on disk and evicted least-recently-used by total size.
+
+    Files are named by a digest of (source version, width, format, quality), so
+    a changed source gets fresh names. Access time is recorded with os.utime on
+    every hit; when the directory grows past max_bytes the oldest files are
+    removed until it is back under 90% of the cap. All workers share the
+    directory; writes go through a temp file and os.replace.
+    """
+
+    FORMATS = {
+        'avif': ('AVIF', 'image/avif', '.avif'),
+        'webp': ('WEBP', 'image/webp', '.webp'),
+        'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    }
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._approx_bytes: Optional[int] = None
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.stats = {'hits': 0, 'generated': 0, 'evicted': 0}
+        self._session: Optional[requests.Session] = None
+
+    # ---------- sources ----------
+
+    def resolve_source(self, src: str):
+        """Return (version key, bytes loader) for a /static/images path or an allowed remote URL"""
+        parsed = urlparse(src)
+        if parsed.scheme in ('http', 'https'):
+            if (parsed.hostname or '').lower() not in IMAGE_ALLOWED_HOSTS:
+                raise ImageSourceError('Image host not allowed')
+            # Remote product images are treated as immutable per URL
+            return hashlib.sha256(src.encode('utf-8')).hexdigest(), lambda: self._fetch_remote(src)
+
+        relative = parsed.path
+        for prefix in ('/static/images/', 'static/images/', '/images/'):
+            if relative.startswith(prefix):
+                relative = relative[len(prefix):]
+                break
+        path = safe_join(os.path.join(PROJECT_ROOT, 'static', 'images'), relative)
+        if not path or not os.path.isfile(path):
+            raise ImageSourceError('Image not found', 404)
+        stat = os.stat(path)
+        version = hashlib.sha256(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode('utf-8')).hexdigest()
+
+        def load_local() -> bytes:
+            with open(path, 'rb') as f:
+                return f.read()
+        return version, load_local
+
+    def _fetch_remote(self, url: str) -> bytes:
+        if self._session is None:
+            self._session = outbound_transport.session('images')
+            for host in IMAGE_ALLOWED_HOSTS:
+                outbound_transport.register_host(f'https://{host}', 'images')
+        with self._session.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise ImageSourceError(f'Remote image returned {response.status_code}', 502)
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > IMAGE_FETCH_MAX_BYTES:
+                    raise ImageSourceError('Remote image too large')
+        return bytes(data)
+
+    # ---------- derivatives ----------
+
+    @staticmethod
+    def snap_width(width: int) -> int:
+        """Round up to the next configured width so the cache holds a fixed set of sizes"""
+        for allowed in sorted(IMAGE_WIDTHS):
+            if width <= allowed:
+                return allowed
+        return max(IMAGE_WIDTHS)
+
+    @classmethod
+    def supported_formats(cls) -> List[str]:
+        from PIL import features
+        return [fmt for fmt in cls.FORMATS if fmt == 'jpeg' or features.check(fmt)]
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            if len(self._locks) > 1024:
+                self._locks = {k: lock for k, lock in self._locks.items() if lock.locked()}
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, src: str, width: int, fmt: str) -> Dict:
+        """Path, ETag and mimetype of the derivative, generating it on first request"""
+        if fmt not in self.FORMATS:
+            raise ImageSourceError(f'Unsupported format: {fmt}')
+        version, load = self.resolve_source(src)
+        width = self.snap_width(width)
+        key = hashlib.sha256(f'{version}:{width}:{fmt}:{IMAGE_QUALITY}'.encode('utf-8')).hexdigest()
+        pil_format, mimetype, ext = self.FORMATS[fmt]
+        path = os.path.join(self.directory, key[:2], key + ext)
+
+        if not os.path.isfile(path):
+            with self._key_lock(key):
+                if not os.path.isfile(path):
+                    self._generate(load(), width, pil_format, path)
+                    self.stats['generated'] += 1
+                    return {'path': path, 'etag': key, 'mimetype': mimetype, 'width': width}
+        try:
+            os.utime(path)  # LRU: mark as recently used
+        except OSError:
+            pass
+        self.stats['hits'] += 1
+        return {'path': path, 'etag': key, 'mimetype': mimetype, 'width': width}
+
+    def _generate(self, data: bytes, width: int, pil_format: str, path: str):
+        from PIL import Image, ImageOps
+
+        try:
+            image = Image.open(io.BytesIO(data))
+            image = ImageOps.exif_transpose(image)
+        except Exception as e:
+            raise ImageSourceError(f'Unreadable image: {str(e)}')
+
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if pil_format == 'JPEG':
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # JPEG has no alpha: flatten onto white
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        options = {'quality': IMAGE_QUALITY}
+        if pil_format == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        elif pil_format == 'WEBP':
+            options.update(method=4)
+        try:
+            image.save(tmp_path, pil_format, **options)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            # Encoder error or a full disk: don't leave the partial temp file behind
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._account(size, path)
+
+    # ---------- size cap ----------
+
+    def _account(self, added_bytes: int, keep: str):
+        if self._approx_bytes is None:
+            self._approx_bytes = self._disk_usage()[0]
+        else:
+            self._approx_bytes += added_bytes
+        if self._approx_bytes > self.max_bytes:
+            self.evict(keep=keep)
+
+    def _disk_usage(self):
+        files, total = [], 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return total, files
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Delete least recently used derivatives until under 90% of the cap (never `keep`)"""
+        if not self._evict_lock.acquire(blocking=False):
+            return 0
+        removed = 0
+        try:
+            total, files = self._disk_usage()
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._approx_bytes = total
+            self.stats['evicted'] += removed
+        finally:
+            self._evict_lock.release()
+        if removed:
+            logger.info(f'[OK] Image cache evicted {removed} files')
+        return removed
+
+    def get_stats(self) -> Dict:
+        total, files = self._disk_usage()
+        return {'files': len(files), 'bytes': total, 'max_bytes': self.max_bytes, **self.stats}
+
+
+image_cache = ImageDerivativeCache()
+
+def negotiate_image_format(accept_header: str) -> str:
+    """Best format the browser advertises and this Pillow build can write"""
+    supported = ImageDerivativeCache.supported_formats()
+    for fmt in ('avif', 'webp'):
+        if f'image/{fmt}' in accept_header and fmt in supported:
+            return fmt
+    return 'jpeg'
+
+def image_derivable(src: Optional[str]) -> bool:
+    """True if /api/images can serve resized variants of this source"""
+    if not PILLOW_AVAILABLE or not src:
+        return False
+    parsed = urlparse(src)
+    if parsed.scheme in ('http', 'https'):
+        return (parsed.hostname or '').lower() in IMAGE_ALLOWED_HOSTS
+    return parsed.path.startswith(('/static/images/', 'static/images/', '/images/'))
+
+def image_variant_url(src: str, width: int, fmt: str = 'auto') -> str:
+    """URL of a resized variant, or the original src when it can't be resized here"""
+    if not image_derivable(src):
+        return src
+    query = {'src': src, 'w': ImageDerivativeCache.snap_width(width)}
+    if fmt != 'auto':
+        query['fmt'] = fmt
+    return '/api/images?' + urlencode(query)
+
+@bp.app_context_processor
+def image_helpers():
+    def image_srcset(src: str, width: int) -> str:
+        """1x/2x srcset for an image displayed `width` CSS pixels wide"""
+        if not image_derivable(src):
+            return ''
+        return f'{image_variant_url(src, width)} 1x, {image_variant_url(src, width * 2)} 2x'
+
+    return {'image_url': image_variant_url, 'image_srcset': image_srcset}
+
+PRODUCT_IMAGE_WIDTHS = (320, 480, 640, 960)
+
+def with_image_variants(product: Dict) -> Dict:
+    """Copy of a product with a width-descriptor srcset for its image_url"""
+    if not image_derivable(product.get('image_url')):
+        return product
+    srcset = ', '.join(f'{image_variant_url(product["image_url"], w)} {w}w' for w in PRODUCT_IMAGE_WIDTHS)
+    return {**product, 'image_srcset': srcset}
+
+@bp.route('/api/images', methods=['GET'])
+def image_derivative():
+    """Resized WebP/AVIF/JPEG of a static image or an allowed remote product image"""
+    if not PILLOW_AVAILABLE:
+        return jsonify({'status': 'error', 'message': 'Image processing not available (install Pillow)'}), 503
+
+    src = request.args.get('src', '')
+    width = request.args.get('w', type=int) or max(IMAGE_WIDTHS)
+    fmt = (request.args.get('fmt') or 'auto').lower()
+    negotiated = fmt == 'auto'
+    if negotiated:
+        fmt = negotiate_image_format(request.headers.get('Accept', ''))
+    if not src or width <= 0:
+        return jsonify({'status': 'error', 'message': 'src and a positive w are required'}), 400
+
+    for attempt in range(2):
+        try:
+            derivative = image_cache.get(src, width, fmt)
+        except ImageSourceError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), e.status_code
+        except requests.exceptions.RequestException as e:
+            logger.warning(f'[WARN] Remote image fetch failed for {src}: {str(e)}')
+            return jsonify({'status': 'error', 'message': 'Could not fetch remote image'}), 502
+
+        try:
+            response = send_file(
+                derivative['path'],
+                mimetype=derivative['mimetype'],
+                etag=derivative['etag'],
+                conditional=True,
+                max_age=IMAGE_MAX_AGE
+            )
+            break
+        except FileNotFoundError:
+            # Evicted by another worker between get() and the open: generate it once more
+            if attempt:
+                raise
+    response.headers['Cache-Control'] = f'public, max-age={IMAGE_MAX_AGE}'
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+# =====================================================
+# PRE-RENDERED PAGES
+# =====================================================
+
+class PageCache:
+    """Storefront pages rendered once into bytes with a strong ETag.
+
+    These templates take no per-request input (cart and account state are
+    filled in by script.js), so each page is rendered by prerender() at
+    startup or on first request and then served as-is. A page is rendered
+    again only when its template, a shared component or the asset manifest
+    changes on disk, which is checked at most every PAGE_CACHE_CHECK_SECONDS.
+    """
+
+    def __init__(self, templates: List[str], template_dir: str):
+        self.templates = templates
+        self.template_dir = template_dir
+        self._pages = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'renders': 0, 'errors': 0}
+
+    def _source_version(self, template: str) -> float:
+        """Newest mtime of everything that ends up in the rendered page"""
+        paths = [os.path.join(self.template_dir, template), os.path.join(ASSET_DIST_DIR, 'manifest.json')]
+        components_dir = os.path.join(self.template_dir, 'components')
+        if os.path.isdir(components_dir):
+            paths.extend(os.path.join(components_dir, name) for name in os.listdir(components_dir))
+        version = 0.0
+        for path in paths:
+            try:
+                version = max(version, os.path.getmtime(path))
+            except OSError:
+                pass
+        return version
+
+    def get(self, template: str) -> Dict:
+        """{'body', 'etag', 'rendered_at'} for a page; needs an app context to render"""
+        page = self._pages.get(template)
+        now = time.monotonic()
+        if page and now - page['checked_at'] < PAGE_CACHE_CHECK_SECONDS:
+            self.stats['hits'] += 1
+            return page
+
+        version = self._source_version(template)
+        if page and page['version'] == version:
+            page['checked_at'] = now
+            self.stats['hits'] += 1
+            return page
+
+        with self._lock:
+            page = self._pages.get(template)
+            if page and page['version'] == version:
+                return page
+            body = render_template(template).encode('utf-8')
+            page = {
+                'body': body,
+                'etag': hashlib.sha256(body).hexdigest()[:32],
+                'version': version,
+                'checked_at': now,
+                'rendered_at': datetime.now(timezone.utc).isoformat()
+            }
+            self._pages[template] = page
+            self.stats['renders'] += 1
+            return page
+
+    def prerender(self, app: Flask) -> int:
+        """Render every page up front so the first visitor skips Jinja too"""
+        rendered = 0
+        with app.test_request_context('/'):
+            for template in self.templates:
+                try:
+                    self.get(template)
+                    rendered += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.error(f'[ERROR] Pre-rendering {template} failed: {str(e)}')
+        logger.info(f'[OK] Pre-rendered {rendered}/{len(self.templates)} storefront pages')
+        return rendered
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'pages': {
+                template: {'bytes': len(page['body']), 'etag': page['etag'], 'rendered_at': page['rendered_at']}
+                for template, page in self._pages.items()
+            }
+        }
 
-# Shutdown handler
-def shutdown_scheduler():
-    """Shutdown scheduler on app exit"""
-    if scheduler:
-        scheduler.shutdown()
-        app.logger.info('[OK] Background scheduler stopped')
 
-atexit.register(shutdown_scheduler)
+STOREFRONT_PAGES = ['index.html', 'shop.html', 'product-detail.html', 'about.html', 'contact.html', 'faq.html']
+page_cache = PageCache(STOREFRONT_PAGES, os.path.join(PROJECT_ROOT, 'templates'))
+
+def serve_page(template: str) -> Response:
+    """Pre-rendered page; 304 when the browser's If-None-Match still matches"""
+    page = page_cache.get(template)
+    response = Response(page['body'], mimetype='text/html')
+    response.set_etag(page['etag'])
+    # Cache, but revalidate: a deploy must show up on the next navigation
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 # =====================================================
 # FLASK ROUTES / API ENDPOINTS
 # =====================================================
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def index():
     """Serve the homepage"""
-    return render_template('index.html')
+    return serve_page('index.html')
 
-@app.route('/index.html', methods=['GET'])
+@bp.route('/index.html', methods=['GET'])
 def index_alt():
     """Alternative route for index.html"""
-    return render_template('index.html')
+    return serve_page('index.html')
 
-@app.route('/shop', methods=['GET'])
-@app.route('/shop.html', methods=['GET'])
+@bp.route('/shop', methods=['GET'])
+@bp.route('/shop.html', methods=['GET'])
 def shop():
     """Serve the shop page"""
-    return render_template('shop.html')
+    return serve_page('shop.html')
 
-@app.route('/product-detail', methods=['GET'])
-@app.route('/product-detail.html', methods=['GET'])
+@bp.route('/product-detail', methods=['GET'])
+@bp.route('/product-detail.html', methods=['GET'])
 def product_detail():
     """Serve the product detail page"""
-    return render_template('product-detail.html')
+    return serve_page('product-detail.html')
 
-@app.route('/about', methods=['GET'])
-@app.route('/about.html', methods=['GET'])
+@bp.route('/about', methods=['GET'])
+@bp.route('/about.html', methods=['GET'])
 def about():
     """Serve the about page"""
-    return render_template('about.html')
+    return serve_page('about.html')
 
-@app.route('/contact', methods=['GET'])
-@app.route('/contact.html', methods=['GET'])
+@bp.route('/contact', methods=['GET'])
+@bp.route('/contact.html', methods=['GET'])
 def contact_page():
     """Serve the contact page"""
-    return render_template('contact.html')
+    return serve_page('contact.html')
 
-@app.route('/faq', methods=['GET'])
-@app.route('/faq.html', methods=['GET'])
+@bp.route('/faq', methods=['GET'])
+@bp.route('/faq.html', methods=['GET'])
 def faq():
     """Serve the FAQ page"""
-    return render_template('faq.html')
+    return serve_page('faq.html')
 
-@app.route('/admin', methods=['GET'])
+@bp.route('/admin', methods=['GET'])
 def admin_panel():
     """Serve admin panel with URL security key"""
     security_key = request.args.get('key')
@@ -968,7 +4529,7 @@ def admin_panel():
     
     return render_template('admin.html', security_key=admin_secret)
 
-@app.route('/api', methods=['GET'])
+@bp.route('/api', methods=['GET'])
 def api_info():
     """API information endpoint"""
     return jsonify({
@@ -977,20 +4538,28 @@ def api_info():
         'version': '2.0',
         'mediator': 'enabled',
         'features': {
-            'supabase': supabase_client is not None,
-            'razorpay': razorpay_client is not None,
-            'qikink': qikink_mediator is not None,
+            'supabase': services.supabase_client is not None,
+            'razorpay': services.razorpay_client is not None,
+            'qikink': services.qikink is not None,
             'jwt_auth': JWT_AVAILABLE,
             'background_jobs': SCHEDULER_AVAILABLE
         }
     }), 200
 
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint aggregating every worker on this host"""
+    if METRICS_TOKEN and request.headers.get('Authorization', '') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'status': 'error', 'message': 'Invalid metrics token'}), 401
+
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/health', methods=['GET'])
 def health_check():
     """Check the health of integrated services"""
-    qikink_status = qikink_mediator.test_connection() if qikink_mediator else {'status': 'not_configured'}
+    qikink_status = services.qikink.test_connection() if services.qikink else {'status': 'not_configured'}
     razorpay_status = {'status': 'connected'} # Simplified check since there's no official test method
-    supabase_status = {'status': 'connected' if supabase_client else 'not_configured'}
+    supabase_status = {'status': 'connected' if services.supabase_client else 'not_configured'}
     
     return jsonify({
         'status': 'healthy',
@@ -1004,35 +4573,156 @@ def health_check():
         }
     }), 200
 
-@app.route('/api/products', methods=['GET'])
+def _parse_price_arg(name: str) -> Optional[float]:
+    """Read an optional numeric price query parameter"""
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    return float(value)
+
+@bp.route('/api/products', methods=['GET'])
 def get_products():
-    """Fetch products from DB, fallback to local data"""
-    products = db_service.get_products_from_db() if db_service else []
-    
-    if not products:
+    """Fetch a filtered, sorted, keyset-paginated page of products, fallback to local data"""
+    try:
+        filters = {
+            'category': request.args.get('category') or None,
+            'collection': request.args.get('collection') or None,
+            'min_price': _parse_price_arg('min_price'),
+            'max_price': _parse_price_arg('max_price')
+        }
+        limit = int(request.args.get('limit', PRODUCTS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid price or limit parameter'}), 400
+
+    sort = request.args.get('sort', 'sku')
+    if sort not in DatabaseService.PRODUCT_SORTS:
+        return jsonify({'status': 'error', 'message': f'Unsupported sort: {sort}'}), 400
+    limit = max(1, min(limit, PRODUCTS_MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        try:
+            DatabaseService.decode_product_cursor(cursor, sort)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    page = {'products': [], 'next_cursor': None, 'has_more': False}
+    if services.db:
+        cache_key = ('page', tuple(sorted(filters.items())), sort, limit, cursor)
+        try:
+            page = product_cache.get(cache_key, lambda: services.db.get_products_page(filters, sort, limit, cursor))
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to fetch products page: {str(e)}')
+
+    products = page['products']
+    if not products and not cursor and not any(v is not None for v in filters.values()):
         products = list(PRODUCTS.values()) # Fallback to sample data
 
     return jsonify({
         'status': 'success',
         'count': len(products),
-        'products': products
+        'products': [with_image_variants(p) for p in products],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more'],
+        'sort': sort,
+        'limit': limit
+    }), 200
+
+@bp.route('/api/products/search', methods=['GET'])
+def search_products():
+    """Ranked full-text product search (English, Hindi and romanized Hindi)"""
+    query = (request.args.get('q') or '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', PRODUCTS_PAGE_SIZE)), SEARCH_MAX_RESULTS))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid limit or offset parameter'}), 400
+    if not query:
+        return jsonify({'status': 'error', 'message': 'Missing search query (q)'}), 400
+
+    try:
+        product_search_index.refresh(services.db)
+    except Exception as e:
+        logger.error(f'[ERROR] Product search index refresh failed: {str(e)}')
+        if product_search_index.built_at is None:
+            return jsonify({'status': 'error', 'message': 'Search is temporarily unavailable'}), 503
+
+    started = time.perf_counter()
+    result = product_search_index.search(query, limit=limit, offset=offset)
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'total': result['total'],
+        'count': len(result['products']),
+        'products': [with_image_variants(p) for p in result['products']],
+        'offset': offset,
+        'limit': limit,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3)
     }), 200
 
-@app.route('/api/admin/sync-products', methods=['POST'])
+@bp.route('/api/products/autocomplete', methods=['GET'])
+def autocomplete_products():
+    """Word completions and top products for a partially typed query"""
+    query = (request.args.get('q') or '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', 8)), 20))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid limit parameter'}), 400
+    if not query:
+        return jsonify({'status': 'success', 'query': query, 'suggestions': [], 'products': []}), 200
+
+    try:
+        product_search_index.refresh(services.db)
+    except Exception as e:
+        logger.error(f'[ERROR] Product search index refresh failed: {str(e)}')
+        if product_search_index.built_at is None:
+            return jsonify({'status': 'error', 'message': 'Search is temporarily unavailable'}), 503
+
+    return jsonify({'status': 'success', 'query': query, **product_search_index.autocomplete(query, limit)}), 200
+
+@bp.route('/api/products/facets', methods=['GET'])
+def get_product_facets():
+    """Counts per filter value for the current shop filter selection"""
+    # Each facet accepts repeated or comma-separated values: ?size=M&size=L or ?size=M,L
+    filters = {
+        facet: [value.strip() for raw in request.args.getlist(facet) for value in raw.split(',') if value.strip()]
+        for facet in FacetIndex.FACETS
+    }
+
+    try:
+        index = facet_cache.get('catalog', load_facet_index)
+    except Exception as e:
+        logger.error(f'[ERROR] Failed to build facet index: {str(e)}')
+        return jsonify({'status': 'error', 'message': 'Facets are temporarily unavailable'}), 503
+
+    return jsonify({'status': 'success', **index.counts(filters)}), 200
+
+@bp.route('/api/products/<sku>/stock', methods=['GET'])
+def get_product_stock(sku):
+    """Per size/color stock for a product page, served from the per-worker stock cache"""
+    try:
+        summary = stock_cache.get(sku, lambda: load_product_stock(sku))
+    except Exception as e:
+        logger.error(f'[ERROR] Failed to load stock for {sku}: {str(e)}')
+        return jsonify({'status': 'error', 'message': 'Stock is temporarily unavailable'}), 503
+    if summary is None:
+        return jsonify({'status': 'error', 'message': 'Product not found'}), 404
+    return jsonify({'status': 'success', **summary}), 200
+
+@bp.route('/api/admin/sync-products', methods=['POST'])
 @require_admin
 def sync_products():
     """Admin endpoint to force product sync from Qikink"""
-    if not qikink_mediator:
+    if not services.qikink:
         return jsonify({'status': 'error', 'message': 'Qikink service not configured'}), 503
     
-    result = qikink_mediator.sync_products()
+    result = services.qikink.sync_products()
     return jsonify(result), 200
 
 # =====================================================
 # API ENDPOINTS - AUTHENTICATION
 # =====================================================
 
-@app.route('/api/auth/login', methods=['POST'])
+@bp.route('/api/auth/login', methods=['POST'])
 def admin_login():
     """User login endpoint - requires Supabase"""
     data = request.get_json()
@@ -1042,17 +4732,21 @@ def admin_login():
     if not email or not password:
         return jsonify({'status': 'error', 'message': 'Missing credentials'}), 400
 
-    if not db_service:
+    if not services.db:
         return jsonify({'status': 'error', 'message': 'Database service not configured. Please set SUPABASE_URL and SUPABASE_KEY in .env'}), 503
 
     try:
         # Query Supabase for user
-        existing_user = db_service.db.table('app_users').select('password, role, name').eq('email', email).execute()
+        existing_user = services.db.db.table('app_users').select('password, role, name').eq('email', email).execute()
         if not existing_user.data or len(existing_user.data) == 0:
             return jsonify({'status': 'error', 'message': 'Invalid credentials'}), 401
         
         user = existing_user.data[0]
-        if not verify_password(password, user['password']):
+        try:
+            password_ok = verify_password(password, user['password'])
+        except PasswordHasherBusy:
+            return jsonify({'status': 'error', 'message': 'Too many login attempts right now, please retry'}), 503, {'Retry-After': '1'}
+        if not password_ok:
             return jsonify({'status': 'error', 'message': 'Invalid credentials'}), 401
         
         # Generate JWT tokens
@@ -1067,10 +4761,10 @@ def admin_login():
         }), 200
         
     except Exception as e:
-        app.logger.error(f'Login error: {str(e)}')
+        logger.error(f'Login error: {str(e)}')
         return jsonify({'status': 'error', 'message': 'Login failed. Please check your database configuration.'}), 500
 
-@app.route('/api/auth/signup', methods=['POST'])
+@bp.route('/api/auth/signup', methods=['POST'])
 def user_signup():
     """User signup endpoint - requires Supabase"""
     data = request.get_json()
@@ -1081,20 +4775,23 @@ def user_signup():
     if not name or not email or not password:
         return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
     
-    if not db_service or not JWT_AVAILABLE:
+    if not services.db or not JWT_AVAILABLE:
         return jsonify({'status': 'error', 'message': 'Database service not configured. Please set SUPABASE_URL and SUPABASE_KEY in .env'}), 503
     
     try:
         # Check if user already exists
-        existing_user = db_service.db.table('app_users').select('email').eq('email', email).execute()
+        existing_user = services.db.db.table('app_users').select('email').eq('email', email).execute()
         if existing_user.data:
             return jsonify({'status': 'error', 'message': 'Email already registered'}), 400
         
         # Hash password
-        hashed_password = hash_password(password)
+        try:
+            hashed_password = hash_password(password)
+        except PasswordHasherBusy:
+            return jsonify({'status': 'error', 'message': 'Too many signups right now, please retry'}), 503, {'Retry-After': '1'}
         
         # Create user in Supabase
-        result = db_service.db.table('app_users').insert({
+        result = services.db.db.table('app_users').insert({
             'name': name,
             'email': email,
             'password': hashed_password,
@@ -1122,10 +4819,10 @@ def user_signup():
             return jsonify({'status': 'error', 'message': 'Failed to create account'}), 500
             
     except Exception as e:
-        app.logger.error(f'Signup error: {str(e)}')
+        logger.error(f'Signup error: {str(e)}')
         return jsonify({'status': 'error', 'message': f'Signup failed: {str(e)}'}), 500
 
-@app.route('/api/auth/refresh', methods=['POST'])
+@bp.route('/api/auth/refresh', methods=['POST'])
 def refresh_token():
     """Token refresh endpoint"""
     data = request.get_json()
@@ -1151,7 +4848,7 @@ def refresh_token():
 # API ENDPOINTS - ORDERS & PAYMENTS
 # =====================================================
 
-@app.route('/api/create-order', methods=['POST'])
+@bp.route('/api/create-order', methods=['POST'])
 def create_razorpay_order():
     """MEDIATOR: Create Razorpay order and store in Supabase"""
     data = request.get_json()
@@ -1160,7 +4857,7 @@ def create_razorpay_order():
     if not all(field in data for field in required_fields):
         return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
     
-    if not razorpay_mediator or not db_service:
+    if not services.razorpay or not services.db:
         return jsonify({'status': 'error', 'message': 'Payment system not configured'}), 503
 
     # Calculate total
@@ -1170,7 +4867,7 @@ def create_razorpay_order():
     order_id = f"BHRT-{int(datetime.now().timestamp())}-{os.urandom(4).hex()}"
     
     # Create Razorpay order (amount is in paise)
-    razorpay_order = razorpay_mediator.create_order(
+    razorpay_order = services.razorpay.create_order(
         amount=int(total * 100),
         currency='INR',
         receipt=order_id
@@ -1187,7 +4884,7 @@ def create_razorpay_order():
         'status': 'pending',
         'razorpay_order_id': razorpay_order['id']
     }
-    db_order = db_service.create_order_in_db(order_data_for_db)
+    db_order = services.db.create_order_in_db(order_data_for_db)
 
     if not db_order:
         # NOTE: In a production scenario, you would need to cancel the Razorpay order here
@@ -1202,7 +4899,7 @@ def create_razorpay_order():
         'key_id': RAZORPAY_KEY_ID # Sent to frontend for payment
     }), 200
 
-@app.route('/api/verify-payment', methods=['POST'])
+@bp.route('/api/verify-payment', methods=['POST'])
 def verify_payment_and_submit():
     """MEDIATOR: Verify Razorpay signature, record payment, and submit to Qikink"""
     data = request.get_json()
@@ -1211,16 +4908,16 @@ def verify_payment_and_submit():
     if not all(field in data for field in required_fields):
         return jsonify({'status': 'error', 'message': 'Missing required verification fields'}), 400
 
-    if not razorpay_mediator or not db_service or not qikink_mediator:
+    if not services.razorpay or not services.db or not services.qikink:
         return jsonify({'status': 'error', 'message': 'Payment/Order system not fully configured'}), 503
 
     # 1. Retrieve Order
-    order = db_service.get_order_by_id(data['order_id'])
+    order = services.db.get_order_by_id(data['order_id'])
     if not order or order.get('razorpay_order_id') != data['razorpay_order_id']:
         return jsonify({'status': 'error', 'message': 'Order not found or ID mismatch'}), 404
 
     # 2. Verify Signature
-    is_valid_signature = razorpay_mediator.verify_payment_signature(
+    is_valid_signature = services.razorpay.verify_payment_signature(
         data['razorpay_order_id'],
         data['razorpay_payment_id'],
         data['razorpay_signature']
@@ -1229,124 +4926,395 @@ def verify_payment_and_submit():
     if not is_valid_signature:
         return jsonify({'status': 'error', 'message': 'Payment signature verification failed'}), 400
 
-    # 3. Record Payment & Update Order Status
-    payment_record = db_service.create_payment_record({
-        'razorpay_payment_id': data['razorpay_payment_id'],
-        'razorpay_order_id': data['razorpay_order_id'],
-        'amount': order['total_amount'],
-        'status': 'verified',
-        'payment_method': 'online',
-        'idempotency_key': f"{data['razorpay_payment_id']}_verified"
-    })
-    
+    # 3. Record Payment & Update Order Status; a repeated verify call changes nothing
+    idempotency_key = f"{data['razorpay_payment_id']}_verified"
+    if idempotency_key in recent_payment_keys:
+        claim = {'status': 'duplicate'}
+    else:
+        claim = services.db.claim_payment_record({
+            'razorpay_payment_id': data['razorpay_payment_id'],
+            'razorpay_order_id': data['razorpay_order_id'],
+            'amount': order['total_amount'],
+            'status': 'verified',
+            'payment_method': 'online',
+            'idempotency_key': idempotency_key
+        })
+        if claim['status'] == 'error':
+            return jsonify({'status': 'error', 'message': 'Failed to record payment'}), 500
+        recent_payment_keys.add(idempotency_key)
+
+    # A duplicate whose order never got a fulfillment_status was claimed by a request
+    # that died before queueing; carry on and queue it (the queue dedupes on order_id)
+    if claim['status'] == 'duplicate' and order.get('fulfillment_status'):
+        return jsonify({
+            'status': 'success',
+            'message': 'Payment already verified',
+            'order_id': order['order_id'],
+            'fulfillment_status': order.get('fulfillment_status')
+        }), 200
+
     # Update order status
-    db_service.update_order_status(order['order_id'], 'payment_verified')
+    services.db.update_order_status(order['order_id'], 'payment_verified', fulfillment_status='queued')
 
-    # 4. Submit to Qikink
-    qikink_result = qikink_mediator.submit_order_to_qikink(order['order_id'])
+    # 4. Queue Qikink submission; queue workers handle it after we respond
+    fulfillment_status = 'queued'
+    try:
+        if not services.job_queue or 'qikink_fulfillment' not in services.job_queue.handlers:
+            raise RuntimeError('Job queue not running')
+        services.job_queue.enqueue('qikink_fulfillment', order['order_id'], {'order_id': order['order_id']})
+    except Exception as e:
+        # Fall back to the failed_jobs table so the retry job still submits it
+        logger.error(f'[ERROR] Failed to queue fulfillment for {order["order_id"]}: {str(e)}')
+        services.db.add_failed_job('qikink_order_submission', order['order_id'], {'order_id': order['order_id']}, str(e))
+        fulfillment_status = 'retry_scheduled'
     
-    app.logger.info(f'Payment verified for order {order["order_id"]}, Qikink status: {qikink_result["status"]}')
+    logger.info(f'Payment verified for order {order["order_id"]}, fulfillment: {fulfillment_status}')
 
     return jsonify({
         'status': 'success',
         'payment_verified': True,
         'order_id': order['order_id'],
-        'qikink_submitted': qikink_result['status'] == 'success',
-        'qikink_order_id': qikink_result.get('qikink_order_id')
+        'fulfillment_status': fulfillment_status
     }), 200
 
-@app.route('/api/webhooks/razorpay', methods=['POST'])
+@bp.route('/api/webhooks/razorpay', methods=['POST'])
 def razorpay_webhook_handler():
-    """MEDIATOR: Handle Razorpay webhooks with idempotency"""
+    """MEDIATOR: Verify a Razorpay webhook, queue it and acknowledge immediately"""
     signature = request.headers.get('X-Razorpay-Signature')
-    payload = request.get_data(as_text=True) # Get raw payload string for verification
+    body = request.get_data()  # Raw bytes exactly as Razorpay signed them
 
-    if not razorpay_mediator or not signature:
+    if not services.razorpay or not signature:
         return jsonify({'status': 'error'}), 503
 
-    # Process webhook
-    result = razorpay_mediator.process_webhook(json.loads(payload), signature)
-
-    if result['status'] in ['success', 'duplicate']:
-        app.logger.info(f'Webhook processed: {result}')
-        return jsonify({'status': 'ok'}), 200
-    else:
-        app.logger.error(f'Webhook processing failed: {result}')
+    if not services.razorpay.verify_webhook_signature(body, signature):
+        logger.error('[ERROR] Razorpay Webhook Signature Verification Failed')
         return jsonify({'status': 'error'}), 400
 
-@app.route('/api/order-status/<order_id>', methods=['GET'])
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid JSON'}), 400
+
+    # Razorpay resends the same event id on retries, so duplicates collapse into one job
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body).hexdigest()
+    if event_id in recent_webhook_events:
+        return jsonify({'status': 'ok', 'queued': False}), 200
+
+    queue = services.job_queue
+    if queue and 'razorpay_webhook' in queue.handlers:
+        try:
+            created = queue.enqueue('razorpay_webhook', event_id, {'event_id': event_id, 'event': event})
+            recent_webhook_events.add(event_id)
+            return jsonify({'status': 'ok', 'queued': created}), 200
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to queue webhook {event_id}: {str(e)}')
+
+    # No local queue: apply inline as before
+    result = services.razorpay.process_webhook(body, signature)
+    if result['status'] == 'error':
+        logger.error(f'Webhook processing failed: {result}')
+        return jsonify({'status': 'error'}), 500
+    logger.info(f'Webhook processed: {result}')
+    return jsonify({'status': 'ok'}), 200
+
+@bp.route('/api/order-status/<order_id>', methods=['GET'])
 def get_order_status_endpoint(order_id):
     """Get order status and tracking information"""
-    if not db_service:
+    if not services.db:
         return jsonify({'status': 'error', 'message': 'Database not configured'}), 503
     
-    order = db_service.get_order_by_id(order_id)
+    order = services.db.get_order_by_id(order_id)
     
     if not order:
         return jsonify({'status': 'error', 'message': 'Order not found'}), 404
     
     return jsonify({
         'status': 'success',
-        'order': order
+        'order': order,
+        'fulfillment': services.job_queue.get_job('qikink_fulfillment', order_id) if services.job_queue else None
+    }), 200
+
+@bp.route('/api/order-status/<order_id>/timeline', methods=['GET'])
+def get_order_timeline_endpoint(order_id):
+    """Get an order's stored tracking history without calling Qikink"""
+    if not services.db:
+        return jsonify({'status': 'error', 'message': 'Database not configured'}), 503
+
+    order = services.db.get_order_by_id(order_id)
+
+    if not order:
+        return jsonify({'status': 'error', 'message': 'Order not found'}), 404
+
+    return jsonify({
+        'status': 'success',
+        'order_id': order_id,
+        'order_status': order.get('status'),
+        'tracking_number': order.get('tracking_number'),
+        'events': services.db.get_tracking_timeline(order['id'])
     }), 200
 
 # =====================================================
 # API ENDPOINTS - ADMIN
 # =====================================================
 
-@app.route('/api/admin/sync-products', methods=['POST'])
+@bp.route('/api/admin/sync-products', methods=['POST'])
 @require_admin
 def admin_sync_products_endpoint():
     """Admin: Sync products from Qikink to Supabase"""
-    if not qikink_mediator:
+    if not services.qikink:
         return jsonify({'status': 'error', 'message': 'Qikink service not configured'}), 503
     
-    result = qikink_mediator.sync_products()
-    app.logger.info(f'Admin product sync: {result}')
+    result = services.qikink.sync_products()
+    logger.info(f'Admin product sync: {result}')
     
     return jsonify(result), 200 if result['status'] == 'success' else 500
 
-@app.route('/api/admin/dashboard', methods=['GET'])
+@bp.route('/api/admin/dashboard', methods=['GET'])
 @require_admin
 def admin_dashboard_endpoint():
     """Admin: Get dashboard statistics"""
-    if not db_service:
+    if not services.db:
         return jsonify({'status': 'error', 'message': 'Database not configured'}), 503
     
-    stats = db_service.get_dashboard_stats()
+    try:
+        if DASHBOARD_CACHE_TTL > 0:
+            stats = dashboard_cache.get('stats', services.db.get_dashboard_stats)
+        else:
+            stats = services.db.get_dashboard_stats()
+    except Exception:
+        return jsonify({'status': 'error', 'message': 'Failed to load dashboard stats'}), 500
     return jsonify(stats), 200
 
-@app.route('/api/admin/orders', methods=['GET'])
+@bp.route('/api/admin/cache-stats', methods=['GET'])
+@require_admin
+def admin_cache_stats_endpoint():
+    """Admin: In-process cache hit/miss/refresh counters for this worker"""
+    return jsonify({
+        'status': 'success',
+        'pid': os.getpid(),
+        'caches': {
+            'catalog': product_cache.get_stats(),
+            'facets': facet_cache.get_stats(),
+            'stock': stock_cache.get_stats(),
+            'dashboard': dashboard_cache.get_stats()
+        },
+        'pages': page_cache.get_stats(),
+        'search': product_search_index.get_stats(),
+        'jwt': verified_token_cache.get_stats(),
+        'idempotency_keys': {
+            'payments': recent_payment_keys.get_stats(),
+            'webhooks': recent_webhook_events.get_stats(),
+            'tracking_events': recent_tracking_events.get_stats()
+        }
+    }), 200
+
+@bp.route('/api/admin/transport-stats', methods=['GET'])
+@require_admin
+def admin_transport_stats_endpoint():
+    """Admin: Outbound HTTP pool and latency metrics per host for this worker"""
+    return jsonify({'status': 'success', 'pid': os.getpid(), **outbound_transport.get_stats()}), 200
+
+@bp.route('/api/admin/tracking-poller', methods=['GET'])
+@require_admin
+def admin_tracking_poller_endpoint():
+    """Admin: Statistics from the last tracking poll run and the per-order poll schedule"""
+    if not services.tracking_poller:
+        return jsonify({'status': 'error', 'message': 'Qikink service not configured'}), 503
+
+    return jsonify({
+        'status': 'success',
+        'pid': os.getpid(),
+        'is_leader': bool(services.scheduler_leader and services.scheduler_leader.is_leader),
+        'last_run': services.tracking_poller.last_run,
+        'schedule': services.tracking_poller.schedule.get_stats()
+    }), 200
+
+@bp.route('/api/admin/tracking-poller/run', methods=['POST'])
+@require_admin
+def admin_tracking_poller_run_endpoint():
+    """Admin: Start a tracking poll in the background; ?full=true polls every active order regardless of its schedule
+
+    Only the scheduler leader's schedule knows when each order was last
+    polled, so other workers answer 409 (with the leader's pid) instead of
+    polling alongside the leader's own tick.
+    """
+    if not services.tracking_poller:
+        return jsonify({'status': 'error', 'message': 'Qikink service not configured'}), 503
+    if not services.scheduler_leader:
+        return jsonify({'status': 'error', 'message': 'Background scheduler not enabled in this worker'}), 503
+
+    scheduler = services.scheduler
+    if not scheduler:
+        leader = services.scheduler_leader.get_status()['leader'] or {}
+        return jsonify({
+            'status': 'error',
+            'message': 'Tracking polls run in the scheduler leader; retry to reach it',
+            'leader_pid': leader.get('pid')
+        }), 409
+    if services.tracking_poller.running:
+        return jsonify({'status': 'skipped', 'message': 'Previous run still in progress'}), 409
+
+    full = request.args.get('full', 'false').lower() in ('1', 'true', 'yes')
+    # No trigger: the leader's scheduler runs it once, right away, off the request thread
+    scheduler.add_job(
+        func=services.tracking_poller.run,
+        kwargs={'full': full},
+        id='tracking_poll_manual',
+        name='Manual tracking poll',
+        replace_existing=True
+    )
+    logger.info(f'[OK] Manual tracking poll started (full={full})')
+    return jsonify({
+        'status': 'accepted',
+        'full': full,
+        'message': 'Tracking poll started; GET /api/admin/tracking-poller shows the result'
+    }), 202
+
+@bp.route('/api/admin/scheduler', methods=['GET'])
+@require_admin
+def admin_scheduler_endpoint():
+    """Admin: Which worker process currently runs the background scheduler"""
+    if not services.scheduler_leader:
+        return jsonify({'status': 'error', 'message': 'Background scheduler not enabled in this worker'}), 503
+
+    status = services.scheduler_leader.get_status()
+    scheduler = services.scheduler
+    status['jobs'] = [{
+        'id': job.id,
+        'name': job.name,
+        'next_run_time': job.next_run_time.isoformat() if job.next_run_time else None
+    } for job in scheduler.get_jobs()] if scheduler else []
+
+    return jsonify({'status': 'success', **status}), 200
+
+@bp.route('/api/admin/failed-jobs', methods=['GET'])
+@require_admin
+def admin_failed_jobs_endpoint():
+    """Admin: Failed order retry queue depth and retry throughput in this worker"""
+    if not services.failed_job_retrier:
+        return jsonify({'status': 'error', 'message': 'Qikink service not configured'}), 503
+
+    return jsonify({'status': 'success', 'pid': os.getpid(), **services.failed_job_retrier.get_stats()}), 200
+
+ORDER_EXPORT_COLUMNS = [
+    'order_id', 'created_at', 'status', 'fulfillment_status', 'customer_name', 'customer_email',
+    'customer_phone', 'shipping_address', 'shipping_city', 'shipping_state', 'shipping_pincode',
+    'items', 'total_amount', 'razorpay_order_id', 'qikink_order_id', 'tracking_number'
+]
+
+def _parse_order_filters() -> Dict:
+    """Read status / from / to query params; a date-only `to` is inclusive of that day"""
+    filters = {'status': request.args.get('status') or None, 'date_from': None, 'date_to': None}
+
+    date_from = request.args.get('from')
+    if date_from:
+        filters['date_from'] = datetime.fromisoformat(date_from).isoformat()
+
+    date_to = request.args.get('to')
+    if date_to:
+        parsed = datetime.fromisoformat(date_to)
+        if len(date_to) == 10:
+            parsed += timedelta(days=1)
+        filters['date_to'] = parsed.isoformat()
+    return filters
+
+@bp.route('/api/admin/orders', methods=['GET'])
 @require_admin
 def admin_get_orders_endpoint():
-    """Admin: Get all orders with filters"""
-    if not db_service:
+    """Admin: Get a page of orders with status and date-range filters"""
+    if not services.db:
         return jsonify({'status': 'error', 'message': 'Database not configured'}), 503
     
-    status_filter = request.args.get('status')
-    orders = db_service.get_all_orders(status_filter=status_filter)
+    try:
+        filters = _parse_order_filters()
+        limit = max(1, min(int(request.args.get('limit', ADMIN_ORDERS_PAGE_SIZE)), ADMIN_ORDERS_MAX_PAGE_SIZE))
+        page = services.db.get_orders_page(filters, limit=limit, cursor=request.args.get('cursor') or None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f'[ERROR] Failed to get orders page: {str(e)}')
+        return jsonify({'status': 'error', 'message': 'Failed to load orders'}), 500
     
-    return jsonify({'status': 'success', 'orders': orders}), 200
+    return jsonify({
+        'status': 'success',
+        'orders': page['orders'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    }), 200
+
+@bp.route('/api/admin/orders/export', methods=['GET'])
+@require_admin
+def admin_export_orders_endpoint():
+    """Admin: Stream matching orders as CSV or NDJSON without buffering the full history"""
+    if not services.db:
+        return jsonify({'status': 'error', 'message': 'Database not configured'}), 503
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'status': 'error', 'message': 'format must be csv or ndjson'}), 400
+    try:
+        filters = _parse_order_filters()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid parameter: {str(e)}'}), 400
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ORDER_EXPORT_COLUMNS)
+        rows_in_buffer = 0
+        for order in services.db.iter_orders(filters):
+            writer.writerow([
+                json.dumps(order.get(col)) if col == 'items' and not isinstance(order.get(col), str) else order.get(col)
+                for col in ORDER_EXPORT_COLUMNS
+            ])
+            rows_in_buffer += 1
+            if rows_in_buffer >= 100:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+                rows_in_buffer = 0
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        lines = []
+        for order in services.db.iter_orders(filters):
+            lines.append(json.dumps(order, default=str))
+            if len(lines) >= 100:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    filename = f'orders-{datetime.now().strftime("%Y%m%d-%H%M%S")}.{export_format}'
+    generator = generate_csv() if export_format == 'csv' else generate_ndjson()
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
-@app.route('/api/admin/retry-order/<order_id>', methods=['POST'])
+@bp.route('/api/admin/retry-order/<order_id>', methods=['POST'])
 @require_admin
 def admin_retry_order_endpoint(order_id):
     """Admin: Manually retry failed Qikink submission"""
-    if not qikink_mediator:
+    if not services.qikink:
         return jsonify({'status': 'error', 'message': 'Qikink service not configured'}), 503
     
-    result = qikink_mediator.submit_order_to_qikink(order_id)
-    app.logger.info(f'Admin retry order {order_id}: {result}')
+    result = services.qikink.submit_order_to_qikink(order_id)
+    logger.info(f'Admin retry order {order_id}: {result}')
     
     return jsonify(result), 200 if result['status'] == 'success' else 500
 
-@app.route('/api/admin/test-connectivity', methods=['GET'])
+@bp.route('/api/admin/test-connectivity', methods=['GET'])
 @require_admin
 def admin_test_connectivity_endpoint():
     """Admin: Test Qikink and Razorpay connectivity"""
-    qikink_status = qikink_mediator.test_connection() if qikink_mediator else {'status': 'not_configured'}
-    razorpay_status = {'status': 'connected'} if razorpay_client else {'status': 'not_configured'}
-    supabase_status = {'status': 'connected' if supabase_client else 'not_configured'}
+    qikink_status = services.qikink.test_connection() if services.qikink else {'status': 'not_configured'}
+    razorpay_status = {'status': 'connected'} if services.razorpay_client else {'status': 'not_configured'}
+    supabase_status = {'status': 'connected' if services.supabase_client else 'not_configured'}
     
     return jsonify({
         'qikink': qikink_status,
@@ -1358,44 +5326,95 @@ def admin_test_connectivity_endpoint():
 # ERROR HANDLERS
 # =====================================================
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         'status': 'error',
         'message': 'Endpoint not found'
     }), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         'status': 'error',
         'message': 'Internal server error'
     }), 500
 
-@app.errorhandler(Exception)
+@bp.app_errorhandler(Exception)
 def handle_exception(e):
     """Global exception handler"""
-    app.logger.error(f'Unhandled exception: {str(e)}', exc_info=True)
+    logger.error(f'Unhandled exception: {str(e)}', exc_info=True)
     return jsonify({
         'status': 'error',
         'message': 'Internal server error'
     }), 500
 
+# =====================================================
+# APPLICATION FACTORY
+# =====================================================
+
+def create_app(start_background: bool = False) -> Flask:
+    """Build the Flask app without touching Supabase, Razorpay or Qikink.
+
+    Remote clients are created on first use by ``services``. Background work is
+    off by default so importing app.py stays cheap; served processes start it
+    with start_background_thread() (gunicorn.conf.py does this per worker).
+    """
+    app = Flask(__name__,
+                static_folder=os.path.join(PROJECT_ROOT, 'static'),
+                static_url_path='/static',
+                template_folder=os.path.join(PROJECT_ROOT, 'templates'))
+
+    CORS(app, resources={r"/*": {"origins": "*"}})
+
+    # Configuration
+    app.config['JSON_SORT_KEYS'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join(PROJECT_ROOT, 'uploads')
+    app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    app.logger.addHandler(file_handler)
+    app.register_blueprint(bp)
+
+    if PAGE_PRERENDER:
+        page_cache.prerender(app)
+
+    if start_background:
+        start_background_thread()
+
+    return app
+
+
+def start_background_thread() -> bool:
+    """Start queue workers and the scheduler from a daemon thread, so a fresh worker serves pages first"""
+    # Pool children (bcrypt) re-import this module; they never run jobs
+    if not BACKGROUND_JOBS_ENABLED or multiprocessing.parent_process() is not None:
+        return False
+    threading.Thread(target=services.start_background, name='background-start', daemon=True).start()
+    return True
+
+
+# WSGI entry point for gunicorn (app:app); background work starts in gunicorn.conf.py
+app = create_app()
+
 # =====================================================
 # MAIN
 # =====================================================
 
 if __name__ == '__main__':
+    if BACKGROUND_JOBS_ENABLED:
+        services.start_background()
+
     print('\n' + '='*60)
     print('THE BHARAT COLLECTIONS - BACKEND MEDIATOR')
     print('='*60)
-    print(f'Supabase: {"[OK] Connected" if supabase_client else "[X] Not configured"}')
-    print(f'Razorpay: {"[OK] Connected" if razorpay_client else "[X] Not configured"}')
-    print(f'Qikink: {"[OK] Connected" if qikink_mediator else "[X] Not configured"}')
+    print(f'Supabase: {"[OK] Connected" if services.supabase_client else "[X] Not configured"}')
+    print(f'Razorpay: {"[OK] Connected" if services.razorpay_client else "[X] Not configured"}')
+    print(f'Qikink: {"[OK] Connected" if services.qikink else "[X] Not configured"}')
     print(f'JWT Auth: {"[OK] Enabled" if JWT_AVAILABLE else "[X] Disabled"}')
-    print(f'Scheduler: {"[OK] Running" if scheduler else "[X] Disabled"}')
+    print(f'Scheduler: {"[OK] Running" if services.scheduler else "[OK] Leader election" if services.scheduler_leader else "[X] Disabled"}')
     print('='*60 + '\n')
     
     # Production deployment might use a WSGI server (like Gunicorn), 
     # but for local dev/testing:
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False) # use_reloader=False stops double scheduler start
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False) # use_reloader=False stops double scheduler start
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Flask app
+
+Each run starts a fresh interpreter, imports app.py, builds the app with
+create_app() and serves one static page, so the numbers
+match what a new gunicorn worker pays before it can answer a request.
+
+Usage:
+    python bench_startup.py                 # 5 runs, print a summary
+    python bench_startup.py --runs 10 --json
+    python bench_startup.py --max-ms 1500   # exit 1 if the median is slower
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('supabase', 'razorpay', 'apscheduler', 'bcrypt', 'jwt')
+
+# Runs inside the child interpreter; prints one JSON line of timings
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+flask_app = app_module.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get('/about')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+    'status_code': response.status_code,
+    'services_built': app_module.services.built(),
+    'background_started': app_module.services._background_started,
+    'heavy_modules_loaded': [m for m in HEAVY_MODULES if m in sys.modules],
+}))
+"""
+
+
+def run_once() -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-c', f'HEAVY_MODULES = {HEAVY_MODULES!r}\n{CHILD_SCRIPT}'],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Benchmark run failed:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: list, key: str) -> dict:
+    values = [run[key] for run in runs]
+    return {
+        'min': round(min(values), 1),
+        'median': round(statistics.median(values), 1),
+        'max': round(max(values), 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Measure cold-start time of app.py')
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters to start')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if the median total exceeds this')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(max(1, args.runs))]
+    report = {
+        'runs': len(runs),
+        'timings_ms': {key: summarize(runs, key)
+                       for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms')},
+        'status_code': runs[-1]['status_code'],
+        'services_built': runs[-1]['services_built'],
+        'background_started': runs[-1]['background_started'],
+        'heavy_modules_loaded': runs[-1]['heavy_modules_loaded'],
+    }
+
+    problems = []
+    if report['status_code'] != 200:
+        problems.append(f"GET /about returned {report['status_code']}")
+    if report['services_built']:
+        problems.append(f"services built during startup: {', '.join(report['services_built'])}")
+    if report['background_started']:
+        problems.append('background jobs started on import')
+    if args.max_ms is not None and report['timings_ms']['total_ms']['median'] > args.max_ms:
+        problems.append(f"median startup {report['timings_ms']['total_ms']['median']}ms exceeds {args.max_ms}ms")
+    report['problems'] = problems
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print('=' * 60)
+        print(f"COLD START ({report['runs']} runs, min / median / max)")
+        print('=' * 60)
+        for key, stats in report['timings_ms'].items():
+            print(f"{key:<18} {stats['min']:>8.1f} {stats['median']:>8.1f} {stats['max']:>8.1f} ms")
+        print(f"Heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+        for problem in problems:
+            print(f'[X] {problem}')
+        if not problems:
+            print('[OK] Static page served before any remote client was built')
+
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Build fingerprinted, minified and precompressed static bundles
+
+Reads the bundle list (ASSET_BUNDLES) from app.py, concatenates and minifies
+each bundle, writes static/dist/<name>.<hash>.<ext> plus .gz (and .br when the
+Brotli package is installed) variants, and records the names in
+static/dist/manifest.json for the asset_tags() template helper.
+
+With --images it also pre-generates every resized image variant served by
+/api/images for static/images and, when Supabase is configured, for every
+product image_url, so the first visitors don't pay for the resizing.
+
+Usage:
+    python build_assets.py            # build all bundles
+    python build_assets.py --clean    # also delete bundles no longer in the manifest
+    python build_assets.py --images   # bundles plus image derivatives
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+STATIC_DIR = os.path.join(app_module.PROJECT_ROOT, 'static')
+DIST_DIR = app_module.ASSET_DIST_DIR
+
+
+def minify_css(source: str) -> str:
+    """Conservative CSS minifier: comments and insignificant whitespace only"""
+    if rcssmin:
+        return rcssmin.cssmin(source)
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = source.replace(';}', '}')
+    return source.strip()
+
+
+def minify_js(source: str) -> str:
+    """Minify with rjsmin; without it the source is bundled unchanged.
+
+    A line-based fallback can't tell code from template literals or multi-line
+    strings, so it is not worth the risk; gzip/brotli still shrink the bundle.
+    """
+    if rjsmin:
+        return rjsmin.jsmin(source)
+    return source if source.endswith('\n') else source + '\n'
+
+
+def build_bundle(name: str, sources: list) -> dict:
+    parts = []
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), 'r', encoding='utf-8') as f:
+            parts.append(f.read())
+
+    if name.endswith('.css'):
+        content = '\n'.join(minify_css(part) for part in parts)
+    else:
+        # Each file ends its own statements; ';' guards against a missing trailing semicolon
+        content = ';\n'.join(minify_js(part) for part in parts)
+    data = content.encode('utf-8')
+
+    stem, ext = os.path.splitext(name)
+    file_name = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+    path = os.path.join(DIST_DIR, file_name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    # mtime=0 keeps the .gz byte-identical across builds of the same content
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+    original_size = sum(os.path.getsize(os.path.join(STATIC_DIR, source)) for source in sources)
+    return {
+        'file': file_name,
+        'sources': sources,
+        'bytes': len(data),
+        'original_bytes': original_size,
+        'gzip_bytes': os.path.getsize(path + '.gz'),
+        'brotli_bytes': os.path.getsize(path + '.br') if brotli else None,
+    }
+
+
+def image_sources(include_catalog: bool) -> list:
+    """Local images plus product image_url values /api/images is allowed to resize"""
+    images_dir = os.path.join(STATIC_DIR, 'images')
+    sources = [
+        f'/static/images/{name}' for name in sorted(os.listdir(images_dir))
+        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
+    ]
+    if include_catalog and app_module.services.db:
+        cursor = None
+        while True:
+            page = app_module.services.db.get_products_page(limit=200, cursor=cursor)
+            sources.extend(p['image_url'] for p in page['products'] if app_module.image_derivable(p.get('image_url')))
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+    return list(dict.fromkeys(sources))
+
+
+def build_images(include_catalog: bool = True) -> int:
+    if not app_module.PILLOW_AVAILABLE:
+        print('[X] Pillow not installed; skipping image derivatives (pip install Pillow)')
+        return 1
+
+    cache = app_module.image_cache
+    formats = app_module.ImageDerivativeCache.supported_formats()
+    jobs = [(src, width, fmt) for src in image_sources(include_catalog)
+            for width in app_module.IMAGE_WIDTHS for fmt in formats]
+
+    def generate(job):
+        try:
+            cache.get(*job)
+            return None
+        except Exception as e:
+            return f'{job[0]} @{job[1]} {job[2]}: {e}'
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as pool:
+        errors = [error for error in pool.map(generate, jobs) if error]
+
+    stats = cache.get_stats()
+    print(f"Image derivatives: {len(jobs)} variants ({', '.join(formats)}), "
+          f"{stats['generated']} generated, {stats['files']} files / {stats['bytes']} bytes cached")
+    for error in errors[:20]:
+        print(f'[X] {error}')
+    return 1 if errors else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Build static asset bundles')
+    parser.add_argument('--clean', action='store_true', help='remove stale bundles from static/dist')
+    parser.add_argument('--images', action='store_true', help='pre-generate /api/images derivatives')
+    parser.add_argument('--no-catalog', action='store_true', help='with --images, skip product image_url values')
+    args = parser.parse_args()
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {name: build_bundle(name, sources) for name, sources in app_module.ASSET_BUNDLES.items()}
+
+    # Written last and atomically so running workers never see a half-built manifest
+    tmp_path = os.path.join(DIST_DIR, 'manifest.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(DIST_DIR, 'manifest.json'))
+
+    if args.clean:
+        keep = {entry['file'] for entry in manifest.values()}
+        for file_name in os.listdir(DIST_DIR):
+            base = re.sub(r'\.(gz|br)$', '', file_name)
+            if file_name != 'manifest.json' and base not in keep:
+                os.remove(os.path.join(DIST_DIR, file_name))
+
+    print('=' * 60)
+    print('STATIC ASSET BUILD')
+    print('=' * 60)
+    for name, entry in manifest.items():
+        brotli_size = f"{entry['brotli_bytes']:>7} br" if entry['brotli_bytes'] is not None else '   (no brotli)'
+        print(f"{name:<10} -> {entry['file']:<28} {entry['original_bytes']:>7} -> {entry['bytes']:>7} "
+              f"({entry['gzip_bytes']:>6} gz, {brotli_size})")
+    if not brotli:
+        print('[WARN] Brotli not installed; only gzip variants were written (pip install Brotli)')
+    if not rjsmin:
+        print('[WARN] rjsmin not installed; JS bundles are concatenated, not minified (pip install rjsmin)')
+
+    if args.images:
+        return build_images(include_catalog=not args.no_catalog)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+# test_app.py and test_supabase.py are manual scripts (a hello-world server and a
+# live Supabase check), not test modules
+collect_ignore = ['test_app.py', 'test_supabase.py']
@@ -0,0 +1,13 @@
+"""
+Gunicorn hooks for app:app (picked up automatically from the working directory)
+
+Importing app.py never starts background work, so each worker starts its own
+queue workers, and joins scheduler leader election, once it has loaded the app.
+"""
+import os
+
+
+def post_worker_init(worker):
+    import app as app_module
+    if app_module.start_background_thread():
+        worker.log.info(f'Background jobs starting in worker {os.getpid()}')
@@ -21,14 +21,20 @@ CREATE TABLE IF NOT EXISTS products (
     made_in VARCHAR(100),
     qikink_product_id VARCHAR(100),
     image_url VARCHAR(500),
+    content_hash VARCHAR(64),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Hash of the last synced Qikink content, lets the bulk sync skip unchanged rows
+ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
 -- Index for faster queries
 CREATE INDEX IF NOT EXISTS idx_products_sku ON products(sku);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
 CREATE INDEX IF NOT EXISTS idx_products_qikink_id ON products(qikink_product_id);
+-- Search index refresh pulls rows changed since its watermark, keyset on (updated_at, sku)
+CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products(updated_at, sku);
 
 -- =====================================================
 -- VARIANTS TABLE
@@ -40,13 +46,20 @@ CREATE TABLE IF NOT EXISTS variants (
     color VARCHAR(50),
     stock INT DEFAULT 0,
     qikink_variant_id VARCHAR(100),
+    sku VARCHAR(50),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Parent SKU copied onto each variant so stock lookups by SKU need no join
+ALTER TABLE variants ADD COLUMN IF NOT EXISTS sku VARCHAR(50);
+
 -- Index for faster queries
 CREATE INDEX IF NOT EXISTS idx_variants_product_id ON variants(product_id);
-CREATE INDEX IF NOT EXISTS idx_variants_qikink_id ON variants(qikink_variant_id);
+CREATE INDEX IF NOT EXISTS idx_variants_sku ON variants(sku);
+-- Bulk variant sync upserts on qikink_variant_id
+DROP INDEX IF EXISTS idx_variants_qikink_id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_variants_qikink_variant_id ON variants(qikink_variant_id);
 
 -- =====================================================
 -- ORDERS TABLE
@@ -68,11 +81,15 @@ CREATE TABLE IF NOT EXISTS orders (
     qikink_shipment_id VARCHAR(100),
     razorpay_order_id VARCHAR(100),
     tracking_number VARCHAR(100),
+    fulfillment_status VARCHAR(50),
     notes TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Progress of the background Qikink submission (queued, processing, retrying, submitted, failed)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS fulfillment_status VARCHAR(50);
+
 -- Indexes for faster queries
 CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
 CREATE INDEX IF NOT EXISTS idx_orders_customer_email ON orders(customer_email);
@@ -127,6 +144,8 @@ CREATE TABLE IF NOT EXISTS tracking_logs (
 CREATE INDEX IF NOT EXISTS idx_tracking_logs_order_id ON tracking_logs(order_id);
 CREATE INDEX IF NOT EXISTS idx_tracking_logs_qikink_order_id ON tracking_logs(qikink_order_id);
 CREATE INDEX IF NOT EXISTS idx_tracking_logs_event_timestamp ON tracking_logs(event_timestamp DESC);
+-- One row per tracking event; the poller inserts with ON CONFLICT DO NOTHING on this key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tracking_logs_event ON tracking_logs(qikink_order_id, event_timestamp, status);
 
 -- =====================================================
 -- ADMIN USERS TABLE
@@ -180,15 +199,20 @@ CREATE TABLE IF NOT EXISTS failed_jobs (
     retry_count INT DEFAULT 0,
     max_retries INT DEFAULT 3,
     status VARCHAR(50) DEFAULT 'pending',
-    next_retry_at TIMESTAMP WITH TIME ZONE,
+    next_retry_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+ALTER TABLE failed_jobs ALTER COLUMN next_retry_at SET DEFAULT NOW();
+
 -- Indexes for faster queries
 CREATE INDEX IF NOT EXISTS idx_failed_jobs_status ON failed_jobs(status);
 CREATE INDEX IF NOT EXISTS idx_failed_jobs_next_retry ON failed_jobs(next_retry_at);
 CREATE INDEX IF NOT EXISTS idx_failed_jobs_order_id ON failed_jobs(order_id);
+-- Due-job lookup used by claim_failed_jobs()
+CREATE INDEX IF NOT EXISTS idx_failed_jobs_due ON failed_jobs(job_type, next_retry_at)
+    WHERE status IN ('pending', 'processing');
 
 -- =====================================================
 -- WEBHOOK LOGS TABLE
@@ -197,6 +221,7 @@ CREATE TABLE IF NOT EXISTS webhook_logs (
     id BIGSERIAL PRIMARY KEY,
     webhook_type VARCHAR(50) NOT NULL,
     payload JSONB NOT NULL,
+    event_id VARCHAR(100),
     signature TEXT,
     status VARCHAR(50) DEFAULT 'received',
     processed_at TIMESTAMP WITH TIME ZONE,
@@ -209,6 +234,10 @@ CREATE INDEX IF NOT EXISTS idx_webhook_logs_webhook_type ON webhook_logs(webhook
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_status ON webhook_logs(status);
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_created_at ON webhook_logs(created_at DESC);
 
+-- Provider event id (X-Razorpay-Event-Id) of each processed webhook
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS event_id VARCHAR(100);
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_event_id ON webhook_logs(event_id);
+
 -- =====================================================
 -- FUNCTIONS & TRIGGERS
 -- =====================================================
@@ -316,6 +345,53 @@ FROM orders
 GROUP BY DATE(created_at)
 ORDER BY order_date DESC;
 
+-- Dashboard statistics in one round trip: overall totals plus the recent daily summary
+-- (the daily part filters on created_at directly so it can use idx_orders_created_at)
+CREATE OR REPLACE FUNCTION get_dashboard_stats(p_days INT DEFAULT 30)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'totals', (SELECT row_to_json(s) FROM order_statistics s),
+        'daily', COALESCE((
+            SELECT json_agg(d ORDER BY d.order_date DESC)
+            FROM (
+                SELECT
+                    DATE(created_at) as order_date,
+                    COUNT(*) as order_count,
+                    SUM(total_amount) as daily_revenue,
+                    AVG(total_amount) as avg_order_value
+                FROM orders
+                WHERE created_at >= CURRENT_DATE - p_days
+                GROUP BY DATE(created_at)
+            ) d
+        ), '[]'::json)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Rows logged before next_retry_at existed are due immediately
+UPDATE failed_jobs SET next_retry_at = created_at WHERE next_retry_at IS NULL;
+
+-- Claim due failed jobs for retry. SKIP LOCKED lets several workers claim
+-- concurrently without overlap; the claim pushes next_retry_at out by the lease,
+-- so rows left 'processing' by a crashed worker become due again.
+CREATE OR REPLACE FUNCTION claim_failed_jobs(p_job_type VARCHAR, p_limit INT DEFAULT 20, p_lease_seconds INT DEFAULT 300)
+RETURNS SETOF failed_jobs AS $$
+    UPDATE failed_jobs f
+    SET status = 'processing',
+        next_retry_at = NOW() + make_interval(secs => p_lease_seconds),
+        updated_at = NOW()
+    WHERE f.id IN (
+        SELECT id FROM failed_jobs
+        WHERE job_type = p_job_type
+          AND status IN ('pending', 'processing')
+          AND next_retry_at <= NOW()
+          AND retry_count < max_retries
+        ORDER BY next_retry_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING f.*;
+$$ LANGUAGE sql;
+
 -- Failed jobs summary view
 CREATE OR REPLACE VIEW failed_jobs_summary AS
 SELECT 
@@ -320,13 +320,18 @@ function selectColor(element, productId) {
 // PRODUCT FETCHING FROM BACKEND
 // =====================================================
 
-async function fetchProducts(category = null, collection = null) {
+async function fetchProducts(category = null, collection = null, options = {}) {
   try {
     let url = `${API_BASE_URL}/products`;
     const params = new URLSearchParams();
 
     if (category) params.append('category', category);
     if (collection) params.append('collection', collection);
+    if (options.minPrice != null) params.append('min_price', options.minPrice);
+    if (options.maxPrice != null) params.append('max_price', options.maxPrice);
+    if (options.sort) params.append('sort', options.sort);
+    if (options.limit) params.append('limit', options.limit);
+    if (options.cursor) params.append('cursor', options.cursor);
 
     if (params.toString()) {
       url += '?' + params.toString();
@@ -336,7 +341,11 @@ async function fetchProducts(category = null, collection = null) {
     if (response.ok) {
       const data = await response.json();
       console.log('✓ Products loaded from backend:', data.count);
-      return data.data;
+      // Pass the next_cursor back as options.cursor to load the following page
+      if (options.withCursor) {
+        return { products: data.products, nextCursor: data.next_cursor };
+      }
+      return data.products;
     }
   } catch (error) {
     console.log('Backend unavailable, using frontend products');
@@ -687,23 +696,39 @@ document.head.appendChild(style);
 // DYNAMIC PRODUCT LOADING
 // =====================================================
 
-async function loadDynamicProducts() {
-  // Load products from backend on shop page
-  if (document.querySelector('.products-grid')) {
-    const products = await fetchProducts();
+// Cursor of the next /api/products page; null once the whole catalog is shown
+let shopNextCursor = null;
 
-    if (products && products.length > 0) {
-      populateProductsGrid(products);
-      console.log('✓ Products dynamically loaded');
-    }
+async function loadDynamicProducts(append = false) {
+  // Load products from backend on shop page, one page per call
+  if (!document.querySelector('.products-grid')) return;
+
+  const page = await fetchProducts(null, null, {
+    withCursor: true,
+    cursor: append ? shopNextCursor : null
+  });
+
+  if (page && page.products && page.products.length > 0) {
+    populateProductsGrid(page.products, append);
+    shopNextCursor = page.nextCursor || null;
+    console.log('✓ Products dynamically loaded');
+  } else if (append) {
+    shopNextCursor = null;
+  }
+
+  const loadMore = document.getElementById('loadMoreProducts');
+  if (loadMore) {
+    loadMore.style.display = shopNextCursor ? 'flex' : 'none';
   }
 }
 
-function populateProductsGrid(products) {
+function populateProductsGrid(products, append = false) {
   const grid = document.querySelector('.products-grid');
   if (!grid) return;
 
-  grid.innerHTML = '';
+  if (!append) {
+    grid.innerHTML = '';
+  }
 
   products.forEach(product => {
     const productCard = document.createElement('div');
@@ -714,7 +739,7 @@ function populateProductsGrid(products) {
 
     productCard.innerHTML = `
       <div class="product-image">
-        <img src="${product.image_url}" alt="${product.name}" onerror="this.textContent='👕'">
+        <img src="${product.image_url}" ${product.image_srcset ? `srcset="${product.image_srcset}" sizes="(max-width: 600px) 50vw, 300px"` : ''} loading="lazy" alt="${product.name}" onerror="this.textContent='👕'">
         ${product.stock <= 5 ? '<span class="badge">LOW STOCK</span>' : '<span class="badge">IN STOCK</span>'}
       </div>
       <div class="product-info">
@@ -733,18 +758,15 @@ function populateProductsGrid(products) {
     grid.appendChild(productCard);
   });
 
-  // Update product count
-  const countSpan = document.querySelector('#product-count');
-  if (countSpan) {
-    countSpan.textContent = products.length;
-  }
+  // Newly appended cards follow the filters already ticked; this also updates the product count
+  applyFilters();
 }
 
 // Initialize lazy loading
 initializeLazyLoading();
 
 // Load dynamic products if on shop page
-document.addEventListener('DOMContentLoaded', loadDynamicProducts);
+document.addEventListener('DOMContentLoaded', () => loadDynamicProducts());
 
 // =====================================================
 // ACCOUNT BUTTON / DROPDOWN (global)
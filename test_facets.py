@@ -0,0 +1,89 @@
+"""Facet bitset counts behind /api/products/facets"""
+import pytest
+
+from app import FacetIndex
+
+PRODUCTS = [
+    {'id': 1, 'sku': 'P1', 'category': 'Mens', 'collection': 'summer', 'price': 899},
+    {'id': 2, 'sku': 'P2', 'category': 'womens', 'collection': 'summer', 'price': 1499},
+    # No variants and no stock field: print-on-demand, counts as in stock
+    {'id': 3, 'sku': 'P3', 'category': 'mens', 'collection': 'festive', 'price': 2499},
+    # Inline sizes and stock, as in the sample catalog
+    {'id': 4, 'sku': 'P4', 'category': 'womens', 'price': '1999', 'sizes': ['s'], 'stock': 0},
+]
+VARIANTS = [
+    {'product_id': 1, 'size': 'M', 'color': 'Red', 'stock': 5},
+    {'product_id': 1, 'size': 'L', 'color': 'blue', 'stock': 0},
+    {'product_id': 2, 'size': 'm', 'color': 'Blue', 'stock': None},
+    {'product_id': 99, 'size': 'XL', 'color': 'green', 'stock': 3},
+]
+
+
+@pytest.fixture
+def facets():
+    return FacetIndex(PRODUCTS, VARIANTS)
+
+
+@pytest.mark.parametrize('price, bucket', [
+    (999.99, 'under-999'),
+    (1000, '1000-1999'),
+    ('1999', '1000-1999'),
+    (2000, '2000-above'),
+    (None, None),
+    ('free', None),
+])
+def test_price_bucket(price, bucket):
+    assert FacetIndex.price_bucket(price) == bucket
+
+
+def test_unfiltered_counts(facets):
+    result = facets.counts({})
+    assert result['total'] == 4
+    assert result['facets'] == {
+        'category': {'mens': 2, 'womens': 2},
+        'collection': {'festive': 1, 'summer': 2},
+        'price': {'1000-1999': 2, '2000-above': 1, 'under-999': 1},
+        'size': {'L': 1, 'M': 2, 'S': 1},
+        'color': {'blue': 2, 'red': 1},
+        'availability': {'in_stock': 2, 'out_of_stock': 2},
+    }
+
+
+def test_values_within_a_facet_are_ored(facets):
+    assert facets.counts({'price': ['under-999', '2000-above']})['total'] == 2
+
+
+def test_facets_are_anded_and_exclude_their_own_selection(facets):
+    result = facets.counts({'category': ['MENS'], 'size': ['m']})
+    assert result['filters'] == {'category': ['mens'], 'size': ['M']}
+    assert result['total'] == 1
+    # Category counts apply only the size filter, and vice versa
+    assert result['facets']['category'] == {'mens': 1, 'womens': 1}
+    assert result['facets']['size'] == {'L': 1, 'M': 1, 'S': 0}
+
+
+def test_in_stock_size_needs_a_stocked_variant(facets):
+    assert facets.counts({'size': ['L']})['total'] == 1
+    assert facets.counts({'size': ['L'], 'availability': ['in_stock']})['total'] == 0
+    assert facets.counts({'size': ['M'], 'availability': ['in_stock']})['total'] == 1
+
+
+def test_availability_counts_ignore_availability_selection(facets):
+    result = facets.counts({'size': ['L'], 'availability': ['in_stock']})
+    assert result['facets']['availability'] == {'in_stock': 1, 'out_of_stock': 0}
+    # Size counts are restricted to stocked variants once in_stock is ticked
+    assert result['facets']['size'] == {'M': 1}
+
+
+def test_unknown_facets_and_blank_values_are_dropped(facets):
+    result = facets.counts({'brand': ['acme'], 'color': ['', ' ']})
+    assert result['filters'] == {}
+    assert result['total'] == 4
+
+
+def test_unknown_value_matches_nothing(facets):
+    assert facets.counts({'color': ['purple']})['total'] == 0
+
+
+def test_variants_of_unknown_products_are_ignored(facets):
+    assert 'XL' not in facets.counts({})['facets']['size']
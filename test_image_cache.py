@@ -0,0 +1,59 @@
+"""Image derivative cache cleanup and eviction races"""
+import io
+import os
+
+import pytest
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image
+
+import app as app_module
+from app import ImageDerivativeCache
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 200), (200, 80, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def files_under(directory):
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+def test_failed_save_removes_the_temp_file(tmp_path, monkeypatch):
+    cache = ImageDerivativeCache(str(tmp_path))
+    data = png_bytes()
+
+    def failing_save(image, fp, *args, **kwargs):
+        with open(fp, 'wb') as f:
+            f.write(b'partial')
+        raise OSError('No space left on device')
+    monkeypatch.setattr(Image.Image, 'save', failing_save)
+
+    with pytest.raises(OSError):
+        cache._generate(data, 160, 'JPEG', str(tmp_path / 'ab' / 'abc.jpg'))
+    assert files_under(tmp_path) == []
+
+
+def test_derivative_evicted_before_send_is_generated_again(tmp_path, monkeypatch):
+    cache = ImageDerivativeCache(str(tmp_path))
+    monkeypatch.setattr(cache, 'resolve_source', lambda src: ('v1', png_bytes))
+    monkeypatch.setattr(app_module, 'image_cache', cache)
+    real_get = cache.get
+    calls = []
+
+    def get_then_evict(src, width, fmt):
+        derivative = real_get(src, width, fmt)
+        calls.append(derivative['path'])
+        if len(calls) == 1:
+            os.remove(derivative['path'])  # another worker's evict() wins the race
+        return derivative
+    monkeypatch.setattr(cache, 'get', get_then_evict)
+
+    response = app_module.app.test_client().get('/api/images?src=/static/images/x.png&w=160&fmt=jpeg')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert len(calls) == 2 and os.path.isfile(calls[1])
+    assert cache.stats['generated'] == 2
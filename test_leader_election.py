@@ -0,0 +1,57 @@
+"""Scheduler leader election stepping down when the leader can't start"""
+import os
+
+import pytest
+
+import app as app_module
+from app import FileLock, LeaderElection
+
+
+@pytest.fixture
+def lock_path(tmp_path):
+    return str(tmp_path / 'scheduler.lock')
+
+
+def elect(lock_path, result):
+    """Election whose loop runs a single tick: on_elected stops it and returns or raises result"""
+    def on_elected():
+        election._stopping.set()
+        if isinstance(result, Exception):
+            raise result
+        return result
+    election = LeaderElection(lock_path, on_elected, retry_seconds=1)
+    return election
+
+
+@pytest.mark.parametrize('result', [RuntimeError('scheduler down'), None])
+def test_failed_start_releases_leadership(lock_path, result):
+    election = elect(lock_path, result)
+    election._run()
+
+    assert election.is_leader is False
+    assert not os.path.exists(election.status_path)
+    other = FileLock(lock_path)
+    assert other.acquire(blocking=False)
+    other.release()
+
+
+def test_successful_start_keeps_the_lock(lock_path):
+    election = elect(lock_path, object())
+    election._run()
+
+    assert election.is_leader is True
+    assert election.get_status()['leader']['pid'] == os.getpid()
+    assert not FileLock(lock_path).acquire(blocking=False)
+    election.stop()
+    assert election.is_leader is False
+
+
+def test_registry_does_not_remember_a_failed_scheduler(monkeypatch):
+    registry = app_module.ServiceRegistry()
+    builds = iter([None, 'scheduler'])
+    monkeypatch.setattr(registry, '_build_scheduler', lambda: next(builds))
+
+    assert registry._start_scheduler() is None
+    assert 'scheduler' not in registry._instances
+    assert registry._start_scheduler() == 'scheduler'
+    assert registry.scheduler == 'scheduler'
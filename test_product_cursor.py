@@ -0,0 +1,123 @@
+"""Keyset cursor encoding and paging for /api/products and /api/admin/orders"""
+import pytest
+
+import app as app_module
+from app import DatabaseService
+
+
+class RecordingQuery:
+    """Stands in for a PostgREST query builder; records filters and returns canned rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return record
+
+    def execute(self):
+        limit = next(args[0] for name, args in self.calls if name == 'limit')
+        return type('Result', (), {'data': self.rows[:limit]})()
+
+
+class RecordingClient:
+    def __init__(self, rows):
+        self.query = RecordingQuery(rows)
+
+    def table(self, name):
+        return self.query
+
+
+def test_cursor_round_trip_is_unpadded():
+    cursor = DatabaseService.encode_cursor([1299, 'BHRT-001-M'])
+    assert '=' not in cursor
+    assert DatabaseService.decode_cursor(cursor) == [1299, 'BHRT-001-M']
+
+
+@pytest.mark.parametrize('cursor', ['!!!', DatabaseService.encode_cursor([]), 'e30'])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        DatabaseService.decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('sort, values', [
+    ('sku', ['A']),
+    ('newest', [42]),
+    ('price_asc', [999, 'A']),
+    ('price_desc', [999, 'A']),
+])
+def test_product_cursor_matches_sort_shape(sort, values):
+    cursor = DatabaseService.encode_cursor(values)
+    assert DatabaseService.decode_product_cursor(cursor, sort) == values
+
+
+@pytest.mark.parametrize('sort, values', [
+    ('sku', [999, 'A']),
+    ('newest', [42, 'A']),
+    ('price_asc', ['A']),
+])
+def test_product_cursor_from_another_sort_is_rejected(sort, values):
+    with pytest.raises(ValueError):
+        DatabaseService.decode_product_cursor(DatabaseService.encode_cursor(values), sort)
+
+
+def test_page_fetches_one_extra_row_and_encodes_next_cursor():
+    rows = [{'id': i, 'sku': f'S{i}', 'price': 100 * i} for i in range(1, 5)]
+    db = DatabaseService(RecordingClient(rows))
+
+    page = db.get_products_page(sort='price_asc', limit=3)
+
+    assert [p['sku'] for p in page['products']] == ['S1', 'S2', 'S3']
+    assert page['has_more'] is True
+    assert DatabaseService.decode_cursor(page['next_cursor']) == [300, 'S3']
+    assert ('limit', (4,)) in db.db.query.calls
+
+
+def test_last_page_has_no_cursor():
+    db = DatabaseService(RecordingClient([{'id': 1, 'sku': 'S1', 'price': 100}]))
+    page = db.get_products_page(limit=3)
+    assert page == {'products': [{'id': 1, 'sku': 'S1', 'price': 100}], 'next_cursor': None, 'has_more': False}
+
+
+def test_price_cursor_breaks_ties_on_sku():
+    db = DatabaseService(RecordingClient([]))
+    db.get_products_page(sort='price_desc', cursor=DatabaseService.encode_cursor([1299, 'B"1']))
+    or_filters = [args[0] for name, args in db.db.query.calls if name == 'or_']
+    assert or_filters == ['price.lt."1299",and(price.eq."1299",sku.gt."B\\"1")']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Cursor validation must answer before any database access
+    monkeypatch.setitem(app_module.services._instances, 'db', None)
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize('query', [
+    'sort=price_asc&cursor=' + DatabaseService.encode_cursor(['A']),
+    'sort=sku&cursor=not-a-cursor',
+    'sort=popular',
+    'min_price=cheap',
+])
+def test_products_route_rejects_bad_paging_parameters(client, query):
+    response = client.get(f'/api/products?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+@pytest.mark.parametrize('values', [['2026-01-01T00:00:00', None], ['2026-01-01T00:00:00', [1]],
+                                    ['2026-01-01T00:00:00', True], [None, 5], ['2026-01-01T00:00:00']])
+def test_orders_cursor_with_wrong_value_types_is_rejected(values):
+    db = DatabaseService(RecordingClient([]))
+    with pytest.raises(ValueError):
+        db.get_orders_page(cursor=DatabaseService.encode_cursor(values))
+
+
+def test_orders_cursor_filters_on_created_at_then_id():
+    db = DatabaseService(RecordingClient([]))
+    db.get_orders_page(cursor=DatabaseService.encode_cursor(['2026-01-01T00:00:00', 7]))
+    or_filters = [args[0] for name, args in db.db.query.calls if name == 'or_']
+    assert or_filters == ['created_at.lt."2026-01-01T00:00:00",and(created_at.eq."2026-01-01T00:00:00",id.lt.7)']
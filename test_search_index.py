@@ -0,0 +1,133 @@
+"""Transliteration, phonetic keys and ranking of ProductSearchIndex"""
+import pytest
+
+import app as app_module
+from app import ProductSearchIndex, phonetic_key, search_tokens, transliterate_devanagari
+
+CATALOG = [
+    {'sku': 'K1', 'name': 'Cotton Kurta', 'category': 'mens', 'description': 'Block print'},
+    {'sku': 'S1', 'name': 'Banarasi Saree', 'category': 'womens', 'description': 'Pairs well with a kurta'},
+    {'sku': 'L1', 'name': 'Lehenga Choli', 'category': 'womens', 'description': 'Festive'},
+]
+
+
+@pytest.fixture
+def index():
+    index = ProductSearchIndex()
+    index.apply(CATALOG)
+    return index
+
+
+def ranked(result):
+    return [(p['sku'], p['score']) for p in result['products']]
+
+
+@pytest.mark.parametrize('devanagari, roman', [
+    ('भारत', 'bhaarat'),
+    ('सलवार', 'salvaar'),
+    ('कुर्ता', 'kurtaa'),
+    ('साड़ी', 'saaree'),
+    ('लहंगा', 'lahangaa'),
+])
+def test_transliterate_devanagari(devanagari, roman):
+    assert transliterate_devanagari(devanagari) == roman
+
+
+@pytest.mark.parametrize('spellings', [
+    ('kurta', 'kurtaa', 'कुर्ता'),
+    ('saree', 'sari'),
+    ('salwar', 'shalwar'),
+    ('lehenga', 'lahanga'),
+])
+def test_spelling_variants_share_a_phonetic_key(spellings):
+    keys = {phonetic_key(search_tokens(word)[-1]) for word in spellings}
+    assert len(keys) == 1 and None not in keys
+
+
+@pytest.mark.parametrize('token', ['ab', '123'])
+def test_short_or_numeric_tokens_have_no_phonetic_key(token):
+    assert phonetic_key(token) is None
+
+
+def test_search_tokens_fold_accents_and_drop_stopwords():
+    assert search_tokens('The Café of Kurta') == ['cafe', 'kurta']
+    assert search_tokens('कुर्ता') == ['कुर्ता', 'kurtaa']
+    assert search_tokens(None) == []
+
+
+def test_exact_match_ranks_by_field_weight(index):
+    result = index.search('kurta')
+    assert result['total'] == 2
+    assert ranked(result) == [('K1', 5.0), ('S1', 1.0)]
+
+
+@pytest.mark.parametrize('query', ['kurtaa', 'कुर्ता'])
+def test_phonetic_match_scores_below_exact(index, query):
+    assert ranked(index.search(query)) == [('K1', 3.5), ('S1', 0.7)]
+
+
+def test_phonetic_match_across_romanizations(index):
+    assert ranked(index.search('sari')) == [('S1', 3.5)]
+    assert ranked(index.search('lahanga')) == [('L1', 3.5)]
+
+
+def test_last_word_matches_as_prefix(index):
+    assert ranked(index.search('kur')) == [('K1', 2.5), ('S1', 0.5)]
+    assert index.search('kur', prefix=False)['total'] == 0
+
+
+def test_every_query_word_must_match(index):
+    assert ranked(index.search('womens festive')) == [('L1', 4.0)]
+    assert index.search('cotton saree') == {'total': 0, 'products': []}
+
+
+def test_paging_keeps_total(index):
+    page = index.search('kurta', limit=1, offset=1)
+    assert page['total'] == 2
+    assert ranked(page) == [('S1', 1.0)]
+
+
+def test_apply_reindexes_changed_products(index):
+    index.apply([{'sku': 'K1', 'name': 'Linen Shirt', 'category': 'mens'}])
+    assert ranked(index.search('kurta')) == [('S1', 1.0)]
+    assert [p['sku'] for p in index.search('linen')['products']] == ['K1']
+
+
+def test_autocomplete(index):
+    result = index.autocomplete('ku')
+    assert result['suggestions'] == ['kurta']
+    assert [p['sku'] for p in result['products']] == ['K1', 'S1']
+
+
+def test_blank_query_matches_nothing(index):
+    assert index.search('  ') == {'total': 0, 'products': []}
+
+
+class ChangedSince:
+    def __init__(self, rows):
+        self.rows = rows
+        self.since = []
+
+    def iter_products(self):
+        return list(self.rows)
+
+    def iter_products_updated_since(self, updated_at):
+        self.since.append(updated_at)
+        return [row for row in self.rows if row['updated_at'] > updated_at]
+
+
+def test_refresh_rereads_rows_committed_behind_the_watermark(monkeypatch):
+    monkeypatch.setattr(app_module, 'SEARCH_INDEX_REFRESH_SECONDS', 0)
+    monkeypatch.setattr(app_module, 'SEARCH_INDEX_OVERLAP_SECONDS', 300)
+    db = ChangedSince([{'sku': 'K1', 'name': 'Cotton Kurta', 'updated_at': '2026-01-01T10:05:00'}])
+    index = ProductSearchIndex()
+    index.refresh(db)
+    assert index.watermark == '2026-01-01T10:05:00'
+
+    # A sync that started earlier commits after the first refresh
+    db.rows.append({'sku': 'S1', 'name': 'Banarasi Saree', 'updated_at': '2026-01-01T10:04:00'})
+    index.refresh(db)
+
+    assert db.since == ['2026-01-01T10:00:00']
+    assert index.search('saree')['total'] == 1
+    assert index.watermark == '2026-01-01T10:05:00'
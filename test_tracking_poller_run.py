@@ -0,0 +1,73 @@
+"""POST /api/admin/tracking-poller/run only polls in the scheduler leader"""
+import pytest
+
+import app as app_module
+
+class FakePoller:
+    running = False
+
+    def run(self, full=False):
+        raise AssertionError('must not poll inside the request')
+
+
+class FakeLeader:
+    def __init__(self, is_leader):
+        self.is_leader = is_leader
+
+    def get_status(self):
+        return {'is_leader': self.is_leader, 'leader': {'pid': 4242}}
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = []
+
+    def add_job(self, **kwargs):
+        self.jobs.append(kwargs)
+
+
+@pytest.fixture
+def post(monkeypatch):
+    poller = FakePoller()
+    monkeypatch.setitem(app_module.services._instances, 'tracking_poller', poller)
+    monkeypatch.setattr(app_module, '_authenticate_request', lambda: ({'role': 'admin'}, None))
+    client = app_module.app.test_client()
+
+    def post(leader, scheduler=None, query=''):
+        monkeypatch.setattr(app_module.services, 'scheduler_leader', leader)
+        if scheduler:
+            monkeypatch.setitem(app_module.services._instances, 'scheduler', scheduler)
+        else:
+            monkeypatch.delitem(app_module.services._instances, 'scheduler', raising=False)
+        return client.post(f'/api/admin/tracking-poller/run{query}')
+    post.poller = poller
+    return post
+
+
+def test_follower_refuses_and_names_the_leader(post):
+    response = post(FakeLeader(is_leader=False))
+    assert response.status_code == 409
+    assert response.get_json()['leader_pid'] == 4242
+
+
+def test_without_leader_election_the_poll_is_unavailable(post):
+    assert post(None).status_code == 503
+
+
+def test_leader_schedules_the_poll_and_returns_at_once(post):
+    scheduler = FakeScheduler()
+    response = post(FakeLeader(is_leader=True), scheduler, '?full=true')
+
+    assert response.status_code == 202
+    assert response.get_json()['full'] is True
+    [job] = scheduler.jobs
+    assert job['func'] == post.poller.run
+    assert job['kwargs'] == {'full': True}
+    assert 'trigger' not in job
+
+
+def test_leader_refuses_while_a_poll_is_running(post):
+    post.poller.running = True
+    scheduler = FakeScheduler()
+    assert post(FakeLeader(is_leader=True), scheduler).status_code == 409
+    assert scheduler.jobs == []
@@ -0,0 +1,136 @@
+"""Adaptive poll intervals and heap bookkeeping of TrackingSchedule"""
+import pytest
+
+import app as app_module
+from app import TrackingSchedule
+
+HOUR = 3600
+DAY = 24 * HOUR
+NOW = 1_000 * DAY
+
+
+@pytest.fixture(autouse=True)
+def fixed_settings(monkeypatch):
+    monkeypatch.setattr(app_module, 'TRACKING_MIN_INTERVAL_MINUTES', 30)
+    monkeypatch.setattr(app_module, 'TRACKING_MAX_INTERVAL_HOURS', 24)
+    monkeypatch.setattr(app_module, 'TRACKING_DELIVERY_WINDOW_HOURS', 24)
+    # No jitter, so intervals are exact
+    monkeypatch.setattr(app_module.random, 'uniform', lambda low, high: 1.0)
+
+
+def entry(status='shipped', unchanged_for=0.0, expected_delivery_at=None):
+    return {'status': status, 'last_change_at': NOW - unchanged_for, 'expected_delivery_at': expected_delivery_at}
+
+
+def base(status):
+    return TrackingSchedule.STATUS_INTERVAL_HOURS[status] * HOUR
+
+
+def test_interval_starts_at_status_base():
+    schedule = TrackingSchedule()
+    assert schedule.interval_seconds(entry('shipped'), NOW) == base('shipped')
+    assert schedule.interval_seconds(entry('qikink_submitted'), NOW) == base('qikink_submitted')
+
+
+def test_interval_doubles_per_unchanged_day_up_to_max():
+    schedule = TrackingSchedule()
+    assert schedule.interval_seconds(entry(unchanged_for=DAY - 1), NOW) == base('shipped')
+    assert schedule.interval_seconds(entry(unchanged_for=DAY), NOW) == min(2 * base('shipped'), DAY)
+    assert schedule.interval_seconds(entry(unchanged_for=30 * DAY), NOW) == DAY
+
+
+def test_interval_never_drops_below_min(monkeypatch):
+    monkeypatch.setitem(TrackingSchedule.STATUS_INTERVAL_HOURS, 'shipped', 0.1)
+    assert TrackingSchedule().interval_seconds(entry(), NOW) == 30 * 60
+
+
+@pytest.mark.parametrize('expected_in', [-2 * HOUR, 0, 23 * HOUR])
+def test_delivery_window_polls_at_min(expected_in):
+    stale = entry(unchanged_for=10 * DAY, expected_delivery_at=NOW + expected_in)
+    assert TrackingSchedule().interval_seconds(stale, NOW) == 30 * 60
+
+
+def test_delivery_outside_window_keeps_backoff():
+    later = entry(unchanged_for=10 * DAY, expected_delivery_at=NOW + 3 * DAY)
+    assert TrackingSchedule().interval_seconds(later, NOW) == DAY
+
+
+def test_jitter_stays_within_ten_percent(monkeypatch):
+    monkeypatch.undo()
+    schedule = TrackingSchedule()
+    interval = base('shipped')
+    for _ in range(50):
+        assert 0.9 * interval <= schedule.interval_seconds(entry(), NOW) <= 1.1 * interval
+
+
+def order(order_id, status='shipped', updated_at=None):
+    return {'order_id': order_id, 'status': status, 'updated_at': updated_at}
+
+
+def test_sync_schedules_from_last_update():
+    schedule = TrackingSchedule()
+    schedule.sync([order('A', updated_at='1972-01-01T00:00:00')], NOW)
+    # Updated long ago: already due, with the fully backed-off interval
+    assert [o['order_id'] for o in schedule.pop_due(NOW)] == ['A']
+    assert schedule.pop_due(NOW + 10 * DAY) == []
+
+
+def test_pop_due_returns_earliest_first_and_respects_limit():
+    schedule = TrackingSchedule()
+    schedule.sync([order('late', 'qikink_submitted'), order('early', 'shipped')], NOW)
+    assert schedule.pop_due(NOW + base('shipped') - 1) == []
+    due = schedule.pop_due(NOW + DAY, limit=1)
+    assert [o['order_id'] for o in due] == ['early']
+    assert [o['order_id'] for o in schedule.pop_due(NOW + DAY)] == ['late']
+
+
+def test_status_change_supersedes_old_heap_entry():
+    schedule = TrackingSchedule()
+    schedule.sync([order('A', 'qikink_submitted')], NOW)
+    schedule.sync([order('A', 'shipped')], NOW + HOUR)
+    assert schedule.get_stats()['heap_entries'] == 2
+    assert [o['status'] for o in schedule.pop_due(NOW + HOUR + base('shipped'))] == ['shipped']
+    # The stale qikink_submitted entry is skipped, not returned twice
+    assert schedule.pop_due(NOW + 10 * DAY) == []
+
+
+def test_sync_forgets_orders_that_left_active_statuses():
+    schedule = TrackingSchedule()
+    schedule.sync([order('A'), order('B')], NOW)
+    schedule.sync([order('B')], NOW)
+    assert [o['order_id'] for o in schedule.pop_due(NOW + DAY)] == ['B']
+
+
+def test_failed_poll_retries_at_min_interval():
+    schedule = TrackingSchedule()
+    schedule.sync([order('A')], NOW)
+    schedule.pop_due(NOW + DAY)
+    schedule.record('A', NOW + DAY, ok=False)
+    assert schedule.pop_due(NOW + DAY + 30 * 60 - 1) == []
+    assert len(schedule.pop_due(NOW + DAY + 30 * 60)) == 1
+
+
+def test_successful_poll_with_new_status_resets_backoff():
+    schedule = TrackingSchedule()
+    schedule.sync([order('A', 'qikink_submitted', updated_at='1972-01-01T00:00:00')], NOW)
+    schedule.pop_due(NOW)
+    schedule.record('A', NOW, ok=True, status='in_transit')
+    assert schedule.get_stats()['by_status'] == {'in_transit': 1}
+    assert schedule.pop_due(NOW + base('in_transit') - 1) == []
+    assert len(schedule.pop_due(NOW + base('in_transit'))) == 1
+
+
+def test_record_ignores_untracked_orders():
+    schedule = TrackingSchedule()
+    schedule.record('missing', NOW, ok=True, status='shipped')
+    assert schedule.get_stats()['tracked'] == 0
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1970-01-02T00:00:00', 86400.0),
+    ('1970-01-02T05:30:00+05:30', 86400.0),
+    ('yesterday', None),
+    (None, None),
+])
+def test_parse_timestamp(value, expected):
+    assert TrackingSchedule.parse_timestamp(value) == expected
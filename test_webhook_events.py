@@ -0,0 +1,66 @@
+"""payment.captured webhooks recovering from an attempt that died after claiming the key"""
+import pytest
+
+import app as app_module
+from app import RazorpayMediatorService, RecentKeyCache
+
+
+class FakeDatabase:
+    def __init__(self, order_status='pending', claim='created', update_ok=True):
+        self.order = {'order_id': 'ORD-1', 'razorpay_order_id': 'order_rzp', 'status': order_status}
+        self.claim = claim
+        self.update_ok = update_ok
+        self.updates = []
+
+    def claim_payment_record(self, payment_data):
+        return {'status': self.claim}
+
+    def get_order_by_razorpay_id(self, razorpay_order_id):
+        return self.order if razorpay_order_id == self.order['razorpay_order_id'] else None
+
+    def update_order_status(self, order_id, status, **kwargs):
+        self.updates.append((order_id, status))
+        return self.update_ok
+
+
+EVENT = {
+    'event': 'payment.captured',
+    'payload': {'payment': {'entity': {'id': 'pay_1', 'order_id': 'order_rzp', 'amount': 129900, 'method': 'upi'}}}
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_key_cache(monkeypatch):
+    monkeypatch.setattr(app_module, 'recent_payment_keys', RecentKeyCache('test'))
+
+
+def handle(db):
+    return RazorpayMediatorService(None, db).handle_webhook_event(EVENT)
+
+
+def test_first_delivery_captures_the_order():
+    db = FakeDatabase()
+    assert handle(db)['status'] == 'success'
+    assert db.updates == [('ORD-1', 'payment_captured')]
+
+
+def test_duplicate_of_a_dead_attempt_still_captures():
+    db = FakeDatabase(claim='duplicate')
+    assert handle(db)['status'] == 'success'
+    assert db.updates == [('ORD-1', 'payment_captured')]
+
+
+def test_duplicate_of_a_finished_attempt_changes_nothing():
+    db = FakeDatabase(order_status='qikink_submitted', claim='duplicate')
+    assert handle(db)['status'] == 'duplicate'
+    assert db.updates == []
+
+
+def test_failed_order_update_is_retried():
+    db = FakeDatabase(update_ok=False)
+    assert handle(db)['status'] == 'error'
+
+    # The queue's retry finds the key claimed but the order still pending
+    db.claim, db.update_ok = 'duplicate', True
+    assert handle(db)['status'] == 'success'
+    assert db.updates == [('ORD-1', 'payment_captured')] * 2